@@ -0,0 +1,70 @@
+"""
+Inserting expenses one request at a time versus in batches through the
+bulk endpoint (services.add_expense versus services.add_expenses).
+
+    python -m benchmarks.bulk_expenses [--rows N] [--batch N]
+"""
+import argparse
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from benchmarks.common import test_database
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+
+from core import services
+from core.models import Category, Expense
+
+
+def rows(count):
+    rng = random.Random(0)
+    start = datetime.date(2024, 1, 1)
+    return [
+        {
+            'amount': str(Decimal(rng.randint(100, 10000)) / 100),
+            'expense_date': (start + datetime.timedelta(days=rng.randrange(365))).isoformat(),
+            'description': f'imported {i}',
+            'category_name': rng.choice(('Food', 'Travel', 'Rent', 'Fun')),
+        }
+        for i in range(count)
+    ]
+
+
+def single(user_id, items):
+    for item in items:
+        item = dict(item)
+        services.add_expense(user_id, item.pop('category_name'), item)
+
+
+def bulk(user_id, items, batch):
+    for start in range(0, len(items), batch):
+        services.add_expenses(user_id, items[start:start + batch])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--batch', type=int, default=1000, help="items per bulk request")
+    args = parser.parse_args()
+
+    with test_database(), override_settings(EXPENSE_BULK_MAX_ITEMS=args.batch):
+        for name in ('Food', 'Travel', 'Rent', 'Fun'):
+            Category.objects.get_or_create(name=name)
+        items = rows(args.rows)
+        print(f'Inserting {args.rows} expenses')
+        print(f"{'variant':<28}{'seconds':>10}{'rows/s':>10}")
+        variants = (('single-item', single), (f'bulk, {args.batch} per call', lambda u, i: bulk(u, i, args.batch)))
+        for n, (label, insert) in enumerate(variants):
+            user = get_user_model().objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='x')
+            start = time.perf_counter()
+            insert(user.id, items)
+            elapsed = time.perf_counter() - start
+            assert Expense.objects.filter(user=user).count() == args.rows
+            print(f'{label:<28}{elapsed:>10.2f}{args.rows / elapsed:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Latency of the cached API endpoints with each shared cache tier (see
+SHARED_CACHES in settings): a miss (the video stamp moved, so the page is
+built), a hit in the shared tier (what another worker sees) and a hit in
+this process's local tier.
+
+    python -m benchmarks.cache_tiers [--repeat N] [--tiers local file db]
+"""
+import argparse
+import tempfile
+
+from benchmarks.common import measure, report, test_database
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from core import caching, conditional
+from core.models import Video
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--tiers', nargs='+', default=['local', 'file', 'db'], choices=sorted(settings.SHARED_CACHES))
+    args = parser.parse_args()
+
+    with test_database(), tempfile.TemporaryDirectory() as directory:
+        Video.objects.bulk_create([
+            Video(title=f'video {i}', url='https://example.com', description='budgeting') for i in range(60)
+        ])
+        client = APIClient()
+        local = caches[caching.LOCAL_ALIAS]
+
+        def fetch():
+            assert client.get('/api/videos/').status_code == 200
+
+        def miss():
+            conditional.bump_video_version()
+            fetch()
+
+        def shared_hit():
+            local.clear()
+            fetch()
+
+        results = {}
+        for tier in args.tiers:
+            shared = {**settings.SHARED_CACHES[tier]}
+            if tier == 'file':
+                shared['LOCATION'] = directory
+            with override_settings(CACHES={**settings.CACHES, 'default': shared}):
+                if tier == 'db':
+                    call_command('createcachetable')
+                results[f'{tier} miss'] = measure(miss, repeat=args.repeat)
+                results[f'{tier} shared hit'] = measure(shared_hit, repeat=args.repeat)
+                results[f'{tier} local hit'] = measure(fetch, repeat=args.repeat)
+        report('GET /api/videos/ by shared cache tier', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Shared helpers for the benchmark scripts in this directory.
+
+Every benchmark runs against a throwaway test database created from the
+configured DATABASES setting, so it never touches real data. Run them from
+the project root, e.g.
+
+    python -m benchmarks.frontend_pages
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connections  # noqa: E402
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment  # noqa: E402
+
+from core.test_runner import TEST_CACHES  # noqa: E402
+
+
+@contextmanager
+def test_database():
+    """
+    Create the test database (with migrations applied) for the duration of
+    the block, with per-process caches as in the tests.
+    """
+    setup_test_environment()
+    connection = connections['default']
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        with override_settings(CACHES=TEST_CACHES):
+            yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def live_server():
+    """Run the project on a background thread and yield its base URL."""
+    from django.test.testcases import LiveServerThread, _StaticFilesHandler
+
+    # An in-memory SQLite test database has to be shared with the server thread
+    connections_override = {
+        conn.alias: conn for conn in connections.all()
+        if conn.vendor == 'sqlite' and conn.is_in_memory_db()
+    }
+    for conn in connections_override.values():
+        conn.inc_thread_sharing()
+
+    server = LiveServerThread('localhost', _StaticFilesHandler, connections_override=connections_override, port=0)
+    server.daemon = True
+    server.start()
+    server.is_ready.wait()
+    if server.error:
+        raise server.error
+    try:
+        yield f'http://localhost:{server.port}'
+    finally:
+        server.terminate()
+        for conn in connections_override.values():
+            conn.dec_thread_sharing()
+
+
+def measure(func, repeat=50, warmup=3):
+    """Call func repeatedly and return latency statistics in milliseconds."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'mean': statistics.mean(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+
+def report(title, results):
+    """Print one row per measured variant."""
+    print(title)
+    print(f"{'variant':<28}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<28}{stats['mean']:>10.2f}{stats['p50']:>10.2f}{stats['p95']:>10.2f}")
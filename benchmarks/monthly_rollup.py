@@ -0,0 +1,62 @@
+"""
+Monthly summary latency from the raw expenses versus the rollup table.
+
+    python -m benchmarks.monthly_rollup [--expenses N] [--users N] [--repeat N]
+"""
+import argparse
+import datetime
+import random
+from decimal import Decimal
+
+from benchmarks.common import measure, report, test_database
+
+from django.contrib.auth import get_user_model
+
+from core import rollups, services
+from core.filters import ExpenseFilter
+from core.models import Category, Expense
+
+
+def seed(users, expenses_per_user):
+    categories = [Category.objects.create(name=name) for name in ('Food', 'Travel', 'Rent', 'Fun')]
+    start = datetime.date(2021, 1, 1)
+    rng = random.Random(0)
+    ids = []
+    for n in range(users):
+        user = get_user_model().objects.create_user(username=f'user{n}', email=f'user{n}@example.com', password='x')
+        Expense.objects.bulk_create(
+            (
+                Expense(user=user, category=rng.choice(categories), description='seeded',
+                        amount=Decimal(rng.randint(100, 10000)) / 100,
+                        expense_date=start + datetime.timedelta(days=rng.randrange(5 * 365)))
+                for _ in range(expenses_per_user)
+            ),
+            batch_size=5000,
+        )
+        ids.append(user.id)
+    rollups.rebuild()
+    return ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--expenses', type=int, default=100_000, help="expenses per user")
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    with test_database():
+        user_id = seed(args.users, args.expenses)[0]
+        results = {}
+        for label, params in (('whole year', {'year': '2023'}),
+                              ('year + category', {'year': '2023', 'category_name': 'food'})):
+            filters = ExpenseFilter(params)
+            results[f'raw, {label}'] = measure(
+                lambda: list(services.monthly_totals_queryset(user_id, params)), repeat=args.repeat)
+            results[f'rollup, {label}'] = measure(
+                lambda: list(services.monthly_rollup_queryset(user_id, filters)), repeat=args.repeat)
+        report(f'Monthly summary, {args.expenses} expenses per user', results)
+
+
+if __name__ == '__main__':
+    main()
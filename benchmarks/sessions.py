@@ -0,0 +1,106 @@
+"""
+Load test of the frontend pages under each session mode (SESSION_MODE in
+settings), counting the statements that reach the django_session table.
+
+Each simulated user logs in once, then keeps loading the expenses, income,
+profile and dashboard pages and adding an expense, from several threads
+at once. The page templates are replaced with stand-ins that only use
+the session context processor, since rendering is not what is measured.
+
+    python -m benchmarks.sessions [--users N] [--rounds N]
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import test_database
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+
+from core.models import Category, User
+
+PAGES = ('/expenses/view', '/incomes-list/', '/profile/', '/dashboard/')
+TEMPLATES = ('core/expenses.html', 'core/income_list.html', 'core/profile.html', 'core/dashboard.html')
+
+session_statements = Counter()
+_lock = threading.Lock()
+
+
+def _count(execute, sql, params, many, context):
+    if 'django_session' in sql:
+        with _lock:
+            session_statements[sql.split(None, 1)[0].upper()] += 1
+    return execute(sql, params, many, context)
+
+
+def _watch(sender, connection, **kwargs):
+    connection.execute_wrappers.append(_count)
+
+
+def stand_in_templates(directory):
+    for name in TEMPLATES:
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('{{ profile_picture_url }}')
+    return [{**settings.TEMPLATES[0], 'DIRS': [directory]}]
+
+
+def simulate(n, rounds, food_id):
+    client = Client()
+    response = client.post('/login/', {'email': f'user{n}@example.com', 'password': 'bench'})
+    assert response.status_code == 302, response.status_code
+    requests = 1
+    for _ in range(rounds):
+        for path in PAGES:
+            assert client.get(path).status_code == 200, path
+        response = client.post('/expenses/add/', {
+            'category': str(food_id), 'amount': '1.00', 'expense_date': '2025-01-01',
+            'description': 'bench', 'location': 'here',
+        }, content_type='application/json')
+        assert response.status_code == 200, response.content
+        requests += len(PAGES) + 1
+    connections.close_all()
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=8, help="concurrent simulated users")
+    parser.add_argument('--rounds', type=int, default=25, help="page rounds per user")
+    args = parser.parse_args()
+
+    connection_created.connect(_watch)
+    with test_database(), tempfile.TemporaryDirectory() as directory:
+        food, _ = Category.objects.get_or_create(name='Food')
+        for n in range(args.users):
+            User.objects.create(username=f'user{n}', email=f'user{n}@example.com',
+                                password=hashlib.sha256(b'bench').hexdigest())
+
+        print(f'{args.users} users x {args.rounds} rounds, statements on django_session')
+        print(f"{'mode':<16}{'requests':>10}{'req/s':>8}{'SELECT':>8}{'INSERT':>8}{'UPDATE':>8}{'DELETE':>8}")
+        for mode, engine in settings.SESSION_ENGINES.items():
+            caches['sessions'].clear()
+            session_statements.clear()
+            # No fan-out pool: its threads would keep connections to the test database open
+            with override_settings(SESSION_ENGINE=engine, TEMPLATES=stand_in_templates(directory),
+                                   FRONTEND_FANOUT_WORKERS=0):
+                start = time.perf_counter()
+                with ThreadPoolExecutor(args.users) as pool:
+                    requests = sum(pool.map(lambda n: simulate(n, args.rounds, food.id), range(args.users)))
+                elapsed = time.perf_counter() - start
+            counts = [session_statements[kind] for kind in ('SELECT', 'INSERT', 'UPDATE', 'DELETE')]
+            print(f'{mode:<16}{requests:>10}{requests / elapsed:>8.0f}' + ''.join(f'{n:>8}' for n in counts))
+
+
+if __name__ == '__main__':
+    main()
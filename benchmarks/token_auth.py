@@ -0,0 +1,47 @@
+"""
+Queries and latency per API request with DRF Token authentication
+(a token table lookup) versus signed access tokens (core.tokens).
+
+    python -m benchmarks.token_auth [--repeat N]
+"""
+import argparse
+
+from benchmarks.common import measure, report, test_database
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from core import categories, tokens
+
+ENDPOINTS = ('/categories/', '/api/videos/')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with test_database():
+        user = get_user_model().objects.create_user(username='bench', email='bench@example.com', password='x')
+        headers = {
+            'Token': f'Token {Token.objects.create(user=user).key}',
+            'Bearer': f'Bearer {tokens.issue_access_token(user)}',
+        }
+        categories.registry.all()
+        client = Client()
+        results = {}
+        for path in ENDPOINTS:
+            for scheme, header in headers.items():
+                with CaptureQueriesContext(connection) as queries:
+                    assert client.get(path, HTTP_AUTHORIZATION=header).status_code == 200
+                print(f'{path} with {scheme}: {len(queries)} queries per request')
+                results[f'{path} {scheme}'] = measure(
+                    lambda: client.get(path, HTTP_AUTHORIZATION=header), repeat=args.repeat)
+        report('API requests by authentication scheme', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Video search latency: the old icontains filter versus the full-text
+backend in core.search (tsvector + GIN on PostgreSQL, FTS5 on SQLite).
+
+    python -m benchmarks.video_search [--videos N] [--repeat N]
+"""
+import argparse
+import random
+
+from benchmarks.common import measure, report, test_database
+
+from django.db import connection
+from django.db.models import Q
+
+from core.models import Video
+from core.search import search_videos
+
+WORDS = ('budget saving invest stock bond fund pension credit debt loan mortgage rent salary tax '
+         'insurance crypto index dividend interest inflation market retire emergency expense '
+         'income frugal plan goal habit wealth').split()
+FILLER = [f'word{i}' for i in range(2000)]
+QUERIES = ('mortgage', 'retire pension', 'word1234', 'nothingmatches')
+
+
+def seed(count):
+    rng = random.Random(0)
+
+    def text(n):
+        return ' '.join(rng.choice(WORDS) if rng.random() < 0.1 else rng.choice(FILLER) for _ in range(n))
+
+    Video.objects.bulk_create(
+        (Video(title=text(6), url='https://example.com', description=text(60)) for _ in range(count)),
+        batch_size=5000,
+    )
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_video')
+
+
+def first_page(queryset):
+    return list(queryset[:6])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--videos', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with test_database():
+        seed(args.videos)
+        videos = Video.objects.order_by('-created_at')
+        results = {}
+        for query in QUERIES:
+            icontains = videos.filter(Q(title__icontains=query) | Q(description__icontains=query))
+            results[f'icontains "{query}"'] = measure(lambda: first_page(icontains), repeat=args.repeat)
+            results[f'full-text "{query}"'] = measure(
+                lambda: first_page(search_videos(videos, query)), repeat=args.repeat)
+        report(f'First page of video search, {args.videos} videos ({connection.vendor})', results)
+
+
+if __name__ == '__main__':
+    main()
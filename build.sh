@@ -11,6 +11,9 @@ python manage.py collectstatic --no-input
 # Apply database migrations
 python manage.py migrate
 
+# Table for the shared cache when SHARED_CACHE=db (does nothing otherwise)
+python manage.py createcachetable
+
 # Optional: Create a superuser if it doesn't exist (useful for initial setup)
 # Only uncomment this if you absolutely need an admin user on first deploy and
 # understand the security implications. Change password immediately!
@@ -160,6 +160,120 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles') # Add this if not already there
 LOGIN_URL = '/login/'
 API_BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:8000') # Default for local
+# 'local' makes the frontend views call core.services in-process.
+# 'http' keeps the old behaviour of calling our own API at API_BASE_URL.
+FRONTEND_API_MODE = os.environ.get('FRONTEND_API_MODE', 'local')
+# Thread pool the expenses page uses to run its independent fetches concurrently
+# (0 runs them one after another), and the deadline for all of them together
+FRONTEND_FANOUT_WORKERS = int(os.environ.get('FRONTEND_FANOUT_WORKERS', 8))
+FRONTEND_FANOUT_TIMEOUT = float(os.environ.get('FRONTEND_FANOUT_TIMEOUT', 10))
+# Cursor pagination of the expense list API. Clients opt in with ?page_size= or
+# ?cursor=; flip the default once they all do, ?all=true still returns everything.
+EXPENSE_LIST_PAGINATE_BY_DEFAULT = os.environ.get('EXPENSE_LIST_PAGINATE_BY_DEFAULT', 'False').lower() == 'true'
+EXPENSE_PAGE_SIZE = 50
+EXPENSE_MAX_PAGE_SIZE = 500
+# Signed access tokens (core/tokens.py) are checked without a query and
+# cannot be revoked, so keep them short; refresh tokens are stored and
+# revocable
+ACCESS_TOKEN_LIFETIME = int(os.environ.get('ACCESS_TOKEN_LIFETIME', 300))
+REFRESH_TOKEN_LIFETIME = int(os.environ.get('REFRESH_TOKEN_LIFETIME', 14 * 24 * 3600))
+# Live refresh tokens kept per user; issuing one more drops the oldest (and
+# any expired ones)
+REFRESH_TOKENS_PER_USER = int(os.environ.get('REFRESH_TOKENS_PER_USER', 10))
+# Most expenses one bulk request may create (/expenses/<user_id>/bulk/),
+# update or delete (/expenses/bulk/update/, /expenses/bulk/delete/)
+EXPENSE_BULK_MAX_ITEMS = int(os.environ.get('EXPENSE_BULK_MAX_ITEMS', 1000))
+# Page size of video comments and reviews, also the first page in video detail
+VIDEO_FEEDBACK_PAGE_SIZE = 20
+VIDEO_FEEDBACK_MAX_PAGE_SIZE = 100
+# Pooled client used in 'http' mode, see core/api_client.py for all options
+API_CLIENT = {
+    'CONNECT_TIMEOUT': float(os.environ.get('API_CLIENT_CONNECT_TIMEOUT', 3.05)),
+    'READ_TIMEOUT': float(os.environ.get('API_CLIENT_READ_TIMEOUT', 10)),
+    'RETRIES': int(os.environ.get('API_CLIENT_RETRIES', 2)),
+    'CIRCUIT_BREAKER_THRESHOLD': int(os.environ.get('API_CLIENT_CIRCUIT_BREAKER_THRESHOLD', 0)),
+}
+# Cache tiers (core/caching.py). 'default' is the shared tier: version stamps,
+# cached summaries and responses live there, so with several worker processes
+# it has to be one they all see. SHARED_CACHE picks it:
+#   'file'  - files under SHARED_CACHE_LOCATION (default), no extra service
+#   'db'    - a table in the main database (manage.py createcachetable)
+#   'redis' - any Redis-protocol server at REDIS_URL; needs the redis package
+#   'local' - per process only, for a single worker or tests
+# 'local' is each process's own LRU (LocMemCache) in front of the shared tier,
+# holding copies of entries whose keys carry a version, which never go stale.
+# Shared keys are prefixed with the database name, since what they hold
+# describes that database; tests run on per-process caches (core/test_runner.py).
+SHARED_CACHE_MAX_ENTRIES = int(os.environ.get('SHARED_CACHE_MAX_ENTRIES', 10000))
+SHARED_CACHES = {
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', BASE_DIR / '.cache' / 'shared'),
+        'OPTIONS': {'MAX_ENTRIES': SHARED_CACHE_MAX_ENTRIES},
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', 'core_cache'),
+        'OPTIONS': {'MAX_ENTRIES': SHARED_CACHE_MAX_ENTRIES},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'MAX_ENTRIES': SHARED_CACHE_MAX_ENTRIES},
+    },
+}
+SHARED_CACHE = os.environ.get('SHARED_CACHE', 'file')
+SHARED_CACHE_KEY_PREFIX = os.environ.get('SHARED_CACHE_KEY_PREFIX', str(DATABASES['default'].get('NAME') or ''))
+# Sessions go to the shared tier too (see SESSION_ENGINE below), in their own
+# namespace and, for files, their own directory; SESSION_CACHE_BACKEND and
+# SESSION_CACHE_LOCATION point them elsewhere, at a cache every worker shares
+if os.environ.get('SESSION_CACHE_BACKEND'):
+    SESSION_CACHE = {
+        'BACKEND': os.environ['SESSION_CACHE_BACKEND'],
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', 'sessions'),
+    }
+else:
+    SESSION_CACHE = {**SHARED_CACHES[SHARED_CACHE], 'KEY_PREFIX': f'{SHARED_CACHE_KEY_PREFIX}:sessions'}
+    if SHARED_CACHE == 'file':
+        SESSION_CACHE['LOCATION'] = os.environ.get('SESSION_CACHE_LOCATION', BASE_DIR / '.cache' / 'sessions')
+CACHES = {
+    'default': {
+        **SHARED_CACHES[SHARED_CACHE],
+        'KEY_PREFIX': SHARED_CACHE_KEY_PREFIX,
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'local',
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('LOCAL_CACHE_MAX_ENTRIES', 1000))},
+    },
+    'sessions': SESSION_CACHE,
+}
+TEST_RUNNER = 'core.test_runner.TestRunner'
+# Where sessions live. 'cached_db' (default) reads them from the 'sessions'
+# cache and only falls back to django_session on a miss; writes go to both.
+# Cached sessions live as long as the session itself, so that cache must be
+# one all workers share: with a per-process one the others would keep
+# serving a session after logout flushed it in one worker, which is why the
+# default is 'db' when SHARED_CACHE=local. 'signed_cookies' keeps the whole session in a signed (not
+# encrypted) cookie and never touches the database; 'db' is Django's default.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_SHARED = SHARED_CACHE != 'local' or bool(os.environ.get('SESSION_CACHE_BACKEND'))
+SESSION_ENGINE = SESSION_ENGINES[os.environ.get('SESSION_MODE', 'cached_db' if SESSION_SHARED else 'db')]
+SESSION_CACHE_ALIAS = 'sessions'
+# Video view counts are buffered in the shared cache tier and written out in
+# batches every VIDEO_VIEW_FLUSH_INTERVAL seconds (how stale view_count may
+# get), or sooner once a worker has counted VIDEO_VIEW_FLUSH_MAX_PENDING views.
+# Set the interval to 0 to leave flushing to `manage.py flush_video_views`
+VIDEO_VIEW_FLUSH_INTERVAL = float(os.environ.get('VIDEO_VIEW_FLUSH_INTERVAL', 10))
+VIDEO_VIEW_FLUSH_MAX_PENDING = int(os.environ.get('VIDEO_VIEW_FLUSH_MAX_PENDING', 1000))
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 X_FRAME_OPTIONS = 'SAMEORIGIN'
@@ -177,6 +291,7 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
+        'core.tokens.SignedTokenAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
 }
@@ -23,6 +23,8 @@ from core.views import (
     UpdateExpenseView,
     UserRegistrationView, 
     UserLoginView,
+    TokenRefreshView,
+    TokenRevokeView,
     UserIncomeView,
     IncomeDetailView,
     RegistrationView,
@@ -32,7 +34,11 @@ from core.views import (
     DashboardView,
     income_list,
     AddExpenseView,
+    BulkAddExpenseView,
+    BulkUpdateExpenseView,
+    BulkDeleteExpenseView,
     ExpenseListView,
+    ExpenseExportView,
     ExpensesPageView,
     AddExpenseViewFront,
     UpdateExpenseViewFront,
@@ -56,12 +62,18 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('users/', UserRegistrationView.as_view(), name='user-registration'),
     path('users/login/', UserLoginView.as_view(), name='user-login'),
+    path('users/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('users/token/revoke/', TokenRevokeView.as_view(), name='token-revoke'),
     path('incomes/', UserIncomeView.as_view(), name='user-incomes'),
     path('incomes/<uuid:user_id>/', IncomeDetailView.as_view(), name='income-detail'),
     path('expenses/add/<uuid:user_id>/<str:category_name>/', AddExpenseView.as_view(), name='add-expense'),
     path('expenses/<uuid:user_id>/', ExpenseListView.as_view(), name='list-expenses'),  # Updated to include user_id
+    path('expenses/<uuid:user_id>/bulk/', BulkAddExpenseView.as_view(), name='bulk-add-expenses'),
+    path('expenses/<uuid:user_id>/export/', ExpenseExportView.as_view(), name='export-expenses'),
     path('expenses/update/<uuid:expense_id>/', UpdateExpenseView.as_view(), name='update-expense'),
     path('expenses/delete/<uuid:expense_id>/', DeleteExpenseView.as_view(), name='delete_expense'),
+    path('expenses/bulk/update/', BulkUpdateExpenseView.as_view(), name='bulk-update-expenses'),
+    path('expenses/bulk/delete/', BulkDeleteExpenseView.as_view(), name='bulk-delete-expenses'),
     path('expenses/<uuid:user_id>/monthly-summary/', MonthlyExpenseSummaryView.as_view(), name='monthly-summary'),
     path('expenses/<uuid:user_id>/category-summary/', CategoryExpenseSummaryView.as_view(), name='category-summary'),
     path('users/profile/', UserProfileView.as_view(), name='api-profile'),
@@ -0,0 +1,146 @@
+"""
+Pooled HTTP client for the frontend views' calls to our own API.
+
+Only used when FRONTEND_API_MODE is 'http'. One client lives per worker
+process, so connections to API_BASE_URL are kept alive and reused between
+page loads. Every call has connect/read timeouts, idempotent GETs are retried
+with bounded backoff, and an optional circuit breaker stops hammering an API
+that keeps failing. Tune it with the API_CLIENT setting.
+"""
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULTS = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'RETRIES': 2,
+    'BACKOFF_FACTOR': 0.1,
+    'BACKOFF_MAX': 1.0,
+    'POOL_MAXSIZE': 10,
+    # 0 disables the circuit breaker
+    'CIRCUIT_BREAKER_THRESHOLD': 0,
+    'CIRCUIT_BREAKER_RESET': 30,
+}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while the circuit is open."""
+
+
+class InternalAPIClient:
+    def __init__(self, base_url=None, **options):
+        self.base_url = base_url
+        self.options = {**DEFAULTS, **getattr(settings, 'API_CLIENT', {}), **options}
+        self._lock = threading.Lock()
+        self._counters = {'requests': 0, 'failures': 0, 'retries': 0, 'short_circuited': 0}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self.session = self._build_session()
+
+    def _build_session(self):
+        retry = Retry(
+            total=self.options['RETRIES'],
+            backoff_factor=self.options['BACKOFF_FACTOR'],
+            backoff_max=self.options['BACKOFF_MAX'],
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET', 'HEAD'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_maxsize=self.options['POOL_MAXSIZE'], max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        self._adapter = adapter
+        return session
+
+    # Circuit breaker
+
+    def _circuit_allows(self):
+        threshold = self.options['CIRCUIT_BREAKER_THRESHOLD']
+        if not threshold or self._opened_at is None:
+            return True
+        # Half-open: let one call through once the reset period has passed
+        if time.monotonic() - self._opened_at >= self.options['CIRCUIT_BREAKER_RESET']:
+            self._opened_at = time.monotonic()
+            return True
+        return False
+
+    def _record(self, ok, elapsed):
+        with self._lock:
+            self._counters['requests'] += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+            if ok:
+                self._consecutive_failures = 0
+                self._opened_at = None
+                return
+            self._counters['failures'] += 1
+            self._consecutive_failures += 1
+            threshold = self.options['CIRCUIT_BREAKER_THRESHOLD']
+            if threshold and self._consecutive_failures >= threshold:
+                self._opened_at = time.monotonic()
+
+    # Requests
+
+    def request(self, method, path, timeout=None, **kwargs):
+        if not self._circuit_allows():
+            with self._lock:
+                self._counters['short_circuited'] += 1
+            raise CircuitOpenError(f'Circuit open for {self.base_url or settings.API_BASE_URL}')
+
+        url = f'{self.base_url or settings.API_BASE_URL}{path}'
+        timeout = timeout or (self.options['CONNECT_TIMEOUT'], self.options['READ_TIMEOUT'])
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(False, time.perf_counter() - start)
+            raise
+
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            with self._lock:
+                self._counters['retries'] += len(retries.history)
+        self._record(response.status_code < 500, time.perf_counter() - start)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    # Counters
+
+    def stats(self):
+        opened = served = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                served += pool.num_requests
+        with self._lock:
+            requests_made = self._counters['requests']
+            return {
+                **self._counters,
+                'connections_opened': opened,
+                'connections_reused': max(0, served - opened),
+                'latency_ms_avg': (self._latency_total / requests_made * 1000) if requests_made else 0.0,
+                'latency_ms_max': self._latency_max * 1000,
+                'circuit_open': self._opened_at is not None,
+            }
+
+
+# One client per worker process
+api_client = InternalAPIClient()
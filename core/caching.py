@@ -0,0 +1,229 @@
+"""
+Caching of derived data (summaries, the category list, API responses).
+
+Entries are keyed on version stamps instead of expiring after a guessed
+TTL: every expense write bumps the user's version once its transaction
+commits, so later reads build new keys and the old entries are never
+read again (the cache evicts them in its own time).
+
+There are two tiers (see CACHES). The stamps and the entries live in the
+shared tier, 'default', which every worker process sees. Because an entry
+under a versioned key never changes, each process also keeps a copy in
+its own LRU, the 'local' tier, and reads it from there next time; only
+the stamps have to be read from the shared tier on every request.
+
+When an entry is missing, get_or_compute() lets one caller build it while
+the others wait for the result, instead of every request that arrives in
+the meantime running the same query. The lock is a cache.add(), atomic on
+Redis and the database cache and best effort on the file cache.
+
+incr() keeps counters in the shared tier (see core.counters.CounterBuffer).
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import PyLibMCCache, PyMemcacheCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import transaction
+
+VERSION_KEY = 'expense-data-version:{user_id}'
+
+LOCAL_ALIAS = 'local'
+# How long a computation may hold the lock, and how often waiters look for its result
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+# Backends whose incr() is one atomic operation; the file and database
+# caches get the value and set it again
+ATOMIC_INCR_BACKENDS = (RedisCache, LocMemCache, PyMemcacheCache, PyLibMCCache)
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(name, outcome):
+    with _stats_lock:
+        _stats[name, outcome] += 1
+
+
+def stats():
+    """Hit and miss counters of this process, as {name: {'hits': n, 'misses': n}}."""
+    with _stats_lock:
+        names = {name for name, _ in _stats}
+        return {name: {'hits': _stats[name, 'hit'], 'misses': _stats[name, 'miss']} for name in names}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _initial_version():
+    # If the version key is ever evicted, starting again from a clock value
+    # cannot collide with a version that still has entries cached under it
+    return time.time_ns()
+
+
+def _modified_key(key):
+    return f'{key}:modified'
+
+
+def version(key):
+    """Current value of a shared version stamp, created on first use."""
+    value = cache.get(key)
+    if value is None:
+        if cache.add(key, _initial_version(), timeout=None):
+            cache.set(_modified_key(key), time.time(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def version_modified(key):
+    """When the stamp last moved (a timestamp), or None if that is not known."""
+    return cache.get(_modified_key(key))
+
+
+def _bump(key):
+    # A new clock value rather than incr(): the file and database caches
+    # increment with a get and a set, so two workers bumping at once could
+    # both write the same value and one of the two changes would not show
+    cache.set(key, _initial_version(), timeout=None)
+    cache.set(_modified_key(key), time.time(), timeout=None)
+
+
+def bump_version(key, on_commit=True):
+    """Move a version stamp on, by default once the current transaction commits."""
+    if on_commit:
+        transaction.on_commit(lambda: _bump(key))
+    else:
+        _bump(key)
+
+
+def user_data_version(user_id):
+    return version(VERSION_KEY.format(user_id=user_id))
+
+
+def bump_user_data_version(user_id):
+    """Invalidate everything cached for the user once the current transaction commits."""
+    bump_version(VERSION_KEY.format(user_id=user_id))
+
+
+def params_digest(params):
+    if hasattr(params, 'lists'):
+        items = sorted((key, sorted(values)) for key, values in params.lists())
+    else:
+        items = sorted((key, [value]) for key, value in params.items())
+    return hashlib.md5(json.dumps(items, default=str).encode()).hexdigest()
+
+
+def versioned_key(name, stamps, params=None):
+    """A key for `name` that changes whenever one of the version stamps moves (or the params differ)."""
+    versions = ''.join(f':{version(key)}' for key in stamps)
+    return f'{name}{versions}:{params_digest(params or {})}'
+
+
+def _wait_for(key, lock):
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None or not cache.has_key(lock):
+            return value
+    return None
+
+
+def get_or_compute(key, compute, name=None, timeout=None):
+    """
+    Return the value cached under key (which must carry a version), from
+    the local tier or else the shared one, calling compute() on a miss.
+    Concurrent misses on one key run compute() once; the others wait up
+    to LOCK_TIMEOUT for its result and only then compute it themselves.
+    A None result reads as a miss, so it is computed again every time.
+    """
+    local = caches[LOCAL_ALIAS]
+    value = local.get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is not None:
+            local.set(key, value, timeout=timeout)
+    if value is not None:
+        if name:
+            _count(name, 'hit')
+        return value
+    if name:
+        _count(name, 'miss')
+
+    lock = f'{key}:lock'
+    if cache.add(lock, 1, timeout=LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout=timeout)
+        finally:
+            cache.delete(lock)
+    else:
+        value = _wait_for(key, lock)
+        if value is None:
+            value = compute()
+    local.set(key, value, timeout=timeout)
+    return value
+
+
+def user_cache_key(name, user_id, params=None, depends_on=()):
+    # Version stamps of shared data the entry was built from, e.g. categories
+    return versioned_key(f'{name}:{user_id}', [VERSION_KEY.format(user_id=user_id), *depends_on], params)
+
+
+def cached_for_user(name, user_id, params, compute, depends_on=()):
+    """Return compute() through the cache, keyed on the user's data version and params."""
+    return get_or_compute(user_cache_key(name, user_id, params, depends_on), compute, name=name)
+
+
+@contextlib.contextmanager
+def _locked(key):
+    backend = caches['default']
+    if isinstance(backend, FileBasedCache):
+        # add() is a has_key() and a set() there, so lock a file next to the entries
+        os.makedirs(backend._dir, exist_ok=True)
+        with open(os.path.join(backend._dir, 'incr.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+        return
+
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    # Past the deadline the holder is presumed dead and its lock expires anyway
+    while not cache.add(lock, 1, timeout=LOCK_TIMEOUT) and time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL / 10)
+    try:
+        yield
+    finally:
+        cache.delete(lock)
+
+
+def incr(key, delta=1):
+    """
+    Add delta to the counter under key in the shared tier, a missing key
+    counting as 0, and return the new value. The key never expires. On the
+    file and database caches the get and set run under a lock (a locked
+    file, a cache.add()), so concurrent increments from several workers all
+    count.
+    """
+    if isinstance(caches['default'], ATOMIC_INCR_BACKENDS):
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            if cache.add(key, delta, timeout=None):
+                return delta
+            return cache.incr(key, delta)
+    with _locked(key):
+        value = (cache.get(key) or 0) + delta
+        cache.set(key, value, timeout=None)
+        return value
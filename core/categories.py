@@ -0,0 +1,99 @@
+"""
+Per-process registry of expense categories.
+
+Categories are seeded by migration 0004 and almost never change, yet
+adding an expense, the category dropdowns and /categories/ all used to
+query them. The registry keeps them in memory, by id and by
+case-insensitive name, and reloads when the shared version stamp in the
+cache moves. Saving or deleting a Category moves the stamp (signal
+handlers below, connected when the app loads), so every worker picks the
+change up on its next lookup. The reload itself goes through the shared
+cache (caching.get_or_compute): after a change one worker queries the
+table and the others load its result.
+"""
+import threading
+import uuid
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching
+from .models import Category
+
+VERSION_KEY = 'category-registry-version'
+
+
+def _query():
+    from .serializers import CategorySerializer
+
+    ordered = list(Category.objects.all())
+    return ordered, list(CategorySerializer(ordered, many=True).data)
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_id = {}
+        self._by_name = {}
+        self._ids_by_name = {}
+        self._ordered = []
+        self._serialized = []
+
+    def _load(self):
+        stamp = caching.version(VERSION_KEY)
+        if stamp == self._version:
+            return
+        with self._lock:
+            if stamp == self._version:
+                return
+            ordered, serialized = caching.get_or_compute(caching.versioned_key('categories', [VERSION_KEY]), _query)
+            by_name, ids_by_name = {}, {}
+            for category in ordered:
+                by_name.setdefault(category.name.casefold(), category)
+                ids_by_name.setdefault(category.name.casefold(), set()).add(category.id)
+            self._by_id = {category.id: category for category in ordered}
+            self._by_name = by_name
+            self._ids_by_name = ids_by_name
+            self._ordered = ordered
+            self._serialized = serialized
+            self._version = stamp
+
+    def get(self, category_id):
+        """The category with this id (UUID or string), or None."""
+        self._load()
+        try:
+            key = category_id if isinstance(category_id, uuid.UUID) else uuid.UUID(str(category_id))
+        except ValueError:
+            return None
+        return self._by_id.get(key)
+
+    def get_by_name(self, name):
+        self._load()
+        return self._by_name.get(str(name).casefold())
+
+    def ids_named(self, name):
+        """Ids of every category with this name, ignoring case."""
+        self._load()
+        return set(self._ids_by_name.get(str(name).casefold(), ()))
+
+    def all(self):
+        self._load()
+        return list(self._ordered)
+
+    def serialized(self):
+        """CategorySerializer data for every category, as /categories/ returns it."""
+        self._load()
+        return self._serialized
+
+
+registry = CategoryRegistry()
+
+
+@receiver(post_save, sender=Category, dispatch_uid='category_registry_save')
+@receiver(post_delete, sender=Category, dispatch_uid='category_registry_delete')
+def invalidate(**kwargs):
+    # Right away, so code later in the same transaction sees the change, and
+    # again on commit, in case another request reloaded in between
+    caching.bump_version(VERSION_KEY, on_commit=False)
+    caching.bump_version(VERSION_KEY)
@@ -0,0 +1,95 @@
+"""
+Concurrent fan-out for views that need several independent backend fetches.
+
+fan_out() runs the calls on a shared per-process thread pool and waits for
+all of them up to one overall deadline, so a page costs roughly its slowest
+fetch instead of the sum. Each call's outcome is reported separately, so the
+caller can render whatever succeeded. That only pays off when the fetches
+wait on something (the HTTP hops of FRONTEND_API_MODE='http'); in-process
+queries are over before the handoff, so callers pass inline=True for those.
+
+Pool threads close their database connections after every call: the pool
+outlives requests, and a connection kept per idle thread (CONN_MAX_AGE)
+would pin that many database sessions for nothing.
+"""
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection, connections
+
+Outcome = namedtuple('Outcome', ['value', 'error'])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.FRONTEND_FANOUT_WORKERS,
+                thread_name_prefix='fanout',
+            )
+        return _executor
+
+
+def _run(func):
+    try:
+        return func()
+    finally:
+        connections.close_all()
+
+
+def _run_inline(calls):
+    outcomes = {}
+    for name, func in calls.items():
+        try:
+            outcomes[name] = Outcome(func(), None)
+        except Exception as e:
+            outcomes[name] = Outcome(None, e)
+    return outcomes
+
+
+def fan_out(calls, timeout=None, inline=False):
+    """
+    Run a {name: callable} mapping concurrently and return {name: Outcome}.
+
+    Calls that raise, or that are still running when the deadline passes,
+    get an Outcome with the exception (TimeoutError for the latter) instead
+    of a value. inline=True runs them one after another on this thread.
+    """
+    timeout = settings.FRONTEND_FANOUT_TIMEOUT if timeout is None else timeout
+
+    # Other threads use other database connections and can't see rows the
+    # caller hasn't committed yet, so stay on this thread inside atomic().
+    if inline or not settings.FRONTEND_FANOUT_WORKERS or connection.in_atomic_block:
+        return _run_inline(calls)
+
+    executor = _get_executor()
+    deadline = time.monotonic() + timeout
+    futures = {name: executor.submit(_run, func) for name, func in calls.items()}
+    wait(futures.values(), timeout=max(0, deadline - time.monotonic()))
+
+    outcomes = {}
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            outcomes[name] = Outcome(None, TimeoutError(f'{name} did not finish within {timeout}s'))
+        elif future.exception() is not None:
+            outcomes[name] = Outcome(None, future.exception())
+        else:
+            outcomes[name] = Outcome(future.result(), None)
+    return outcomes
+
+
+def shutdown():
+    """Stop the pool, waiting for the calls still running."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
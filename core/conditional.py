@@ -0,0 +1,119 @@
+"""
+Conditional GET for the read-heavy API endpoints.
+
+Each endpoint derives its validators from version stamps it can read
+without running its query (see core.caching): the user's expense data
+version for the summaries, the category registry stamp for /categories/
+and a stamp for video data that moves whenever a video, comment, review
+or like changes. The ETag is a digest of those stamps, the user and the
+query parameters; Last-Modified is the latest time one of the stamps
+moved, to the second (so a client relying on If-Modified-Since alone can
+miss a second change within the same second; the ETag cannot).
+
+respond() answers a matching If-None-Match or If-Modified-Since with a
+304 before the view builds anything, and otherwise adds the validators
+and the endpoint's Cache-Control policy to the response the view built.
+With cache_response it also keeps the body in the cache (core.caching)
+under the ETag, so a client without a copy, or another worker, gets it
+without the view running again until a stamp moves.
+"""
+import hashlib
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from . import caching
+from .models import Video, VideoComment, VideoReview
+
+VIDEO_VERSION_KEY = 'video-data-version'
+
+# Cache-Control per endpoint. Everything here depends on who is asking, so
+# shared caches must not store it; categories are the same for everyone
+# and change rarely, so clients may reuse them for a few minutes.
+CACHE_POLICIES = {
+    'categories': {'private': True, 'max_age': 300},
+    'videos': {'private': True, 'max_age': 0, 'must_revalidate': True},
+    'expense-summary': {'private': True, 'no_cache': True},
+}
+
+
+class Validators:
+    def __init__(self, name, request, stamps, params=None):
+        user = request.user
+        user_id = user.pk if user.is_authenticated else 'anonymous'
+        versions = ':'.join(str(caching.version(key)) for key in stamps)
+        digest = caching.params_digest(params or {})
+        self.digest = hashlib.md5(f'{name}:{user_id}:{versions}:{digest}'.encode()).hexdigest()
+        self.etag = quote_etag(self.digest)
+        modified = [caching.version_modified(key) for key in stamps]
+        self.last_modified = int(max(modified)) if all(modified) else None
+
+    def apply(self, response, policy):
+        if response.status_code in (200, 304):
+            response.headers['ETag'] = self.etag
+            if self.last_modified is not None:
+                response.headers['Last-Modified'] = http_date(self.last_modified)
+        patch_cache_control(response, **CACHE_POLICIES[policy])
+        # The body depends on the user, who comes from the token or the session
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+
+def cached_response(request, validators, build):
+    """The response build() makes, its status and data kept in the cache until the validators change."""
+    def compute():
+        response = build()
+        return response.status_code, response.data
+
+    # Pagination links are absolute, so the host is part of the key
+    key = f'response:{request.get_host()}:{validators.digest}'
+    status, data = caching.get_or_compute(key, compute)
+    return Response(data, status=status)
+
+
+def respond(request, name, stamps, build, params=None, policy=None, on_not_modified=None, cache_response=False):
+    """
+    Serve a GET through the validators of `stamps` (version stamp keys).
+
+    build() makes the full response (a DRF Response if cache_response)
+    and only runs when the client's copy is out of date and, with
+    cache_response, nothing is cached either; on_not_modified(), if
+    given, runs instead when the client's copy is current. params
+    defaults to the query string.
+    """
+    validators = Validators(name, request, stamps, request.query_params if params is None else params)
+    response = get_conditional_response(request, etag=validators.etag, last_modified=validators.last_modified)
+    if response is not None:
+        if on_not_modified is not None:
+            on_not_modified()
+    elif cache_response:
+        response = cached_response(request, validators, build)
+    else:
+        response = build()
+    return validators.apply(response, policy or name)
+
+
+def user_stamps(user_id, *shared):
+    return [caching.VERSION_KEY.format(user_id=user_id), *shared]
+
+
+def bump_video_version():
+    # Right away, so cached pages built later in the same transaction are
+    # keyed apart, and again on commit, like the category registry
+    caching.bump_version(VIDEO_VERSION_KEY, on_commit=False)
+    caching.bump_version(VIDEO_VERSION_KEY)
+
+
+@receiver(post_save, sender=Video, dispatch_uid='video_version_video_save')
+@receiver(post_delete, sender=Video, dispatch_uid='video_version_video_delete')
+@receiver(post_save, sender=VideoComment, dispatch_uid='video_version_comment_save')
+@receiver(post_delete, sender=VideoComment, dispatch_uid='video_version_comment_delete')
+@receiver(post_save, sender=VideoReview, dispatch_uid='video_version_review_save')
+@receiver(post_delete, sender=VideoReview, dispatch_uid='video_version_review_delete')
+def invalidate_videos(**kwargs):
+    # Likes move the stamp in services.toggle_video_like; a receiver on
+    # VideoLike would turn its single DELETE into a SELECT and a DELETE
+    bump_video_version()
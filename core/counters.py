@@ -0,0 +1,234 @@
+"""
+Database-side counter updates for the denormalised counts on Video.
+
+add() applies a delta with a single UPDATE ... SET n = n + delta, so
+concurrent writers never overwrite each other's increments and no other
+column is rewritten. Where the database supports UPDATE ... RETURNING
+(PostgreSQL, SQLite 3.35+), the new value comes back from the same
+statement.
+
+CounterBuffer is for counters bumped on reads (video views): increments
+are only added up in the shared cache tier and written out in batches, by
+the flush_video_views command or a background thread at most
+VIDEO_VIEW_FLUSH_INTERVAL seconds later.
+
+reconcile() recomputes counters from the rows they count, to find and
+repair any skew.
+"""
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections, router, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+RETURNING_VENDORS = ('postgresql', 'sqlite')
+# How long a flush may hold its lock before another one may start
+FLUSH_LOCK_TIMEOUT = 60
+
+
+def _supports_update_returning(connection):
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return connection.vendor in RETURNING_VENDORS
+
+
+def add(model, pk, field_name, delta):
+    """
+    Add delta to model.field_name on the row with this pk and return the new
+    value, or None if there is no such row. A decrement never takes the
+    counter below zero.
+    """
+    connection = connections[router.db_for_write(model)]
+    if not _supports_update_returning(connection):
+        rows = model._default_manager.filter(pk=pk)
+        if delta < 0:
+            rows = rows.filter(**{f'{field_name}__gte': -delta})
+        rows.update(**{field_name: F(field_name) + delta})
+        return model._default_manager.filter(pk=pk).values_list(field_name, flat=True).first()
+
+    qn = connection.ops.quote_name
+    column = qn(model._meta.get_field(field_name).column)
+    pk_field = model._meta.pk
+    sql = f'UPDATE {qn(model._meta.db_table)} SET {column} = {column} + %s WHERE {qn(pk_field.column)} = %s'
+    params = [delta, pk_field.get_db_prep_value(pk, connection)]
+    if delta < 0:
+        sql += f' AND {column} >= %s'
+        params.append(-delta)
+    with connection.cursor() as cursor:
+        cursor.execute(sql + f' RETURNING {column}', params)
+        row = cursor.fetchone()
+    if row is not None:
+        return row[0]
+    # Nothing matched: either no such row, or the decrement would go negative
+    return model._default_manager.filter(pk=pk).values_list(field_name, flat=True).first()
+
+
+class CounterBuffer:
+    """
+    Write-behind buffer for one counter column, kept in the shared cache tier.
+
+    add() only increments the object's key in the shared cache
+    (caching.incr), so every worker adds to the same pending count and it
+    outlives the worker that counted it. flush() reads the pending counts,
+    writes them with one UPDATE ... SET n = n + delta WHERE pk IN (...) per
+    distinct delta, then takes what it wrote off the keys; views that
+    arrive meanwhile stay pending. One flush runs at a time (a cache lock),
+    so any process may call it: the flush_video_views command, or the
+    daemon thread each process starts when `flush_interval` is set, every
+    `flush_interval` seconds (the bound on how stale the stored counts get)
+    and sooner once the process has added `max_pending` since.
+
+    The file and database caches cull entries when full (MAX_ENTRIES),
+    which can drop pending counts; size them or use Redis.
+    """
+
+    def __init__(self, model, field_name, interval_setting, max_pending_setting, chunk_size=500):
+        self.model = model
+        self.field_name = field_name
+        self.interval_setting = interval_setting
+        self.max_pending_setting = max_pending_setting
+        self.chunk_size = chunk_size
+        self._added = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, self.interval_setting)
+
+    def _key(self, pk):
+        return f'counter:{self.model._meta.label_lower}.{self.field_name}:{pk}'
+
+    def add(self, pk, n=1):
+        caching.incr(self._key(pk), n)
+        if self.flush_interval:
+            self._ensure_thread()
+            with self._lock:
+                self._added += n
+                waiting = self._added
+            if waiting >= getattr(settings, self.max_pending_setting):
+                self._wake.set()
+
+    def pending(self):
+        """{pk: count} of everything not written out yet."""
+        pending = {}
+        rows = self.model._default_manager.order_by('pk').values_list('pk', flat=True)
+        last_pk = None
+        while True:
+            pks = list((rows if last_pk is None else rows.filter(pk__gt=last_pk))[:self.chunk_size])
+            values = cache.get_many([self._key(pk) for pk in pks])
+            pending.update((pk, values[self._key(pk)]) for pk in pks if values.get(self._key(pk)))
+            if len(pks) < self.chunk_size:
+                return pending
+            last_pk = pks[-1]
+
+    def flush(self):
+        """Write out the pending increments; return how many were written."""
+        with self._lock:
+            self._added = 0
+        lock = self._key('flush')
+        if not cache.add(lock, 1, timeout=FLUSH_LOCK_TIMEOUT):
+            # Another process is flushing
+            return 0
+        try:
+            pending = self.pending()
+            if not pending:
+                return 0
+
+            by_delta = defaultdict(list)
+            for pk, delta in pending.items():
+                by_delta[delta].append(pk)
+            try:
+                with transaction.atomic(using=router.db_for_write(self.model)):
+                    for delta, pks in by_delta.items():
+                        self.model._default_manager.filter(pk__in=pks).update(
+                            **{self.field_name: F(self.field_name) + delta}
+                        )
+            except DatabaseError:
+                logger.exception("Could not flush %s.%s, keeping the increments", self.model.__name__, self.field_name)
+                return 0
+            for pk, delta in pending.items():
+                caching.incr(self._key(pk), -delta)
+            return sum(pending.values())
+        finally:
+            cache.delete(lock)
+
+    def _ensure_thread(self):
+        # After a fork the parent's thread does not exist in the child
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=f'{self.field_name}-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval or 1)
+            self._wake.clear()
+            if not self.flush_interval:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing %s.%s failed", self.model.__name__, self.field_name)
+            finally:
+                # Don't hold a connection open between flushes
+                connection.close()
+
+
+def _count_subquery(model, relation):
+    field = model._meta.get_field(relation)
+    rows = field.related_model._default_manager.filter(**{field.field.name: OuterRef('pk')})
+    counted = rows.order_by().values(field.field.name).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+def reconcile(model, counted, chunk_size=500, fix=False):
+    """
+    Compare counters with the rows they count, `chunk_size` objects at a time.
+
+    counted maps each counter field to the reverse relation it counts, e.g.
+    {'likes_count': 'likes'}. Returns [(pk, field, stored, actual)] for
+    every counter that was off; with fix=True they are also set to the
+    actual count. Fixing locks each chunk first, so a concurrent F() delta
+    either is already counted or lands on top of the corrected value.
+    """
+    actual = {f'actual_{field}': _count_subquery(model, relation) for field, relation in counted.items()}
+    drift = []
+    last_pk = None
+    while True:
+        rows = model._default_manager.order_by('pk')
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        with transaction.atomic():
+            if fix:
+                pks = list(rows.select_for_update().values_list('pk', flat=True)[:chunk_size])
+                chunk = model._default_manager.filter(pk__in=pks).order_by('pk')
+            else:
+                chunk = rows[:chunk_size]
+            chunk = list(chunk.annotate(**actual).values('pk', *counted, *actual))
+            for row in chunk:
+                changes = {}
+                for field in counted:
+                    if row[field] != row[f'actual_{field}']:
+                        drift.append((row['pk'], field, row[field], row[f'actual_{field}']))
+                        changes[field] = row[f'actual_{field}']
+                if fix and changes:
+                    model._default_manager.filter(pk=row['pk']).update(**changes)
+        if len(chunk) < chunk_size:
+            return drift
+        last_pk = chunk[-1]['pk']
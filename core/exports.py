@@ -0,0 +1,85 @@
+"""
+Streaming export of a user's expenses as CSV or JSON lines.
+
+Rows are read with QuerySet.iterator() (a server-side cursor on PostgreSQL)
+as plain tuples and written out in small batches, so memory use does not
+grow with the number of expenses and the header goes out right away.
+"""
+import csv
+import json
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+# Same columns as ExpenseSerializer, in the same order
+EXPORT_FIELDS = ['id', 'expense_date', 'category', 'category_name',
+                 'description', 'amount', 'location', 'receipt']
+EXPORT_COLUMNS = ['id', 'expense_date', 'category_id', 'category__name',
+                  'description', 'amount', 'location', 'receipt']
+
+CHUNK_SIZE = 2000
+ROWS_PER_WRITE = 500
+
+
+class CSVRenderer(BaseRenderer):
+    """Lets DRF negotiate ?format=csv / Accept: text/csv for the export view."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class JSONLinesRenderer(CSVRenderer):
+    """Same for ?format=jsonl / Accept: application/x-ndjson."""
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+
+
+def export_rows(queryset):
+    """Yield one tuple per expense, in EXPORT_FIELDS order."""
+    rows = queryset.order_by('expense_date', 'id').values_list(*EXPORT_COLUMNS)
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        receipt = row[-1]
+        yield row[:-1] + (default_storage.url(receipt) if receipt else None,)
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back what it is given."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+
+    batch = []
+    for row in rows:
+        batch.append(writer.writerow(row))
+        if len(batch) >= ROWS_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def render_jsonl(rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    batch = []
+    for row in rows:
+        batch.append(encoder.encode(dict(zip(EXPORT_FIELDS, row))) + '\n')
+        if len(batch) >= ROWS_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+RENDERERS = {
+    'csv': (render_csv, CSVRenderer.media_type),
+    'jsonl': (render_jsonl, JSONLinesRenderer.media_type),
+}
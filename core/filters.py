@@ -0,0 +1,127 @@
+"""
+Query-parameter filters for expense listings, exports and summaries.
+
+Everything is turned into predicates an index on (user, expense_date, ...)
+can use: year/month become a half-open date range instead of
+EXTRACT(YEAR/MONTH ...), category names are resolved to ids up front so
+the expense query needs no join, and multi-valued parameters become IN
+lists.
+
+Supported parameters (multi-valued ones may be repeated or comma-separated):
+    year, month                    calendar year / month (month needs year to use the index)
+    date_from, date_to             inclusive ISO dates
+    amount_min, amount_max         inclusive amounts
+    category_name                  case-insensitive names, multi-valued
+    category                       category ids, multi-valued
+    q                              text in the description or location (see core.search);
+                                   with sort=relevance, fuzzy matches too, best first
+"""
+import datetime
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from . import categories, search
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _values(params, key):
+    raw = params.getlist(key) if hasattr(params, 'getlist') else [params.get(key)]
+    return [value.strip() for item in raw if item for value in str(item).split(',') if value.strip()]
+
+
+def _parse(params, key, convert, message):
+    value = params.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        return convert(value)
+    except (ValueError, TypeError, InvalidOperation):
+        raise FilterError(message)
+
+
+def _month_range(year, month):
+    start = datetime.date(year, month, 1)
+    end = datetime.date(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+class ExpenseFilter:
+    def __init__(self, params):
+        self.year = _parse(params, 'year', int, 'Invalid year format')
+        self.month = _parse(params, 'month', int, 'Invalid month format')
+        self.date_from = _parse(params, 'date_from', datetime.date.fromisoformat, 'Invalid date_from')
+        self.date_to = _parse(params, 'date_to', datetime.date.fromisoformat, 'Invalid date_to')
+        self.amount_min = _parse(params, 'amount_min', Decimal, 'Invalid amount_min')
+        self.amount_max = _parse(params, 'amount_max', Decimal, 'Invalid amount_max')
+        self.category_names = _values(params, 'category_name')
+        self.q = (params.get('q') or '').strip()
+        self.rank_by_relevance = params.get('sort') == 'relevance'
+        try:
+            self.category_ids = [uuid.UUID(value) for value in _values(params, 'category')]
+        except ValueError:
+            raise FilterError('Invalid category id')
+
+        if self.month is not None and not 1 <= self.month <= 12:
+            raise FilterError('Invalid month format')
+        if self.year is not None and not datetime.MINYEAR <= self.year < datetime.MAXYEAR:
+            raise FilterError('Invalid year format')
+
+    def date_range(self):
+        """The [start, end) date range implied by year, month, date_from and date_to."""
+        start = end = None
+        if self.year is not None:
+            if self.month is not None:
+                start, end = _month_range(self.year, self.month)
+            else:
+                start, end = datetime.date(self.year, 1, 1), datetime.date(self.year + 1, 1, 1)
+        if self.date_from is not None:
+            start = max(start, self.date_from) if start else self.date_from
+        if self.date_to is not None:
+            day_after = self.date_to + datetime.timedelta(days=1)
+            end = min(end, day_after) if end else day_after
+        return start, end
+
+    def whole_months_only(self):
+        """True when only year, month and categories are set, so monthly rollups can answer."""
+        return (self.year is not None and self.date_from is None and self.date_to is None
+                and self.amount_min is None and self.amount_max is None and not self.q)
+
+    def resolve_category_ids(self):
+        """Category ids to filter on, or None when no category filter was given."""
+        if not self.category_names and not self.category_ids:
+            return None
+        ids = set(self.category_ids)
+        if self.category_names:
+            # From the in-process registry, so the lookup costs no query
+            matched = set().union(*(categories.registry.ids_named(name) for name in self.category_names))
+            # Names and ids together narrow each other down
+            ids = ids & matched if self.category_ids else matched
+        return ids
+
+    def apply(self, queryset):
+        start, end = self.date_range()
+        if start is not None:
+            queryset = queryset.filter(expense_date__gte=start)
+        if end is not None:
+            queryset = queryset.filter(expense_date__lt=end)
+        if self.month is not None and self.year is None:
+            # A month across every year has no single range to scan
+            queryset = queryset.filter(expense_date__month=self.month)
+
+        if self.amount_min is not None:
+            queryset = queryset.filter(amount__gte=self.amount_min)
+        if self.amount_max is not None:
+            queryset = queryset.filter(amount__lte=self.amount_max)
+
+        category_ids = self.resolve_category_ids()
+        if category_ids is not None:
+            if not category_ids:
+                return queryset.none()
+            queryset = queryset.filter(category_id__in=sorted(category_ids))
+
+        if self.q:
+            queryset = search.search_expenses(queryset, self.q, ranked=self.rank_by_relevance)
+        return queryset
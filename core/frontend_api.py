@@ -0,0 +1,151 @@
+"""
+How the template views reach the API.
+
+LocalFrontendAPI calls core.services in-process and is the default.
+HttpFrontendAPI keeps the old behaviour of calling our own API at
+settings.API_BASE_URL (through the pooled client in core.api_client) and is
+only used when FRONTEND_API_MODE is 'http'.
+Both return ApiResult(status_code, data) so the views don't care which one
+they got.
+"""
+import threading
+from collections import namedtuple
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404
+
+from . import services
+from .api_client import api_client
+
+User = get_user_model()
+
+ApiResult = namedtuple('ApiResult', ['status_code', 'data'])
+
+
+class FrontendAPIError(Exception):
+    """The API could not be reached (HTTP mode only)."""
+
+
+class LocalFrontendAPI:
+    # Calls are in-process queries: nothing to gain from running them concurrently
+    remote = False
+
+    def __init__(self, request):
+        self.request = request
+        self.token = request.session.get('token')
+        self.user_id = request.session.get('user_id')
+        self._user = None
+        self._user_loaded = False
+        self._user_lock = threading.Lock()
+
+    @property
+    def user(self):
+        # Same check TokenAuthentication does, but a single query and no HTTP hop.
+        # Locked in case a caller fans several methods out (core.concurrency).
+        with self._user_lock:
+            if not self._user_loaded:
+                if self.token and self.user_id:
+                    self._user = User.objects.filter(id=self.user_id, auth_token__key=self.token).first()
+                self._user_loaded = True
+            return self._user
+
+    def _call(self, func, *args, success_status=200, authenticated=True, **kwargs):
+        if authenticated and self.user is None:
+            return ApiResult(401, {'detail': 'Invalid token.'})
+        try:
+            return ApiResult(success_status, func(*args, **kwargs))
+        except services.ServiceError as e:
+            return ApiResult(e.status_code, e.errors)
+        except Http404:
+            return ApiResult(404, {'detail': 'Not found.'})
+
+    def register(self, data):
+        # The session keeps the DRF token, so no refresh token is stored
+        return self._call(services.register_user, data, refresh_token=False, success_status=201, authenticated=False)
+
+    def login(self, data):
+        return self._call(services.login_user, data, refresh_token=False, authenticated=False)
+
+    def get_profile(self):
+        return self._call(lambda: services.get_profile(self.user, self.request))
+
+    def update_profile_picture(self, profile_picture):
+        return self._call(lambda: services.update_profile_picture(self.user, profile_picture, self.request))
+
+    def get_income(self):
+        return self._call(lambda: services.get_income(self.user))
+
+    def update_income(self, data):
+        return self._call(lambda: services.update_income(self.user, self.user_id, data))
+
+    def list_expenses(self, params):
+        return self._call(services.list_expenses, self.user_id, params)
+
+    def add_expense(self, category_name, data):
+        return self._call(services.add_expense, self.user_id, category_name, data, success_status=201)
+
+    def update_expense(self, expense_id, data):
+        return self._call(lambda: services.update_expense(expense_id, data, user=self.user))
+
+    def list_categories(self):
+        return self._call(services.list_categories, authenticated=False)
+
+
+class HttpFrontendAPI:
+    remote = True
+
+    def __init__(self, request):
+        self.request = request
+        self.token = request.session.get('token')
+        self.user_id = request.session.get('user_id')
+
+    def _send(self, method, path, **kwargs):
+        headers = {'Authorization': f'Token {self.token}'} if self.token else {}
+        try:
+            response = api_client.request(method, path, headers=headers, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise FrontendAPIError(str(e)) from e
+
+        try:
+            data = response.json() if response.content else None
+        except ValueError:
+            data = None
+        return ApiResult(response.status_code, data)
+
+    def register(self, data):
+        return self._send('POST', '/users/', json=data)
+
+    def login(self, data):
+        return self._send('POST', '/users/login/', json=data)
+
+    def get_profile(self):
+        return self._send('GET', '/users/profile/')
+
+    def update_profile_picture(self, profile_picture):
+        return self._send('PUT', '/users/profile/', files={'profile_picture': profile_picture})
+
+    def get_income(self):
+        return self._send('GET', '/incomes/')
+
+    def update_income(self, data):
+        return self._send('PUT', f'/incomes/{self.user_id}/', json=data)
+
+    def list_expenses(self, params):
+        return self._send('GET', f'/expenses/{self.user_id}/', params=params)
+
+    def add_expense(self, category_name, data):
+        return self._send('POST', f'/expenses/add/{self.user_id}/{category_name}/', json=data)
+
+    def update_expense(self, expense_id, data):
+        return self._send('PUT', f'/expenses/update/{expense_id}/', json=data)
+
+    def list_categories(self):
+        return self._send('GET', '/categories/')
+
+
+def get_frontend_api(request):
+    if getattr(settings, 'FRONTEND_API_MODE', 'local') == 'http':
+        return HttpFrontendAPI(request)
+    return LocalFrontendAPI(request)
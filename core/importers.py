@@ -0,0 +1,295 @@
+"""
+Bulk import of bank statements (CSV or OFX) as expenses.
+
+Statements are read as a stream of transactions and written in batches
+of `batch_size`: one transaction per batch, a single bulk_create, one
+rollup update and one bump of the user's data version. Only the current
+batch is held in memory (plus a count per distinct row, see below).
+
+Every imported row carries a content hash (Expense.import_hash, unique
+per user): the OFX transaction id where there is one, otherwise the
+date, amount and text plus how many identical rows came before it in the
+file, so two equal coffees on the same day stay two expenses. Rows whose
+hash is already stored are skipped, which makes an import idempotent and
+lets an interrupted one be resumed by running it again.
+
+Amounts are rounded to the cent, as Expense.amount stores them, before
+anything else sees them, so the rows and the rollups get the same value;
+amounts too large for the column are reported like unreadable rows. CSV
+amounts use the statement's decimal and thousands separators ('.' and ','
+by default); one whose thousands separators are not every three digits,
+like "12,50" with the defaults, is ambiguous and reported the same way
+rather than read as 1250. OFX amounts have no thousands separator and
+may use a comma for the decimal point.
+
+Categories come from rules, (pattern, category name) pairs tried in
+order against the merchant and the description (case-insensitive regular
+expressions); the first match wins. Merchants repeat a lot in a
+statement, so matches are cached per text.
+"""
+import csv
+import datetime
+import hashlib
+import html
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.db import transaction
+
+from . import caching, categories, rollups
+from .models import Expense
+
+
+class StatementError(Exception):
+    """A statement that cannot be read (bad format, missing column, unknown category)."""
+
+
+@dataclass
+class Transaction:
+    date: datetime.date
+    amount: Decimal
+    description: str
+    merchant: str = ''
+    transaction_id: str = ''
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    existing: int = 0
+    skipped: int = 0
+    batches: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def rows(self):
+        return self.created + self.existing + self.skipped
+
+
+# Statements
+
+_amount_field = Expense._meta.get_field('amount')
+CENT = Decimal(1).scaleb(-_amount_field.decimal_places)
+# Smallest amount that no longer fits the column
+AMOUNT_LIMIT = Decimal(10) ** (_amount_field.max_digits - _amount_field.decimal_places)
+
+
+def _amount(value, decimal_separator='.', thousands_separator=','):
+    try:
+        text = value.strip()
+    except AttributeError:
+        raise ValueError(f'invalid amount {value!r}')
+    if thousands_separator and thousands_separator in text:
+        groups = text.split(decimal_separator)[0].lstrip('+-').split(thousands_separator)
+        if not (1 <= len(groups[0]) <= 3 and all(len(group) == 3 for group in groups[1:])):
+            raise ValueError(f'ambiguous amount {value!r} (decimal separator {decimal_separator!r}, '
+                             f'thousands separator {thousands_separator!r})')
+        text = text.replace(thousands_separator, '')
+    if decimal_separator != '.':
+        if '.' in text:
+            raise ValueError(f'invalid amount {value!r}')
+        text = text.replace(decimal_separator, '.')
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f'invalid amount {value!r}')
+    if not amount.is_finite():
+        raise ValueError(f'invalid amount {value!r}')
+    if abs(amount) < AMOUNT_LIMIT:
+        amount = amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    if abs(amount) >= AMOUNT_LIMIT:
+        raise ValueError(f'amount {value!r} out of range')
+    return amount
+
+
+def read_csv(stream, date_column='date', amount_column='amount', description_column='description',
+             merchant_column=None, date_format='%Y-%m-%d', decimal_separator='.', thousands_separator=','):
+    """Transactions from a CSV statement with a header row; unreadable rows come through as ValueError."""
+    if not decimal_separator or decimal_separator == thousands_separator:
+        raise StatementError('The decimal separator must be set and differ from the thousands separator.')
+    reader = csv.DictReader(stream)
+    required = [date_column, amount_column, description_column] + ([merchant_column] if merchant_column else [])
+    missing = [column for column in required if column not in (reader.fieldnames or [])]
+    if missing:
+        raise StatementError(f'Missing column(s): {", ".join(missing)}')
+    for line, row in enumerate(reader, start=2):
+        try:
+            yield Transaction(
+                date=datetime.datetime.strptime(row[date_column].strip(), date_format).date(),
+                amount=_amount(row[amount_column], decimal_separator, thousands_separator),
+                description=row[description_column].strip(),
+                merchant=row[merchant_column].strip() if merchant_column else '',
+            )
+        except ValueError as e:
+            yield ValueError(f'line {line}: {e}')
+
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _ofx_tags(stream, chunk_size=64 * 1024):
+    """(closing, tag, text) for every tag in an OFX file (SGML or XML), read in chunks; entities are decoded."""
+    buffer = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        # Keep back the last, possibly incomplete, tag until more arrives
+        end = buffer.rfind('<') if chunk else len(buffer)
+        for match in OFX_TAG.finditer(buffer, 0, end):
+            yield match.group(1) == '/', match.group(2).upper(), html.unescape(match.group(3).strip())
+        buffer = buffer[end:]
+        if not chunk:
+            return
+
+
+def _ofx_date(value):
+    # YYYYMMDD, optionally followed by a time and a [zone]
+    return datetime.datetime.strptime(value[:8], '%Y%m%d').date()
+
+
+def read_ofx(stream):
+    """Transactions (STMTTRN records) from an OFX statement."""
+    record = None
+    for closing, tag, text in _ofx_tags(stream):
+        if tag == 'STMTTRN':
+            if not closing:
+                record = {}
+                continue
+            if record is not None:
+                try:
+                    yield Transaction(
+                        date=_ofx_date(record['DTPOSTED']),
+                        amount=_amount(record['TRNAMT'].replace(',', '.'), thousands_separator=''),
+                        description=record.get('MEMO') or record.get('NAME', ''),
+                        merchant=record.get('NAME', ''),
+                        transaction_id=record.get('FITID', ''),
+                    )
+                except (KeyError, ValueError) as e:
+                    yield ValueError(f'transaction {record.get("FITID", "?")}: {e}')
+            record = None
+        elif record is not None and not closing and text:
+            record[tag] = text
+    if record is not None:
+        # SGML statements may leave the last STMTTRN unclosed
+        raise StatementError('Statement ends inside a transaction.')
+
+
+READERS = {'csv': read_csv, 'ofx': read_ofx}
+
+
+# Categories
+
+class CategoryRules:
+    def __init__(self, rules, default=None):
+        self.rules = []
+        for pattern, name in rules:
+            category = categories.registry.get_by_name(name)
+            if category is None:
+                raise StatementError(f'Unknown category {name!r}')
+            self.rules.append((re.compile(pattern, re.IGNORECASE), category))
+        self.default = None
+        if default is not None:
+            self.default = categories.registry.get_by_name(default)
+            if self.default is None:
+                raise StatementError(f'Unknown category {default!r}')
+        self.match = lru_cache(maxsize=4096)(self._match)
+
+    def _match(self, text):
+        for pattern, category in self.rules:
+            if pattern.search(text):
+                return category
+        return None
+
+    def category_for(self, row):
+        for text in (row.merchant, row.description):
+            if text:
+                category = self.match(text)
+                if category is not None:
+                    return category
+        return self.default
+
+
+def read_rules(stream):
+    """(pattern, category name) pairs from a two-column CSV file."""
+    return [(row[0], row[1].strip()) for row in csv.reader(stream) if len(row) >= 2 and row[0].strip()]
+
+
+# Import
+
+def row_key(row):
+    if row.transaction_id:
+        return f'fitid:{row.transaction_id}'
+    text = ' '.join(f'{row.merchant} {row.description}'.casefold().split())
+    return f'{row.date.isoformat()}|{row.amount}|{text}'
+
+
+def row_hash(key, occurrence):
+    return hashlib.sha256(f'{key}|{occurrence}'.encode()).hexdigest()
+
+
+def _expenses(transactions, user, rules, expenses_are, result):
+    sign = -1 if expenses_are == 'negative' else 1
+    seen = Counter()
+    for row in transactions:
+        if isinstance(row, ValueError):
+            result.errors.append(str(row))
+            result.skipped += 1
+            continue
+        amount = row.amount * sign
+        if amount <= 0:
+            # A credit (refund, salary), or less than half a cent: not an expense
+            result.skipped += 1
+            continue
+        key = row_key(row)
+        seen[key] += 1
+        yield Expense(
+            user=user,
+            category=rules.category_for(row),
+            amount=amount,
+            description=row.description,
+            location=row.merchant[:255],
+            expense_date=row.date,
+            import_hash=row_hash(key, seen[key]),
+        )
+
+
+def _write_batch(user, batch, result):
+    hashes = [expense.import_hash for expense in batch]
+    with transaction.atomic():
+        existing = set(Expense.objects.filter(user=user, import_hash__in=hashes).values_list('import_hash', flat=True))
+        new = [expense for expense in batch if expense.import_hash not in existing]
+        if new:
+            Expense.objects.bulk_create(new)
+            deltas = rollups.RollupDeltas()
+            for expense in new:
+                deltas.created(expense)
+            deltas.apply()
+            caching.bump_user_data_version(user.id)
+    result.created += len(new)
+    result.existing += len(batch) - len(new)
+    result.batches += 1
+
+
+def import_transactions(user, transactions, rules, batch_size=1000, expenses_are='negative', progress=None):
+    """
+    Import transactions for user, batch_size rows per transaction. Rows
+    with the sign of `expenses_are` become expenses, the others are
+    skipped. progress(result) is called after each batch.
+    """
+    result = ImportResult()
+    batch = []
+    for expense in _expenses(transactions, user, rules, expenses_are, result):
+        batch.append(expense)
+        if len(batch) >= batch_size:
+            _write_batch(user, batch, result)
+            batch = []
+            if progress:
+                progress(result)
+    if batch:
+        _write_batch(user, batch, result)
+        if progress:
+            progress(result)
+    return result
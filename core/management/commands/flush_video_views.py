@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core import services
+
+
+class Command(BaseCommand):
+    help = ("Write the video views counted in the shared cache out to Video.view_count. "
+            "Run it from cron when VIDEO_VIEW_FLUSH_INTERVAL is 0.")
+
+    def handle(self, *args, **options):
+        flushed = services.video_views.flush()
+        self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} video view(s)."))
@@ -0,0 +1,108 @@
+import os
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import importers
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_memory_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024)
+
+
+class Command(BaseCommand):
+    help = ("Import a bank statement (CSV or OFX) as a user's expenses. Rows already imported are skipped, "
+            "so an interrupted import can simply be run again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help="User id or username.")
+        parser.add_argument('statement', help="Path of the CSV or OFX file.")
+        parser.add_argument('--format', choices=sorted(importers.READERS),
+                            help="Statement format (default: from the file extension).")
+        parser.add_argument('--rules', metavar='FILE',
+                            help="CSV of pattern,category rows; the first pattern matching the merchant or "
+                                 "description (case-insensitive regex) picks the category.")
+        parser.add_argument('--default-category', metavar='NAME',
+                            help="Category for rows no rule matches (default: none).")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows per insert and transaction (default 1000).")
+        parser.add_argument('--expenses-are', choices=('negative', 'positive'), default='negative',
+                            help="Sign of the amounts that are expenses; other rows are skipped (default negative).")
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--date-column', default='date')
+        parser.add_argument('--amount-column', default='amount')
+        parser.add_argument('--description-column', default='description')
+        parser.add_argument('--merchant-column')
+        parser.add_argument('--date-format', default='%Y-%m-%d', help="strptime format of CSV dates.")
+        parser.add_argument('--decimal-separator', default='.', help="Decimal separator of CSV amounts (default '.').")
+        parser.add_argument('--thousands-separator', default=',',
+                            help="Thousands separator of CSV amounts (default ','; '' for none). Amounts where "
+                                 "it does not separate groups of three digits are skipped as ambiguous.")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        user = self.get_user(options['user'])
+        statement_format = options['format'] or os.path.splitext(options['statement'])[1].lstrip('.').lower()
+        if statement_format not in importers.READERS:
+            raise CommandError(f"Unknown statement format {statement_format!r}; pass --format.")
+
+        try:
+            rules = []
+            if options['rules']:
+                with open(options['rules'], newline='', encoding=options['encoding']) as stream:
+                    rules = importers.read_rules(stream)
+            rules = importers.CategoryRules(rules, default=options['default_category'])
+
+            started = time.perf_counter()
+            with open(options['statement'], newline='', encoding=options['encoding']) as stream:
+                if statement_format == 'csv':
+                    transactions = importers.read_csv(
+                        stream, options['date_column'], options['amount_column'], options['description_column'],
+                        options['merchant_column'], options['date_format'],
+                        options['decimal_separator'], options['thousands_separator'],
+                    )
+                else:
+                    transactions = importers.read_ofx(stream)
+                result = importers.import_transactions(
+                    user, transactions, rules, batch_size=options['batch_size'],
+                    expenses_are=options['expenses_are'], progress=self.progress,
+                )
+        except (OSError, UnicodeDecodeError, importers.StatementError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        for error in result.errors:
+            self.stderr.write(f"Skipped {error}")
+        rate = result.rows / elapsed if elapsed else 0
+        peak = peak_memory_mb()
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} expense(s), {result.existing} already there, {result.skipped} skipped; "
+            f"{result.rows} row(s) in {elapsed:.1f}s ({rate:.0f} rows/s)"
+            + (f", peak memory {peak:.0f} MB" if peak is not None else '') + '.'
+        ))
+
+    def get_user(self, value):
+        User = get_user_model()
+        try:
+            lookup = {'pk': uuid.UUID(value)}
+        except ValueError:
+            lookup = {'username': value}
+        try:
+            return User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"No user {value!r}.")
+
+    def progress(self, result):
+        if self.verbosity > 1:
+            self.stdout.write(f"{result.rows} row(s), {result.created} created")
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild ExpenseMonthlyRollup from the raw expenses, or verify it with --verify."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help="Only compare the stored rollups with the raw expenses and report drift.")
+        parser.add_argument('--user', action='append', dest='user_ids', metavar='USER_ID',
+                            help="Limit to this user id (can be repeated).")
+
+    def handle(self, *args, verify=False, user_ids=None, **options):
+        if verify:
+            drift = rollups.verify(user_ids)
+            for (user_id, year, month, category_id), (stored, computed) in sorted(drift.items(), key=str):
+                self.stdout.write(
+                    f"{user_id} {year}-{month:02d} category={category_id}: stored={stored} computed={computed}"
+                )
+            if drift:
+                raise CommandError(f"{len(drift)} rollup row(s) out of date; run without --verify to rebuild.")
+            self.stdout.write(self.style.SUCCESS("Rollups match the raw expenses."))
+            return
+
+        count = rollups.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} rollup row(s)."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import conditional, counters
+from core.models import Video
+
+VIDEO_COUNTERS = {'likes_count': 'likes', 'comments_count': 'comments'}
+
+
+class Command(BaseCommand):
+    help = "Recompute Video.likes_count and comments_count from the likes and comments, and report drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help="Only report drift, and fail if there is any; don't fix it.")
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Videos to check per query (default 500).")
+
+    def handle(self, *args, verify=False, chunk_size=500, **options):
+        drift = counters.reconcile(Video, VIDEO_COUNTERS, chunk_size=chunk_size, fix=not verify)
+        for pk, field, stored, actual in drift:
+            self.stdout.write(f"{pk} {field}: stored={stored} actual={actual}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("All video counters match."))
+        elif verify:
+            raise CommandError(f"{len(drift)} video counter(s) out of date; run without --verify to fix them.")
+        else:
+            # The fixed counts are in the video responses clients may have cached
+            conditional.bump_video_version()
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(drift)} video counter(s)."))
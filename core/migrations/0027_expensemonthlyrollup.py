@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-18 01:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def backfill_rollups(apps, schema_editor):
+    Expense = apps.get_model('core', 'Expense')
+    ExpenseMonthlyRollup = apps.get_model('core', 'ExpenseMonthlyRollup')
+
+    rows = Expense.objects.annotate(
+        year=ExtractYear('expense_date'), month=ExtractMonth('expense_date')
+    ).values('user_id', 'year', 'month', 'category_id').annotate(
+        total=Sum('amount'), count=Count('id')
+    ).order_by()
+    ExpenseMonthlyRollup.objects.bulk_create(
+        [ExpenseMonthlyRollup(**row) for row in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_expense_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.category')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='expense_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'year', 'month', 'category'), name='expense_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
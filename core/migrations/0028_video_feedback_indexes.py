@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_expensemonthlyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='videocomment',
+            index=models.Index(fields=['video', 'created_at', 'id'], name='comment_video_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='videoreview',
+            index=models.Index(fields=['video', 'created_at', 'id'], name='review_video_created_idx'),
+        ),
+    ]
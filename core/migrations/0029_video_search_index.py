@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# A stored generated tsvector column, so ranking reads the parsed document
+# instead of running to_tsvector() again for every matching row. The model
+# doesn't declare it; core.search queries it by name.
+POSTGRES_SEARCH = [
+    """
+    ALTER TABLE core_video ADD COLUMN search_document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX video_search_idx ON core_video USING gin (search_document)",
+]
+
+# FTS5 table with its own copy of the text, kept in step by triggers. It is
+# keyed on the video id rather than core_video's rowid, which VACUUM and
+# table rebuilds are free to renumber.
+SQLITE_FTS = [
+    """
+    CREATE VIRTUAL TABLE core_video_fts USING fts5(
+        video_id UNINDEXED, title, description, tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER core_video_fts_insert AFTER INSERT ON core_video BEGIN
+        INSERT INTO core_video_fts(video_id, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER core_video_fts_delete AFTER DELETE ON core_video BEGIN
+        DELETE FROM core_video_fts WHERE video_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_video_fts_update AFTER UPDATE OF id, title, description ON core_video BEGIN
+        UPDATE core_video_fts SET video_id = new.id, title = new.title, description = new.description
+        WHERE video_id = old.id;
+    END
+    """,
+    "INSERT INTO core_video_fts(video_id, title, description) SELECT id, title, description FROM core_video",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        for statement in POSTGRES_SEARCH:
+            schema_editor.execute(statement)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FTS:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS video_search_idx")
+        schema_editor.execute("ALTER TABLE core_video DROP COLUMN IF EXISTS search_document")
+    elif vendor == 'sqlite':
+        for trigger in ('insert', 'delete', 'update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS core_video_fts_{trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS core_video_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_video_feedback_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_expense_import_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoSearchEntry',
+            fields=[
+                ('video', models.OneToOneField(db_column='video_id', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='core.video')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+            ],
+            options={
+                'db_table': 'core_video_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:50
+
+from django.db import migrations
+from django.db.models import Q, Sum
+
+
+def merge_uncategorised(apps, schema_editor):
+    # Duplicate NULL-category rows, and rows of categories deleted before
+    # core.rollups moved them, become one uncategorised row per month
+    Category = apps.get_model('core', 'Category')
+    ExpenseMonthlyRollup = apps.get_model('core', 'ExpenseMonthlyRollup')
+
+    rows = ExpenseMonthlyRollup.objects.filter(
+        Q(category__isnull=True) | ~Q(category_id__in=Category.objects.values('pk'))
+    )
+    merged = list(rows.values('user_id', 'year', 'month').annotate(total=Sum('total'), count=Sum('count')).order_by())
+    if not merged:
+        return
+    rows.delete()
+    ExpenseMonthlyRollup.objects.bulk_create(
+        [ExpenseMonthlyRollup(user_id=row['user_id'], year=row['year'], month=row['month'], category=None,
+                              total=row['total'], count=row['count']) for row in merged],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_video_search_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_uncategorised, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_merge_uncategorised_rollups'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='expensemonthlyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user', 'year', 'month'), name='expense_rollup_unique_uncategorised'),
+        ),
+    ]
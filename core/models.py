@@ -7,6 +7,18 @@ class User(AbstractUser):
     email = models.EmailField(unique=True)
     profile_picture = models.ImageField(upload_to='profile_pictures/', null=True, blank=True)
     # username and password are already in AbstractUser
+
+    # Set on users built from access token claims (core.tokens.user_from_claims):
+    # those values may be stale, so they must never be written back
+    claimed_fields = frozenset()
+
+    def save(self, *args, **kwargs):
+        if self.claimed_fields:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None or self.claimed_fields.intersection(update_fields):
+                raise ValueError("This user was built from an access token; save only unclaimed fields "
+                                 "with update_fields, or load it from the database first.")
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.username
@@ -36,9 +48,24 @@ class Video(models.Model):
     def __str__(self):
         return self.title
 
+class VideoSearchEntry(models.Model):
+    """
+    A row of the SQLite FTS5 table over videos (migration 0029, core/search.py).
+    Unmanaged and only used to join it in searches; PostgreSQL has no such table.
+    """
+    video = models.OneToOneField(Video, primary_key=True, db_column='video_id', db_constraint=False,
+                                 on_delete=models.DO_NOTHING, related_name='search_entry')
+    title = models.TextField()
+    description = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = 'core_video_fts'
+
 class Expense(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expenses')
+    # Indexed through the composite indexes in Meta, which all start with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expenses', db_index=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='expenses')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True)
@@ -46,10 +73,49 @@ class Expense(models.Model):
     location = models.CharField(max_length=255, blank=True)
     receipt = models.FileField(upload_to='expense_receipts/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Content hash of the statement row an expense was imported from (see
+    # core/importers.py); importing the same row again is a no-op
+    import_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
+
+    class Meta:
+        # Every expense query starts with the user, then narrows by date or
+        # category or orders by amount. The trailing id serves keyset pagination.
+        indexes = [
+            models.Index(fields=['user', 'expense_date', 'id'], name='expense_user_date_idx'),
+            models.Index(fields=['user', 'category', 'expense_date'], name='expense_user_cat_date_idx'),
+            models.Index(fields=['user', 'amount', 'id'], name='expense_user_amount_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'import_hash'], condition=models.Q(import_hash__isnull=False),
+                                    name='expense_user_import_hash_uniq'),
+        ]
     
     def __str__(self):
         return f"{self.amount} - {self.description}"
 
+class ExpenseMonthlyRollup(models.Model):
+    """Per-user monthly expense totals by category, kept in step with Expense writes by core.rollups."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expense_rollups', db_index=False)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    # No constraint or cascade: deleting a category sets its expenses' category
+    # to NULL, and core.rollups moves the category's rows to NULL to match
+    category = models.ForeignKey(Category, on_delete=models.DO_NOTHING, db_constraint=False,
+                                 null=True, related_name='+')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year', 'month', 'category'], name='expense_rollup_unique'),
+            # NULLs are distinct in the constraint above, so one uncategorised row per month needs its own
+            models.UniqueConstraint(fields=['user', 'year', 'month'], condition=models.Q(category__isnull=True),
+                                    name='expense_rollup_unique_uncategorised'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.year}-{self.month:02d} {self.category_id}: {self.total}"
+
 class Income(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="incomes")
@@ -82,6 +148,12 @@ class VideoComment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        # Keyset pages of a video's comments, newest first
+        indexes = [
+            models.Index(fields=['video', 'created_at', 'id'], name='comment_video_created_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user.username} on {self.video.title}"
 
@@ -98,6 +170,9 @@ class VideoReview(models.Model):
     class Meta:
         # Ensure a user can only review a video once
         unique_together = ('user', 'video')
+        indexes = [
+            models.Index(fields=['video', 'created_at', 'id'], name='review_video_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username}'s {self.rating}-star review of {self.video.title}"
\ No newline at end of file
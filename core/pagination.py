@@ -0,0 +1,94 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are selected with a WHERE on the ordering columns of the last row
+seen, e.g. (expense_date, id) < (d, i), so each page is a range scan on an
+index instead of an OFFSET that has to walk every earlier row. The last
+ordering field must be unique (the primary key) to give a total order.
+"""
+import base64
+import binascii
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+class KeysetPaginator:
+    def __init__(self, ordering, page_size):
+        self.ordering = tuple(ordering)
+        self.page_size = page_size
+
+    # Cursors are opaque to clients: base64 of the position and direction
+
+    def encode_cursor(self, obj, reverse):
+        position = [str(getattr(obj, field.lstrip('-'))) for field in self.ordering]
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, model, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            position, reverse = payload['p'], bool(payload['r'])
+            if len(position) != len(self.ordering):
+                raise InvalidCursor('Invalid cursor')
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError) as e:
+            raise InvalidCursor('Invalid cursor') from e
+        return values, reverse
+
+    @staticmethod
+    def _flip(ordering):
+        return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+    @staticmethod
+    def _after(ordering, values):
+        # (a, b, c) after (x, y, z) == a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        clauses = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {f.lstrip('-'): v for f, v in zip(ordering[:i], values[:i])}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+        return reduce(lambda a, b: a | b, clauses)
+
+    def paginate(self, queryset, cursor=None):
+        values, reverse = self.decode_cursor(queryset.model, cursor) if cursor else (None, False)
+
+        ordering = self._flip(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+
+        # One extra row tells us whether there is another page in this direction
+        items = list(queryset[:self.page_size + 1])
+        has_more = len(items) > self.page_size
+        items = items[:self.page_size]
+
+        if reverse:
+            items.reverse()
+            has_next, has_prev = values is not None, has_more
+        else:
+            has_next, has_prev = has_more, values is not None
+
+        return KeysetPage(
+            items,
+            next_cursor=self.encode_cursor(items[-1], False) if items and has_next else None,
+            prev_cursor=self.encode_cursor(items[0], True) if items and has_prev else None,
+        )
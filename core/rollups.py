@@ -0,0 +1,141 @@
+"""
+Keeps ExpenseMonthlyRollup in step with Expense writes.
+
+The service layer calls these inside the same transaction as the expense
+write: RollupDeltas collects signed deltas per (user, year, month, category) and
+apply() folds them into the rollup rows with F() increments, so a batch of
+writes costs one UPDATE per touched month and category, not one per expense.
+
+Deleting a category sets its expenses' category to NULL; in the same
+transaction, its rollup rows are folded into the uncategorised (NULL) ones.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import Category, Expense, ExpenseMonthlyRollup
+
+
+def rollup_key(user_id, expense_date, category_id):
+    return (user_id, expense_date.year, expense_date.month, category_id)
+
+
+class RollupDeltas:
+    def __init__(self):
+        self._deltas = defaultdict(lambda: [Decimal('0'), 0])
+
+    def add(self, user_id, expense_date, category_id, amount, count):
+        delta = self._deltas[rollup_key(user_id, expense_date, category_id)]
+        delta[0] += Decimal(amount)
+        delta[1] += count
+
+    def created(self, expense):
+        self.add(expense.user_id, expense.expense_date, expense.category_id, expense.amount, 1)
+
+    def deleted(self, expense):
+        self.add(expense.user_id, expense.expense_date, expense.category_id, -Decimal(expense.amount), -1)
+
+    def changed(self, before, expense):
+        """before is (user_id, expense_date, category_id, amount) from ahead of the update."""
+        user_id, expense_date, category_id, amount = before
+        self.add(user_id, expense_date, category_id, -Decimal(amount), -1)
+        self.created(expense)
+
+    def apply(self):
+        for (user_id, year, month, category_id), (amount, count) in self._deltas.items():
+            if not amount and not count:
+                continue
+            _apply_one(user_id, year, month, category_id, amount, count)
+        self._deltas.clear()
+
+
+def _apply_one(user_id, year, month, category_id, amount, count):
+    rows = ExpenseMonthlyRollup.objects.filter(user_id=user_id, year=year, month=month, category_id=category_id)
+    if rows.update(total=F('total') + amount, count=F('count') + count):
+        return
+    try:
+        with transaction.atomic():
+            ExpenseMonthlyRollup.objects.create(
+                user_id=user_id, year=year, month=month, category_id=category_id, total=amount, count=count
+            )
+    except IntegrityError:
+        # Another transaction created the row first
+        rows.update(total=F('total') + amount, count=F('count') + count)
+
+
+@receiver(pre_delete, sender=Category, dispatch_uid='rollups_category_delete')
+def uncategorise(sender, instance, using, **kwargs):
+    # Runs inside the deletion's transaction, as the expenses are set to NULL
+    rows = ExpenseMonthlyRollup.objects.using(using).select_for_update().filter(category_id=instance.pk)
+    deltas = RollupDeltas()
+    for row in rows:
+        deltas.add(row.user_id, datetime.date(row.year, row.month, 1), None, row.total, row.count)
+    rows.delete()
+    deltas.apply()
+
+
+def snapshot(expense):
+    """The rollup-relevant fields of an expense, taken before it is updated."""
+    return (expense.user_id, expense.expense_date, expense.category_id, expense.amount)
+
+
+def computed_rollups(user_ids=None):
+    """Rollup rows computed from the raw expenses, as {key: (total, count)}."""
+    expenses = Expense.objects.all()
+    if user_ids is not None:
+        expenses = expenses.filter(user_id__in=user_ids)
+    rows = expenses.annotate(
+        year=ExtractYear('expense_date'), month=ExtractMonth('expense_date')
+    ).values('user_id', 'year', 'month', 'category_id').annotate(
+        total=Sum('amount'), count=Count('id')
+    ).order_by()
+    return {
+        (row['user_id'], row['year'], row['month'], row['category_id']): (row['total'], row['count'])
+        for row in rows
+    }
+
+
+def stored_rollups(user_ids=None):
+    rollups = ExpenseMonthlyRollup.objects.exclude(count=0, total=0)
+    if user_ids is not None:
+        rollups = rollups.filter(user_id__in=user_ids)
+    return {
+        (row.user_id, row.year, row.month, row.category_id): (row.total, row.count)
+        for row in rollups
+    }
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """Replace the stored rollups with ones computed from the raw expenses."""
+    computed = computed_rollups(user_ids)
+    with transaction.atomic():
+        stale = ExpenseMonthlyRollup.objects.all()
+        if user_ids is not None:
+            stale = stale.filter(user_id__in=user_ids)
+        stale.delete()
+        ExpenseMonthlyRollup.objects.bulk_create(
+            [
+                ExpenseMonthlyRollup(user_id=user_id, year=year, month=month, category_id=category_id,
+                                     total=total, count=count)
+                for (user_id, year, month, category_id), (total, count) in computed.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(computed)
+
+
+def verify(user_ids=None):
+    """Return {key: (stored, computed)} for every rollup that disagrees with the raw expenses."""
+    computed = computed_rollups(user_ids)
+    stored = stored_rollups(user_ids)
+    return {
+        key: (stored.get(key), computed.get(key))
+        for key in computed.keys() | stored.keys()
+        if stored.get(key) != computed.get(key)
+    }
@@ -0,0 +1,140 @@
+"""
+Text search: full-text over videos, substring and trigram over expenses.
+
+Videos
+
+On PostgreSQL a stored generated column holds a weighted tsvector of
+title (A) and description (B); a GIN index on it answers the match and
+ts_rank orders the results. On SQLite an FTS5 table does the same,
+ranked by bm25, joined through the unmanaged VideoSearchEntry model.
+Both are created by migration 0029 and follow every
+insert, update and delete on core_video: PostgreSQL recomputes the
+column itself, SQLite has triggers (which a table rebuild by a later
+migration would drop).
+
+Other databases fall back to icontains, unranked.
+
+Expenses
+The `q` filter is a case-insensitive substring match on description and
+location. With pg_trgm installed (migration 0030 adds it where the server
+offers it), GIN trigram indexes answer that ILIKE, and the ranked mode
+also accepts fuzzy matches and orders them by trigram similarity.
+Anywhere else the same substring match runs unindexed, and the ranked
+mode puts exact, then prefix matches first.
+"""
+import re
+
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import BooleanField, Case, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+from .models import Video
+
+TEXT_SEARCH_CONFIG = 'english'
+
+VIDEO_DOCUMENT_COLUMN = 'search_document'
+VIDEO_FTS_TABLE = 'core_video_fts'
+FTS_WEIGHTS = (0.0, 10.0, 1.0)  # video_id, title, description
+
+
+def _fts_query(query):
+    """Turn free text into an FTS5 query: every word, as a quoted term, must match."""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def _postgresql(queryset, query):
+    qn = connection.ops.quote_name
+    document = f'{qn(Video._meta.db_table)}.{qn(VIDEO_DOCUMENT_COLUMN)}'
+    tsquery = f"websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', %s)"
+    return queryset.filter(
+        RawSQL(f'{document} @@ {tsquery}', [query], output_field=BooleanField())
+    ).annotate(
+        search_rank=RawSQL(f'ts_rank({document}, {tsquery})', [query], output_field=FloatField())
+    ).order_by('-search_rank', '-created_at')
+
+
+def _sqlite(queryset, query):
+    match = _fts_query(query)
+    if not match:
+        return queryset.none()
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    # A join (through the unmanaged VideoSearchEntry), so SQLite starts from
+    # the FTS match and computes bm25() in the same pass; a correlated
+    # subquery per row would re-run the match
+    return queryset.filter(
+        Q(search_entry__isnull=False),
+        RawSQL(f'{VIDEO_FTS_TABLE} MATCH %s', [match], output_field=BooleanField()),
+    ).annotate(
+        # bm25() is lower for better matches
+        search_rank=RawSQL(f'bm25({VIDEO_FTS_TABLE}, {weights})', [], output_field=FloatField())
+    ).order_by('search_rank', '-created_at')
+
+
+def _icontains(queryset, query):
+    return queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
+
+
+def search_videos(queryset, query):
+    """Videos in queryset matching query, best matches first."""
+    query = query.strip()
+    if not query:
+        return queryset
+    if connection.vendor == 'postgresql':
+        return _postgresql(queryset, query)
+    if connection.vendor == 'sqlite':
+        return _sqlite(queryset, query)
+    return _icontains(queryset, query).order_by('-created_at')
+
+
+EXPENSE_TEXT_FIELDS = ('description', 'location')
+
+_trigram_databases = {}
+
+
+def trigram_available():
+    """Whether pg_trgm is installed in the current database (checked once per database)."""
+    if connection.vendor != 'postgresql':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _trigram_databases:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _trigram_databases[name] = cursor.fetchone() is not None
+    return _trigram_databases[name]
+
+
+def _contains(query):
+    condition = Q()
+    for field in EXPENSE_TEXT_FIELDS:
+        condition |= Q(**{f'{field}__icontains': query})
+    return condition
+
+
+def search_expenses(queryset, query, ranked=False):
+    """
+    Expenses whose description or location contains query. With ranked=True
+    the matches carry a `search_rank` and come back best first.
+    """
+    if not ranked:
+        return queryset.filter(_contains(query))
+
+    if trigram_available():
+        # ILIKE and % (similar) are both answered by the gin_trgm_ops indexes
+        condition = _contains(query)
+        for field in EXPENSE_TEXT_FIELDS:
+            condition |= TrigramSimilar(F(field), query)
+        rank = Greatest(*(TrigramSimilarity(field, query) for field in EXPENSE_TEXT_FIELDS))
+        return queryset.filter(condition).annotate(search_rank=rank).order_by('-search_rank', '-expense_date', '-id')
+
+    exact = Q(**{f'{EXPENSE_TEXT_FIELDS[0]}__iexact': query})
+    prefix = Q(**{f'{EXPENSE_TEXT_FIELDS[0]}__istartswith': query})
+    for field in EXPENSE_TEXT_FIELDS[1:]:
+        exact |= Q(**{f'{field}__iexact': query})
+        prefix |= Q(**{f'{field}__istartswith': query})
+    rank = Case(When(exact, then=Value(2)), When(prefix, then=Value(1)), default=Value(0),
+                output_field=IntegerField())
+    return queryset.filter(_contains(query)).annotate(search_rank=rank).order_by('-search_rank', '-expense_date', '-id')
@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from .models import Expense, Income, Video, Category, VideoComment, VideoLike, VideoReview
+from . import categories
 import hashlib
 
 User = get_user_model()
@@ -81,19 +82,42 @@ class IncomeSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Budget amount cannot be negative")
         return value
 
+class CachedCategoryField(serializers.PrimaryKeyRelatedField):
+    """Category by id, looked up in the in-process registry rather than the database."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, Category):
+            return data
+        category = categories.registry.get(data)
+        if category is None:
+            self.fail('does_not_exist', pk_value=data)
+        return category
+
+class ExpenseListSerializer(serializers.ListSerializer):
+    """many=True creates all the expenses with one bulk_create (no receipts, no save() signals)."""
+
+    def create(self, validated_data):
+        user = self.context.get('user')
+        if not user:
+            raise serializers.ValidationError("User is required.")
+        return Expense.objects.bulk_create([Expense(user=user, **attrs) for attrs in validated_data])
+
 class ExpenseSerializer(serializers.ModelSerializer):
+    category = CachedCategoryField(queryset=Category.objects.all(), allow_null=True, required=False)
     category_name = serializers.CharField(source='category.name', read_only=True)
     
     class Meta:
         model = Expense
         fields = ['id', 'expense_date', 'category', 'category_name',
                  'description', 'amount', 'location', 'receipt']
+        list_serializer_class = ExpenseListSerializer
         extra_kwargs = {
             'receipt': {'required': False, 'allow_null': True}
         }
     
     def create(self, validated_data):
-        receipt = self.context['request'].FILES.get('receipt')
+        request = self.context.get('request')
+        receipt = request.FILES.get('receipt') if request else None
         if receipt:
             validated_data['receipt'] = receipt
             
@@ -137,40 +161,10 @@ class VideoLikeSerializer(serializers.ModelSerializer):
             'created_at': {'read_only': True}
         }
 
+    # Toggling goes through services.toggle_video_like
     def create(self, validated_data):
-        user = self.context.get('request').user
-        video = validated_data['video'] # Get the video instance
-
-        # Check if the user already liked this video
-        existing_like = VideoLike.objects.filter(
-            user=user,
-            video=video
-        ).first()
-
-        if existing_like:
-            # If like exists, this is a toggle operation, so remove it
-            existing_like.delete()
-
-            # Update the likes count on the video - Decrement when unliking
-            video.likes_count = max(0, video.likes_count - 1)
-            video.save()
-
-            # Return the deleted like instance (or None, depending on desired behavior)
-            # Returning the instance that was just deleted might be confusing.
-            # It might be better to return None or raise a specific exception
-            # indicating deletion for clarity in the view, but for consistency
-            # with the original structure returning the deleted instance.
-            return existing_like
-        else:
-            # Create new like
-            validated_data['user'] = user # Assign the current user
-            like = super().create(validated_data)
-
-            # Update the likes count on the video - Increment when liking
-            video.likes_count = video.likes_count + 1
-            video.save()
-
-            return like
+        validated_data['user'] = self.context.get('request').user
+        return super().create(validated_data)
 
 class VideoReviewSerializer(serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
@@ -220,16 +214,23 @@ class VideoSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'url', 'thumbnail', 'description', 'created_at',
                   'likes_count', 'comments_count', 'user_has_liked', 'user_review']
     
+    # Videos from services.video_queryset() carry the user's like and review
+    # already; anything else falls back to a query per video
     def get_user_has_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
+            if hasattr(obj, 'has_liked'):
+                return obj.has_liked
             return VideoLike.objects.filter(user=request.user, video=obj).exists()
         return False
     
     def get_user_review(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            review = VideoReview.objects.filter(user=request.user, video=obj).first()
+            if hasattr(obj, 'user_reviews'):
+                review = obj.user_reviews[0] if obj.user_reviews else None
+            else:
+                review = VideoReview.objects.filter(user=request.user, video=obj).first()
             if review:
                 return VideoReviewSerializer(review).data
         return None
@@ -241,13 +242,20 @@ class VideoDetailSerializer(VideoSerializer):
     class Meta(VideoSerializer.Meta):
         fields = VideoSerializer.Meta.fields + ['comments', 'reviews']
     
+    # First pages of each, {'count', 'next_cursor', 'prev_cursor', 'results'},
+    # passed in by services.video_detail or else built here; the rest comes
+    # from the list endpoints
     def get_comments(self, obj):
-        comments = obj.comments.all().order_by('-created_at')
-        return VideoCommentSerializer(comments, many=True).data
+        if 'comments' in self.context:
+            return self.context['comments']
+        from .services import page_video_comments
+        return page_video_comments(obj, {})
     
     def get_reviews(self, obj):
-        reviews = obj.reviews.all().order_by('-created_at')
-        return VideoReviewSerializer(reviews, many=True).data
+        if 'reviews' in self.context:
+            return self.context['reviews']
+        from .services import page_video_reviews
+        return page_video_reviews(obj, {})
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
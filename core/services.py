@@ -0,0 +1,640 @@
+"""
+Service layer shared by the DRF API views and the template (frontend) views.
+
+The frontend used to reach these code paths by calling our own API over HTTP
+(settings.API_BASE_URL). The functions below hold the actual logic so both
+sides can call it in-process. They return serialized data and raise
+ServiceError for anything the API would answer with a 4xx.
+"""
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Sum
+from django.db.models.functions import ExtractMonth
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from rest_framework import exceptions, status
+from rest_framework.authtoken.models import Token
+
+from . import caching, categories, conditional, counters, rollups, tokens
+from .filters import ExpenseFilter, FilterError
+from .models import Expense, ExpenseMonthlyRollup, Income, Video, VideoComment, VideoLike, VideoReview
+from .pagination import InvalidCursor, KeysetPaginator
+from .serializers import (
+    ExpenseSerializer,
+    IncomeSerializer,
+    UserLoginSerializer,
+    UserRegistrationSerializer,
+    VideoCommentSerializer,
+    VideoDetailSerializer,
+    VideoReviewSerializer,
+)
+
+User = get_user_model()
+
+
+class ServiceError(Exception):
+    """Raised when a service call fails; carries the API error payload and status."""
+
+    def __init__(self, errors, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(errors)
+        self.errors = errors
+        self.status_code = status_code
+
+
+# Users
+
+def register_user(data, refresh_token=True):
+    serializer = UserRegistrationSerializer(data=data)
+    if not serializer.is_valid():
+        raise ServiceError(serializer.errors)
+
+    user = serializer.save()
+    token, created = Token.objects.get_or_create(user=user)
+
+    # Create an Income object with a budget_amount of 0 for the new user
+    Income.objects.create(user=user, budget_amount=0)
+
+    return _login_response(user, token, refresh_token)
+
+
+def login_user(data, refresh_token=True):
+    serializer = UserLoginSerializer(data=data)
+    if not serializer.is_valid():
+        raise ServiceError(
+            {'error': serializer.errors.get('non_field_errors', ['Invalid credentials'])[0]},
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    user = serializer.validated_data['user']
+    token, created = Token.objects.get_or_create(user=user)
+    return _login_response(user, token, refresh_token)
+
+
+def _login_response(user, token, refresh_token):
+    # `token` for the DRF Token scheme, plus an access/refresh pair (core.tokens)
+    # for API clients; the template views only keep `token`, and every pair
+    # stores a refresh token row
+    data = {'user_id': str(user.id), 'token': token.key}
+    if refresh_token:
+        data.update(tokens.issue_tokens(user))
+    return data
+
+
+def _refresh_token(data):
+    if not isinstance(data, dict):
+        raise ServiceError({'error': 'Expected a JSON object.'})
+    return data.get('refresh')
+
+
+def refresh_tokens(data):
+    refresh = _refresh_token(data)
+    try:
+        return tokens.refresh_tokens(refresh)
+    except exceptions.AuthenticationFailed as e:
+        raise ServiceError({'error': str(e.detail)}, status.HTTP_401_UNAUTHORIZED)
+
+
+def revoke_refresh_token(data):
+    refresh = _refresh_token(data)
+    try:
+        tokens.revoke(refresh)
+    except exceptions.AuthenticationFailed as e:
+        raise ServiceError({'error': str(e.detail)}, status.HTTP_401_UNAUTHORIZED)
+
+
+def get_profile(user, request):
+    return {
+        'id': str(user.id),
+        'username': user.username,
+        'email': user.email,
+        'profile_picture': request.build_absolute_uri(user.profile_picture.url) if user.profile_picture else None
+    }
+
+
+def update_profile_picture(user, profile_picture, request):
+    # Delete old profile picture if exists
+    if user.profile_picture:
+        try:
+            user.profile_picture.delete(save=False)
+        except Exception:
+            pass  # Handle potential file deletion errors
+
+    user.profile_picture = profile_picture
+    # Only the picture: request.user may come from access token claims (core.tokens)
+    user.save(update_fields=['profile_picture'])
+    return get_profile(user, request)
+
+
+# Income
+
+def get_income(user):
+    try:
+        income = Income.objects.get(user=user)
+    except Income.DoesNotExist:
+        raise ServiceError({"error": "Income not found for this user."}, status.HTTP_404_NOT_FOUND)
+    return IncomeSerializer(income).data
+
+
+def create_income(user, data):
+    serializer = IncomeSerializer(data=data)
+    if not serializer.is_valid():
+        raise ServiceError(serializer.errors)
+    try:
+        serializer.save(user=user)
+    except IntegrityError as e:
+        raise ServiceError({"error": "A database integrity error occurred.", "details": str(e)})
+    return serializer.data
+
+
+def update_income(user, user_id, data):
+    income = get_object_or_404(Income, user__id=user_id, user=user)
+
+    serializer = IncomeSerializer(income, data=data, partial=True)
+    if not serializer.is_valid():
+        raise ServiceError(serializer.errors)
+    serializer.save()
+    return serializer.data
+
+
+# Expenses
+
+# Columns ExpenseSerializer reads, with the category joined in for
+# category_name instead of one query per expense
+EXPENSE_LIST_FIELDS = ('id', 'expense_date', 'category__id', 'category__name',
+                       'description', 'amount', 'location', 'receipt')
+
+
+def expense_queryset(user_id, params):
+    user = get_object_or_404(User, id=user_id)
+
+    # Filter expenses for the specific user, then by the query parameters
+    # (year, month, date and amount ranges, categories; see core.filters)
+    expenses = Expense.objects.filter(user=user).select_related('category').only(*EXPENSE_LIST_FIELDS)
+    try:
+        return ExpenseFilter(params).apply(expenses)
+    except FilterError as e:
+        raise ServiceError({'error': str(e)})
+
+
+def list_expenses(user_id, params):
+    queryset = expense_queryset(user_id, params)
+
+    # Sorting by amount
+    sort = params.get('sort')
+    if sort == 'asc':
+        queryset = queryset.order_by('amount')
+    elif sort == 'desc':
+        queryset = queryset.order_by('-amount')
+
+    return ExpenseSerializer(queryset, many=True).data
+
+
+# Keyset orderings for each value of the `sort` parameter; the id breaks ties
+EXPENSE_PAGE_ORDERINGS = {
+    None: ('-expense_date', '-id'),
+    'asc': ('amount', 'id'),
+    'desc': ('-amount', '-id'),
+}
+
+
+def wants_expense_page(params):
+    """Cursor pagination is opt-in; `all=true` always returns the full list."""
+    if params.get('all', '').lower() in ('1', 'true', 'yes'):
+        return False
+    return ('cursor' in params or 'page_size' in params
+            or settings.EXPENSE_LIST_PAGINATE_BY_DEFAULT)
+
+
+def _page_size(params, default, maximum):
+    try:
+        page_size = int(params.get('page_size', default))
+    except ValueError:
+        raise ServiceError({'error': 'Invalid page_size'})
+    return max(1, min(page_size, maximum))
+
+
+def page_expenses(user_id, params):
+    page_size = _page_size(params, settings.EXPENSE_PAGE_SIZE, settings.EXPENSE_MAX_PAGE_SIZE)
+    if params.get('sort') == 'relevance':
+        # Cursors need a stable total order on model fields
+        raise ServiceError({'error': 'sort=relevance is only available with all=true'})
+    ordering = EXPENSE_PAGE_ORDERINGS.get(params.get('sort'), EXPENSE_PAGE_ORDERINGS[None])
+    paginator = KeysetPaginator(ordering, page_size)
+    try:
+        page = paginator.paginate(expense_queryset(user_id, params), params.get('cursor'))
+    except InvalidCursor:
+        raise ServiceError({'error': 'Invalid cursor'})
+
+    return {
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'results': ExpenseSerializer(page.items, many=True).data,
+    }
+
+
+# Expense summaries
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+
+def _filtered_expenses(user_id, params):
+    try:
+        return ExpenseFilter(params).apply(Expense.objects.filter(user_id=user_id))
+    except FilterError as e:
+        raise ServiceError({'error': str(e)})
+
+
+def monthly_totals_queryset(user_id, params):
+    # params must carry a year; the other filters narrow it further
+    return _filtered_expenses(user_id, params).annotate(
+        month=ExtractMonth('expense_date')
+    ).values('month').annotate(
+        total=Sum('amount')
+    ).order_by('month')
+
+
+def monthly_rollup_queryset(user_id, filters):
+    rollups = ExpenseMonthlyRollup.objects.filter(user_id=user_id, year=filters.year)
+    if filters.month is not None:
+        rollups = rollups.filter(month=filters.month)
+    category_ids = filters.resolve_category_ids()
+    if category_ids is not None:
+        rollups = rollups.filter(category_id__in=sorted(category_ids))
+    return rollups.values('month').annotate(total=Sum('total')).order_by('month')
+
+
+def monthly_expense_summary(user_id, params):
+    try:
+        filters = ExpenseFilter(params)
+    except FilterError as e:
+        raise ServiceError({'error': str(e)})
+    if filters.year is None:
+        raise ServiceError({'error': 'Year parameter is required'})
+
+    # Whole months are answered from the rollup table (at most 12 rows per
+    # category); arbitrary date or amount ranges need the raw expenses
+    if filters.whole_months_only():
+        monthly_totals = monthly_rollup_queryset(user_id, filters)
+    else:
+        monthly_totals = monthly_totals_queryset(user_id, params)
+
+    # Create a dictionary with all months initialized to 0
+    monthly_data = {month: 0 for month in range(1, 13)}
+
+    # Update with actual data
+    for entry in monthly_totals:
+        monthly_data[entry['month']] = float(entry['total'])
+
+    return {
+        'labels': MONTH_NAMES,
+        'data': [monthly_data[month] for month in range(1, 13)]
+    }
+
+
+def category_totals_queryset(user_id, params):
+    return _filtered_expenses(user_id, params).values(
+        'category__name'
+    ).annotate(
+        total=Sum('amount')
+    ).order_by('-total')
+
+
+def _category_expense_summary(user_id, params):
+    labels = []
+    data = []
+
+    for entry in category_totals_queryset(user_id, params):
+        labels.append(entry['category__name'])
+        data.append(float(entry['total']))
+
+    return {
+        'labels': labels,
+        'data': data
+    }
+
+
+def category_expense_summary(user_id, params):
+    # Cached until the user's next expense write (see core.caching)
+    return caching.cached_for_user(
+        'category-summary', user_id, params,
+        lambda: _category_expense_summary(user_id, params),
+        depends_on=[categories.VERSION_KEY],  # labels are category names
+    )
+
+
+# Every expense write goes through these so the monthly rollups stay in step
+# and the user's cached summaries are invalidated
+
+def add_expense(user_id, category_name, data, request=None):
+    user = get_object_or_404(User, id=user_id)
+    category = categories.registry.get_by_name(category_name)
+    if category is None:
+        raise Http404('No Category matches the given query.')
+
+    data = dict(data)
+    data['category'] = category.id
+
+    serializer = ExpenseSerializer(data=data, context={
+        'user': user,
+        'request': request
+    })
+    if not serializer.is_valid():
+        raise ServiceError(serializer.errors)
+    try:
+        with transaction.atomic():
+            expense = serializer.save()
+            deltas = rollups.RollupDeltas()
+            deltas.created(expense)
+            deltas.apply()
+            caching.bump_user_data_version(expense.user_id)
+    except IntegrityError as e:
+        raise ServiceError({"error": "Database error", "details": str(e)})
+    return serializer.data
+
+
+def add_expenses(user_id, items):
+    """
+    Create a batch of expenses in one transaction, all or none. Each item
+    names its category by id (`category`) or by name (`category_name`).
+    Returns the created expenses in input order; on failure ServiceError
+    carries a list of per-item errors ({} for the valid items).
+    """
+    user = get_object_or_404(User, id=user_id)
+    maximum = settings.EXPENSE_BULK_MAX_ITEMS
+    if not isinstance(items, list) or not items:
+        raise ServiceError({'error': 'Expected a non-empty list of expenses.'})
+    if len(items) > maximum:
+        raise ServiceError({'error': f'At most {maximum} expenses per request.'})
+    if not all(isinstance(item, dict) for item in items):
+        raise ServiceError([{} if isinstance(item, dict) else {'non_field_errors': ['Expected an object.']}
+                            for item in items])
+
+    data, name_errors = [], {}
+    for i, item in enumerate(items):
+        item = dict(item)
+        name = item.pop('category_name', None)
+        if name is not None and item.get('category') is None:
+            category = categories.registry.get_by_name(name)
+            if category is None:
+                name_errors[i] = {'category_name': [f'No category named "{name}".']}
+            else:
+                item['category'] = category.id
+        data.append(item)
+
+    serializer = ExpenseSerializer(data=data, many=True, context={'user': user})
+    valid = serializer.is_valid()
+    if not valid or name_errors:
+        errors = list(serializer.errors) if not valid else [{} for _ in data]
+        for i, error in name_errors.items():
+            errors[i] = {**errors[i], **error}
+        raise ServiceError(errors)
+    with transaction.atomic():
+        expenses = serializer.save()
+        deltas = rollups.RollupDeltas()
+        for expense in expenses:
+            deltas.created(expense)
+        deltas.apply()
+        caching.bump_user_data_version(user.id)
+    return serializer.data
+
+
+def update_expense(expense_id, data, user=None):
+    # The frontend passes the session user so it can only touch its own rows
+    queryset = Expense.objects.all() if user is None else Expense.objects.filter(user=user)
+    with transaction.atomic():
+        # Locked, so a concurrent write cannot change the row between the
+        # snapshot and the save and leave the rollups off by its delta
+        expense = get_object_or_404(queryset.select_related('category').select_for_update(of=('self',)),
+                                    id=expense_id)
+        serializer = ExpenseSerializer(expense, data=data, partial=True)
+        if not serializer.is_valid():
+            raise ServiceError(serializer.errors)
+        before = rollups.snapshot(expense)
+        expense = serializer.save()
+        deltas = rollups.RollupDeltas()
+        deltas.changed(before, expense)
+        deltas.apply()
+        caching.bump_user_data_version(expense.user_id)
+    return serializer.data
+
+
+def delete_expense(expense_id, user=None):
+    queryset = Expense.objects.all() if user is None else Expense.objects.filter(user=user)
+    with transaction.atomic():
+        try:
+            expense = queryset.select_for_update().get(id=expense_id)
+        except Expense.DoesNotExist:
+            raise ServiceError({'success': False, 'error': 'Expense not found'}, status.HTTP_404_NOT_FOUND)
+        deleted, _ = Expense.objects.filter(pk=expense.pk).delete()
+        # Only the request that removed the row takes it out of the rollups
+        if deleted:
+            deltas = rollups.RollupDeltas()
+            deltas.deleted(expense)
+            deltas.apply()
+            caching.bump_user_data_version(expense.user_id)
+
+
+# Bulk update and delete: ownership is checked with one locking SELECT, the
+# change is one UPDATE or DELETE, and the rollups move once per batch
+
+BULK_UPDATE_FIELDS = ('category', 'amount', 'description', 'expense_date', 'location')
+
+
+def _bulk_ids(ids):
+    """Parse a list of expense ids into {id as given: UUID, or None if it is not one}."""
+    maximum = settings.EXPENSE_BULK_MAX_ITEMS
+    if not isinstance(ids, list) or not ids:
+        raise ServiceError({'error': 'Expected a non-empty list of ids.'})
+    if len(ids) > maximum:
+        raise ServiceError({'error': f'At most {maximum} ids per request.'})
+    parsed = {}
+    for value in map(str, ids):
+        try:
+            parsed[value] = uuid.UUID(value)
+        except ValueError:
+            parsed[value] = None
+    return parsed
+
+
+def _owned_expenses(user, parsed):
+    ids = [value for value in parsed.values() if value is not None]
+    return {
+        expense.id: expense
+        for expense in Expense.objects.select_for_update().filter(user=user, id__in=ids)
+        .only('id', 'user_id', 'expense_date', 'category_id', 'amount')
+    }
+
+
+def _outcomes(parsed, owned, done):
+    return [
+        {'id': value, 'status': 'invalid' if expense_id is None else done if expense_id in owned else 'not_found'}
+        for value, expense_id in parsed.items()
+    ]
+
+
+def bulk_update_expenses(user, ids, patch):
+    """
+    Apply the same patch to every expense of user's among ids. The patch
+    names its category by id (`category`) or name (`category_name`).
+    Returns {'updated': n, 'results': [{'id', 'status'}]}, the status
+    being 'updated', 'not_found' (also for other users' expenses) or 'invalid'.
+    """
+    parsed = _bulk_ids(ids)
+    if not isinstance(patch, dict) or not patch:
+        raise ServiceError({'error': 'Expected a patch object.'})
+    patch = dict(patch)
+    name = patch.pop('category_name', None)
+    if name is not None and patch.get('category') is None:
+        category = categories.registry.get_by_name(name)
+        if category is None:
+            raise ServiceError({'category_name': [f'No category named "{name}".']})
+        patch['category'] = category.id
+    unknown = set(patch) - set(BULK_UPDATE_FIELDS)
+    if unknown:
+        raise ServiceError({'error': f'Cannot bulk update: {", ".join(sorted(unknown))}.'})
+
+    serializer = ExpenseSerializer(data=patch, partial=True)
+    if not serializer.is_valid():
+        raise ServiceError(serializer.errors)
+    changes = serializer.validated_data
+
+    with transaction.atomic():
+        owned = _owned_expenses(user, parsed)
+        if owned:
+            Expense.objects.filter(id__in=owned).update(**changes)
+            if {'category', 'amount', 'expense_date'} & set(changes):
+                deltas = rollups.RollupDeltas()
+                for expense in owned.values():
+                    before = rollups.snapshot(expense)
+                    for field_name, value in changes.items():
+                        setattr(expense, field_name, value)
+                    deltas.changed(before, expense)
+                deltas.apply()
+            caching.bump_user_data_version(user.id)
+    return {'updated': len(owned), 'results': _outcomes(parsed, owned, 'updated')}
+
+
+def bulk_delete_expenses(user, ids):
+    """Delete user's expenses among ids; returns {'deleted': n, 'results': [...]} like bulk_update_expenses."""
+    parsed = _bulk_ids(ids)
+    with transaction.atomic():
+        owned = _owned_expenses(user, parsed)
+        if owned:
+            deltas = rollups.RollupDeltas()
+            for expense in owned.values():
+                deltas.deleted(expense)
+            Expense.objects.filter(id__in=owned).delete()
+            deltas.apply()
+            caching.bump_user_data_version(user.id)
+    return {'deleted': len(owned), 'results': _outcomes(parsed, owned, 'deleted')}
+
+
+# Videos
+
+def video_queryset(user):
+    """
+    Videos with the given user's like and review loaded up front, so
+    VideoSerializer needs no query per video: `has_liked` is an EXISTS
+    subquery and `user_reviews` a prefetch of the user's own review.
+    """
+    videos = Video.objects.all()
+    if not user.is_authenticated:
+        return videos
+    return videos.annotate(
+        has_liked=Exists(VideoLike.objects.filter(user=user, video=OuterRef('pk')))
+    ).prefetch_related(Prefetch(
+        'reviews',
+        queryset=VideoReview.objects.filter(user=user).select_related('user'),
+        to_attr='user_reviews',
+    ))
+
+
+# Comments and reviews come a page at a time, newest first
+VIDEO_FEEDBACK_ORDERING = ('-created_at', '-id')
+VIDEO_FEEDBACK_USER_FIELDS = ('user__id', 'user__username', 'user__profile_picture')
+
+
+def _page_feedback(queryset, serializer_class, count, params):
+    page_size = _page_size(params, settings.VIDEO_FEEDBACK_PAGE_SIZE, settings.VIDEO_FEEDBACK_MAX_PAGE_SIZE)
+    paginator = KeysetPaginator(VIDEO_FEEDBACK_ORDERING, page_size)
+    try:
+        page = paginator.paginate(queryset, params.get('cursor'))
+    except InvalidCursor:
+        raise ServiceError({'error': 'Invalid cursor'})
+    return {
+        'count': count,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'results': serializer_class(page.items, many=True).data,
+    }
+
+
+def page_video_comments(video, params):
+    # comments_count is kept up to date by the comment views, no COUNT needed
+    comments = VideoComment.objects.filter(video=video).select_related('user').only(
+        'id', 'video', 'content', 'created_at', 'updated_at', *VIDEO_FEEDBACK_USER_FIELDS
+    )
+    return _page_feedback(comments, VideoCommentSerializer, video.comments_count, params)
+
+
+def page_video_reviews(video, params):
+    reviews = VideoReview.objects.filter(video=video).select_related('user').only(
+        'id', 'video', 'rating', 'review_text', 'created_at', 'updated_at', *VIDEO_FEEDBACK_USER_FIELDS
+    )
+    return _page_feedback(reviews, VideoReviewSerializer, reviews.count(), params)
+
+
+def video_detail(video, request):
+    """The video with the first page of its comments and of its reviews."""
+    return VideoDetailSerializer(video, context={
+        'request': request,
+        'comments': page_video_comments(video, {}),
+        'reviews': page_video_reviews(video, {}),
+    }).data
+
+
+# Views are counted in the shared cache and written out in batches
+# (core.counters), so reading a video never writes to the database
+video_views = counters.CounterBuffer(
+    Video, 'view_count', 'VIDEO_VIEW_FLUSH_INTERVAL', 'VIDEO_VIEW_FLUSH_MAX_PENDING'
+)
+
+
+def record_video_view(video_id):
+    video_views.add(video_id)
+
+
+def toggle_video_like(user, video_id, attempts=3):
+    """
+    Like the video, or unlike it if the user already does, and return the
+    new state. The unique (user, video) constraint arbitrates concurrent
+    toggles: a DELETE that removes a row means "unlike", otherwise the
+    INSERT wins or loses against a concurrent one and the loser retries as
+    an unlike. likes_count moves by the same step in the same transaction.
+    """
+    for _ in range(attempts):
+        try:
+            with transaction.atomic():
+                deleted, _ = VideoLike.objects.filter(user=user, video_id=video_id).delete()
+                if deleted:
+                    liked, delta = False, -1
+                else:
+                    VideoLike.objects.create(user=user, video_id=video_id)
+                    liked, delta = True, 1
+                likes_count = counters.add(Video, video_id, 'likes_count', delta)
+                conditional.bump_video_version()
+        except IntegrityError:
+            # Another request by the same user inserted the like first
+            continue
+        return {'liked': liked, 'likes_count': likes_count}
+    raise ServiceError({'error': 'Too many concurrent updates, try again.'}, status.HTTP_409_CONFLICT)
+
+
+# Categories
+
+def list_categories():
+    return categories.registry.serialized()
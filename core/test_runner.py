@@ -0,0 +1,27 @@
+"""
+Test runner that keeps tests off the configured cache tiers.
+
+The shared tier outlives the test database (stamps and entries are kept
+without a timeout), and tests clear the cache between cases, so running
+them against it would leave the test database's categories behind for
+the next run and wipe the cache of whatever else uses it. Every alias is
+a per-process LocMemCache for the duration of the run instead.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in ('default', 'local', 'sessions')
+}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES=TEST_CACHES)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1781 @@
-from django.test import TestCase
+import collections
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from importlib.util import find_spec
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.contrib.sessions.backends.db import SessionStore
+from knox.models import get_token_model
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .api_client import CircuitOpenError, InternalAPIClient
+from . import caching, categories, concurrency, conditional, counters, rollups, services, tokens
+from .concurrency import fan_out
+from .filters import ExpenseFilter
+from .search import search_videos, trigram_available
+from .serializers import VideoDetailSerializer
+from .frontend_api import ApiResult, HttpFrontendAPI, LocalFrontendAPI, get_frontend_api
+from .models import Category, Expense, ExpenseMonthlyRollup, Income, Video, VideoComment, VideoLike, VideoReview
+from .views import ExpensesPageView
+
+User = get_user_model()
+
+
+class CoreTestMixin:
+    """Shared fixtures: a user with a token, an income row and a few expenses."""
+
+    def setUp(self):
+        # Nothing cached (summaries, the category registry) survives a rolled-back test
+        cache.clear()
+        caches[caching.LOCAL_ALIAS].clear()
+        self.user = User.objects.create(username='alice', email='alice@example.com', password='x')
+        self.token = Token.objects.create(user=self.user)
+        Income.objects.create(user=self.user, budget_amount=1000)
+        self.food, _ = Category.objects.get_or_create(name='Food', defaults={'color': '#FF5733', 'icon': 'fa-utensils'})
+        self.travel, _ = Category.objects.get_or_create(name='Travel', defaults={'color': '#3357FF', 'icon': 'fa-plane'})
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # No background flushing of view counts; tests flush explicitly
+        self.enterContext(override_settings(VIDEO_VIEW_FLUSH_INTERVAL=None))
+
+    def make_expenses(self, count, user=None, category=None, start=datetime.date(2025, 1, 1)):
+        return Expense.objects.bulk_create([
+            Expense(
+                user=user or self.user,
+                category=category or (self.food if i % 2 else self.travel),
+                amount=Decimal(i % 97) + Decimal('0.50'),
+                description=f'expense {i}',
+                expense_date=start + datetime.timedelta(days=i % 365),
+                location='Beirut',
+            )
+            for i in range(count)
+        ])
+
+    def frontend_request(self, path='/expenses/view', data=None, user=None):
+        user = user or self.user
+        request = RequestFactory().get(path, data or {})
+        request.session = SessionStore()
+        request.session['token'] = Token.objects.get(user=user).key
+        request.session['user_id'] = str(user.id)
+        request._messages = mock.MagicMock()
+        return request
+
+
+class ServiceLayerTests(CoreTestMixin, TestCase):
+    def test_api_and_frontend_return_the_same_expenses(self):
+        self.make_expenses(5)
+        api_data = self.client.get(f'/expenses/{self.user.id}/').json()
+
+        result = LocalFrontendAPI(self.frontend_request()).list_expenses({})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(sorted(e['id'] for e in result.data), sorted(e['id'] for e in api_data))
+
+    def test_expenses_page_makes_no_http_calls_in_local_mode(self):
+        self.make_expenses(3)
+        view = ExpensesPageView()
+        view.request = self.frontend_request()
+
+        with mock.patch('core.frontend_api.requests.request', side_effect=AssertionError('HTTP call')):
+            context = view.get_context_data()
+
+        self.assertEqual(len(context['expenses']), 3)
+        self.assertEqual(context['income'], 1000.0)
+        self.assertTrue(context['api_categories'])
+
+    def test_local_mode_rejects_a_stale_token(self):
+        request = self.frontend_request()
+        request.session['token'] = 'not-a-token'
+        self.assertEqual(LocalFrontendAPI(request).get_income().status_code, 401)
+
+    def test_local_mode_cannot_update_another_users_expense(self):
+        other = User.objects.create(username='bob', email='bob@example.com', password='x')
+        Token.objects.create(user=other)
+        expense = self.make_expenses(1, user=other)[0]
+
+        result = LocalFrontendAPI(self.frontend_request()).update_expense(expense.id, {'amount': '1.00'})
+        self.assertEqual(result.status_code, 404)
+
+    @override_settings(FRONTEND_API_MODE='http')
+    def test_http_mode_is_opt_in(self):
+        self.assertIsInstance(get_frontend_api(self.frontend_request()), HttpFrontendAPI)
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    statuses = []
+
+    def do_GET(self):
+        self.server.hits += 1
+        code = self.statuses.pop(0) if self.statuses else 200
+        body = b'{}'
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class InternalAPIClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubAPIHandler)
+        self.server.hits = 0
+        StubAPIHandler.statuses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def test_connections_are_reused(self):
+        client = InternalAPIClient(self.base_url)
+        for _ in range(5):
+            self.assertEqual(client.get('/').status_code, 200)
+
+        stats = client.stats()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertEqual(stats['connections_reused'], 4)
+
+    def test_gets_are_retried_but_posts_are_not(self):
+        client = InternalAPIClient(self.base_url, RETRIES=2, BACKOFF_FACTOR=0)
+        StubAPIHandler.statuses = [503, 503]
+        self.assertEqual(client.get('/').status_code, 200)
+        self.assertEqual(self.server.hits, 3)
+        self.assertEqual(client.stats()['retries'], 2)
+
+        StubAPIHandler.statuses = [503]
+        self.assertEqual(client.post('/').status_code, 503)
+        self.assertEqual(self.server.hits, 4)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        client = InternalAPIClient(self.base_url, RETRIES=0, CIRCUIT_BREAKER_THRESHOLD=2, CIRCUIT_BREAKER_RESET=60)
+        StubAPIHandler.statuses = [500, 500]
+        client.get('/')
+        client.get('/')
+
+        with self.assertRaises(CircuitOpenError):
+            client.get('/')
+        self.assertEqual(self.server.hits, 2)
+        self.assertTrue(client.stats()['circuit_open'])
+
+
+@override_settings(FRONTEND_FANOUT_WORKERS=4)
+class FanOutTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(concurrency.shutdown)
+
+    def test_calls_run_concurrently(self):
+        start = time.monotonic()
+        results = fan_out({name: (lambda: time.sleep(0.2) or 'ok') for name in 'abc'}, timeout=5)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual({name: outcome.value for name, outcome in results.items()}, {'a': 'ok', 'b': 'ok', 'c': 'ok'})
+
+    def test_deadline_and_partial_failure(self):
+        def boom():
+            raise ValueError('boom')
+
+        start = time.monotonic()
+        results = fan_out({'fast': lambda: 1, 'slow': lambda: time.sleep(1), 'broken': boom}, timeout=0.2)
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(results['fast'].value, 1)
+        self.assertIsInstance(results['slow'].error, TimeoutError)
+        self.assertIsInstance(results['broken'].error, ValueError)
+
+
+@override_settings(FRONTEND_FANOUT_WORKERS=4)
+class ExpensesPageFanOutTests(CoreTestMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(concurrency.shutdown)
+
+    def test_local_mode_fetches_inline(self):
+        self.make_expenses(4)
+        view = ExpensesPageView()
+        view.request = self.frontend_request()
+
+        context = view.get_context_data()
+
+        view.request._messages.error.assert_not_called()
+        self.assertEqual(len(context['expenses']), 4)
+        self.assertEqual(context['income'], 1000.0)
+        self.assertEqual(len(context['categories']), Category.objects.count())
+        self.assertIsNone(concurrency._executor)
+
+    @override_settings(FRONTEND_API_MODE='http')
+    def test_http_mode_fetches_on_pool_threads(self):
+        threads = {}
+
+        def fetch(name, data):
+            def call(api, *args):
+                threads[name] = threading.current_thread().name
+                return ApiResult(200, data)
+            return call
+
+        view = ExpensesPageView()
+        view.request = self.frontend_request()
+        with mock.patch.object(HttpFrontendAPI, 'list_expenses', fetch('expenses', [])), \
+                mock.patch.object(HttpFrontendAPI, 'get_income', fetch('income', {'budget_amount': '10.00'})), \
+                mock.patch.object(HttpFrontendAPI, 'list_categories', return_value=ApiResult(200, [])):
+            context = view.get_context_data()
+
+        self.assertEqual(context['income'], 10.0)
+        self.assertEqual(set(threads), {'expenses', 'income'})
+        self.assertTrue(all(name.startswith('fanout') for name in threads.values()), threads)
+
+    @unittest.skipIf(connection.vendor == 'sqlite', 'the in-memory test database is never closed')
+    def test_pool_threads_close_their_connections(self):
+        results = fan_out({'query': lambda: (Category.objects.count(), connections['default'])})
+        count, pool_connection = results['query'].value
+        self.assertEqual(count, Category.objects.count())
+        self.assertIsNot(pool_connection, connections['default'])
+        self.assertIsNone(pool_connection.connection)
+
+
+class ExpenseCursorPaginationTests(CoreTestMixin, TestCase):
+    def walk(self, params):
+        url = f'/expenses/{self.user.id}/'
+        pages = [self.client.get(url, params).json()]
+        while pages[-1]['next_cursor']:
+            pages.append(self.client.get(url, {**params, 'cursor': pages[-1]['next_cursor']}).json())
+        return pages
+
+    def test_pages_cover_every_row_once_in_order(self):
+        self.make_expenses(25)
+        for sort, key in ((None, 'expense_date'), ('asc', 'amount'), ('desc', 'amount')):
+            params = {'page_size': 10, **({'sort': sort} if sort else {})}
+            pages = self.walk(params)
+            rows = [row for page in pages for row in page['results']]
+
+            self.assertEqual([len(page['results']) for page in pages], [10, 10, 5])
+            self.assertEqual(len({row['id'] for row in rows}), 25)
+            values = [Decimal(row[key]) if key == 'amount' else row[key] for row in rows]
+            self.assertEqual(values, sorted(values, reverse=sort != 'asc'))
+
+    def test_prev_cursor_returns_the_previous_page(self):
+        self.make_expenses(25)
+        first, second = self.walk({'page_size': 10})[:2]
+        self.assertIsNone(first['prev_cursor'])
+
+        back = self.client.get(f'/expenses/{self.user.id}/', {'page_size': 10, 'cursor': second['prev_cursor']}).json()
+        self.assertEqual(back['results'], first['results'])
+        self.assertEqual(back['next_cursor'], first['next_cursor'])
+        self.assertIsNone(back['prev_cursor'])
+
+    def test_unpaginated_list_is_kept_for_old_clients(self):
+        self.make_expenses(3)
+        url = f'/expenses/{self.user.id}/'
+        self.assertEqual(len(self.client.get(url).json()), 3)
+        with override_settings(EXPENSE_LIST_PAGINATE_BY_DEFAULT=True):
+            self.assertIn('results', self.client.get(url).json())
+            self.assertEqual(len(self.client.get(url, {'all': 'true'}).json()), 3)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'/expenses/{self.user.id}/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExpenseExportTests(CoreTestMixin, TestCase):
+    def export(self, **params):
+        response = self.client.get(f'/expenses/{self.user.id}/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export_applies_list_filters(self):
+        self.make_expenses(10)
+        response, body = self.export(format='csv', category_name='food')
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row['category_name'] for row in rows}, {'Food'})
+
+    def test_jsonl_export_matches_the_list_endpoint(self):
+        self.make_expenses(4)
+        response, body = self.export(format='jsonl')
+        exported = [json.loads(line) for line in body.splitlines()]
+        listed = self.client.get(f'/expenses/{self.user.id}/').json()
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(sorted(exported, key=lambda e: e['id']), sorted(listed, key=lambda e: e['id']))
+
+
+class ExpenseExportMemoryTests(CoreTestMixin, TransactionTestCase):
+    # Not a TestCase: rolling the rows back would leave the expense indexes
+    # bloated and change the plans ExpenseQueryPlanTests expects, whereas a
+    # TransactionTestCase is truncated afterwards
+
+    def test_large_csv_export_streams_with_bounded_memory(self):
+        if not os.path.exists('/proc/self/statm'):
+            self.skipTest('needs /proc to read the RSS')
+
+        def rss():
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+        rows, batch = 50_000, 5_000
+        for start in range(0, rows, batch):
+            self.make_expenses(batch)
+
+        baseline = peak = rss()
+        response = self.client.get(f'/expenses/{self.user.id}/export/', {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        chunks = iter(response.streaming_content)
+        first = next(chunks)
+        lines = first.count(b'\n')
+        for i, chunk in enumerate(chunks):
+            lines += chunk.count(b'\n')
+            if i % 50 == 0:
+                peak = max(peak, rss())
+
+        self.assertTrue(first.startswith(b'id,expense_date'))
+        self.assertEqual(lines, rows + 1)
+        # Held in memory, even as plain tuples, the rows would take over 20 MB
+        self.assertLess(peak - baseline, 10 * 1024 * 1024)
+
+
+class ExpenseQueryPlanTests(CoreTestMixin, TestCase):
+    """EXPLAIN the endpoints' expense queries and check they hit the composite indexes."""
+
+    COMPOSITE_INDEXES = ('expense_user_date_idx', 'expense_user_cat_date_idx', 'expense_user_amount_idx')
+
+    def setUp(self):
+        super().setUp()
+        other = User.objects.create(username='bob', email='bob@example.com', password='x')
+        for year in (2023, 2024, 2025):
+            self.make_expenses(200, start=datetime.date(year, 1, 1))
+            self.make_expenses(200, user=other, start=datetime.date(year, 1, 1))
+
+        if connection.vendor == 'postgresql':
+            # The tables are tiny, so take the sequential scan off the table
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE core_expense')
+                cursor.execute('SET enable_seqscan = off')
+            self.addCleanup(lambda: connection.cursor().execute('RESET enable_seqscan'))
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def test_expense_list_page_uses_the_date_index(self):
+        queryset = services.expense_queryset(self.user.id, {}).order_by('-expense_date', '-id')[:51]
+        self.assertUsesIndex(queryset, 'expense_user_date_idx')
+
+    def test_expense_list_year_filter_uses_the_date_index(self):
+        self.assertUsesIndex(services.expense_queryset(self.user.id, {'year': '2024'}), 'expense_user_date_idx')
+
+    def test_expense_list_amount_sort_uses_the_amount_index(self):
+        queryset = services.expense_queryset(self.user.id, {'sort': 'asc'}).order_by('amount', 'id')[:51]
+        self.assertUsesIndex(queryset, 'expense_user_amount_idx')
+
+    def test_expense_list_month_filter_uses_the_date_index(self):
+        queryset = services.expense_queryset(self.user.id, {'year': '2024', 'month': '3'})
+        self.assertUsesIndex(queryset, 'expense_user_date_idx')
+
+    def test_expense_list_category_filter_uses_the_category_index(self):
+        queryset = services.expense_queryset(self.user.id, {'category_name': 'food', 'year': '2024'})
+        self.assertUsesIndex(queryset, 'expense_user_cat_date_idx')
+
+    def test_monthly_summary_uses_the_date_index(self):
+        self.assertUsesIndex(services.monthly_totals_queryset(self.user.id, {'year': '2024'}), 'expense_user_date_idx')
+
+    def test_category_summary_uses_an_index(self):
+        self.assertUsesIndex(services.category_totals_queryset(self.user.id, {}), *self.COMPOSITE_INDEXES)
+
+
+class ExpenseFilterTests(CoreTestMixin, TestCase):
+    def ids(self, **params):
+        response = self.client.get(f'/expenses/{self.user.id}/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {row['id'] for row in response.json()}
+
+    def expected(self, queryset):
+        return {str(pk) for pk in queryset.values_list('id', flat=True)}
+
+    def test_year_and_month_become_a_half_open_range(self):
+        sql = str(ExpenseFilter({'year': '2024', 'month': '12'}).apply(Expense.objects.all()).query)
+        self.assertNotIn('EXTRACT', sql.upper())
+        self.assertNotIn('STRFTIME', sql.upper())
+        self.assertEqual(ExpenseFilter({'year': '2024', 'month': '12'}).date_range(),
+                         (datetime.date(2024, 12, 1), datetime.date(2025, 1, 1)))
+
+    def test_filters_match_the_equivalent_orm_lookups(self):
+        self.make_expenses(60, start=datetime.date(2024, 11, 1))
+        mine = Expense.objects.filter(user=self.user)
+
+        self.assertEqual(self.ids(year='2024', month='12'),
+                         self.expected(mine.filter(expense_date__year=2024, expense_date__month=12)))
+        self.assertEqual(self.ids(date_from='2024-11-10', date_to='2024-11-20'),
+                         self.expected(mine.filter(expense_date__range=('2024-11-10', '2024-11-20'))))
+        self.assertEqual(self.ids(amount_min='10', amount_max='20.50'),
+                         self.expected(mine.filter(amount__gte=10, amount__lte=Decimal('20.50'))))
+        self.assertEqual(self.ids(category_name='FOOD,travel'), self.expected(mine))
+        self.assertEqual(self.ids(category=str(self.food.id)), self.expected(mine.filter(category=self.food)))
+
+    def test_category_names_are_resolved_before_the_expense_query(self):
+        self.make_expenses(4)
+        queryset = services.expense_queryset(self.user.id, {'category_name': 'food'})
+        # The category is joined for category_name, but never filtered on by name
+        where = str(queryset.query).split(' WHERE ', 1)[1]
+        self.assertNotIn('core_category', where)
+        self.assertEqual(self.ids(category_name='no-such-category'), set())
+
+    def test_invalid_values_are_rejected(self):
+        for params in ({'year': 'abc'}, {'month': '13'}, {'date_from': '2024-02-30'},
+                       {'amount_min': 'x'}, {'category': 'not-a-uuid'}):
+            response = self.client.get(f'/expenses/{self.user.id}/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_category_summary_accepts_a_date_range(self):
+        self.make_expenses(30, start=datetime.date(2025, 1, 1))
+        response = self.client.get(f'/expenses/{self.user.id}/category-summary/',
+                                   {'date_from': '2025-01-01', 'date_to': '2025-01-10'})
+        expected = Expense.objects.filter(user=self.user, expense_date__lte='2025-01-10')
+        self.assertAlmostEqual(sum(response.json()['data']), float(sum(e.amount for e in expected)))
+
+
+class ExpenseMonthlyRollupTests(CoreTestMixin, TestCase):
+    def add(self, category, **data):
+        response = self.client.post(f'/expenses/add/{self.user.id}/{category.name}/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def summary(self, **params):
+        return self.client.get(f'/expenses/{self.user.id}/monthly-summary/', params).json()['data']
+
+    def test_every_write_path_keeps_the_rollup_in_step(self):
+        expense_id = self.add(self.food, amount='10.00', expense_date='2025-03-05', description='lunch')
+        self.add(self.travel, amount='5.25', expense_date='2025-03-20', description='bus')
+        self.assertEqual(rollups.verify(), {})
+        self.assertEqual(self.summary(year=2025)[2], 15.25)
+
+        # Move the expense to another month and category and change the amount
+        response = self.client.put(f'/expenses/update/{expense_id}/',
+                                   {'amount': '12.00', 'expense_date': '2025-04-01', 'category': str(self.travel.id)},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(rollups.verify(), {})
+        self.assertEqual(self.summary(year=2025)[2:4], [5.25, 12.0])
+        self.assertEqual(self.summary(year=2025, category_name='food')[2:4], [0, 0])
+
+        self.client.delete(f'/expenses/delete/{expense_id}/')
+        self.assertEqual(rollups.verify(), {})
+        self.assertEqual(self.summary(year=2025)[3], 0)
+
+    def test_year_is_required_and_validated(self):
+        path = f'/expenses/{self.user.id}/monthly-summary/'
+        self.assertEqual(self.client.get(path).json(), {'error': 'Year parameter is required'})
+        for year in ('soon', '0', '10000'):
+            response = self.client.get(path, {'year': year})
+            self.assertEqual((response.status_code, response.json()), (400, {'error': 'Invalid year format'}), year)
+
+    def test_whole_year_summary_reads_only_the_rollup(self):
+        self.add(self.food, amount='10.00', expense_date='2025-03-05')
+        with CaptureQueriesContext(connection) as queries:
+            self.summary(year=2025)
+        self.assertFalse(any('core_expense"' in q['sql'] for q in queries.captured_queries))
+
+        # Ranges that don't line up with months fall back to the raw rows
+        self.assertEqual(self.summary(year=2025, date_from='2025-03-06')[2], 0)
+
+    def test_deleting_a_category_folds_its_rollups_into_uncategorised(self):
+        pets = Category.objects.create(name='Pets', color='#000000', icon='fa-paw')
+        self.add(pets, amount='8.00', expense_date='2025-03-05')
+        self.add(pets, amount='2.00', expense_date='2025-04-05')
+        Expense.objects.create(user=self.user, category=None, amount='1.50', expense_date='2025-03-09')
+        rollups.rebuild()
+
+        pets.delete()
+        self.assertEqual(rollups.verify(), {})
+        self.assertEqual(
+            list(ExpenseMonthlyRollup.objects.filter(category=None).order_by('month').values_list('month', 'total')),
+            [(3, Decimal('9.50')), (4, Decimal('2.00'))],
+        )
+        self.assertEqual(self.summary(year=2025)[2:4], [9.5, 2.0])
+
+        # One uncategorised row per month, like the categorised ones
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ExpenseMonthlyRollup.objects.create(user=self.user, year=2025, month=3, category=None)
+
+    def test_rebuild_command_verifies_and_repairs(self):
+        self.make_expenses(20)  # bulk_create bypasses the service layer
+        with self.assertRaises(CommandError):
+            call_command('rebuild_expense_rollups', '--verify', stdout=io.StringIO())
+
+        call_command('rebuild_expense_rollups', stdout=io.StringIO())
+        call_command('rebuild_expense_rollups', '--verify', stdout=io.StringIO())
+        self.assertEqual(self.summary(year=2025), services.monthly_expense_summary(
+            self.user.id, {'year': '2025', 'amount_min': '0'})['data'])
+
+
+class ConcurrentExpenseWriteTests(CoreTestMixin, TransactionTestCase):
+    def run_together(self, *calls):
+        """Run the calls on threads released at once; return their outcomes (None or the exception)."""
+        barrier = threading.Barrier(len(calls))
+        outcomes = [None] * len(calls)
+
+        def work(i, call):
+            try:
+                barrier.wait()
+                call()
+            except Exception as e:
+                outcomes[i] = e
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work, args=(i, call)) for i, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_concurrent_deletes_take_the_expense_out_of_the_rollup_once(self):
+        for _ in range(5):
+            services.add_expense(self.user.id, 'Food', {'amount': '5.00', 'expense_date': '2025-03-01'})
+            expense_id = services.add_expense(self.user.id, 'Food', {'amount': '10.00', 'expense_date': '2025-03-02'})['id']
+            outcomes = self.run_together(lambda: services.delete_expense(expense_id),
+                                         lambda: services.delete_expense(expense_id))
+            # One delete wins; the other finds nothing (or, on SQLite, loses the write lock)
+            self.assertIn(None, outcomes)
+            self.assertFalse(Expense.objects.filter(id=expense_id).exists())
+            self.assertEqual(rollups.verify(), {})
+
+    def test_concurrent_updates_keep_the_rollup_in_step(self):
+        expense_id = services.add_expense(self.user.id, 'Food', {'amount': '10.00', 'expense_date': '2025-03-02'})['id']
+        self.run_together(lambda: services.update_expense(expense_id, {'amount': '3.00'}),
+                          lambda: services.update_expense(expense_id, {'expense_date': '2025-04-01'}))
+        self.assertEqual(rollups.verify(), {})
+
+
+class CategorySummaryCacheTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        caching.reset_stats()
+
+    def summary(self, **params):
+        response = self.client.get(f'/expenses/{self.user.id}/category-summary/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def counters(self):
+        return caching.stats().get('category-summary', {'hits': 0, 'misses': 0})
+
+    def test_repeated_reads_hit_the_cache(self):
+        self.make_expenses(10)
+        first = self.summary()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.summary(), first)
+        self.assertEqual(self.counters(), {'hits': 1, 'misses': 1})
+
+        # Different parameters are cached separately
+        self.assertEqual(self.summary(date_from='2025-01-01', date_to='2025-01-02'), {
+            'labels': ['Food', 'Travel'], 'data': [1.5, 0.5],
+        })
+        self.assertEqual(self.counters(), {'hits': 1, 'misses': 2})
+
+    def test_every_expense_write_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/expenses/add/{self.user.id}/Food/',
+                                        {'amount': '10.00', 'expense_date': '2025-03-05'}, format='json')
+        expense_id = response.json()['id']
+        self.assertEqual(self.summary(), {'labels': ['Food'], 'data': [10.0]})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/expenses/add/{self.user.id}/Travel/',
+                             {'amount': '4.00', 'expense_date': '2025-03-06'}, format='json')
+        self.assertEqual(self.summary(), {'labels': ['Food', 'Travel'], 'data': [10.0, 4.0]})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/expenses/update/{expense_id}/', {'amount': '3.00'}, format='json')
+        self.assertEqual(self.summary(), {'labels': ['Travel', 'Food'], 'data': [4.0, 3.0]})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/expenses/delete/{expense_id}/')
+        self.assertEqual(self.summary(), {'labels': ['Travel'], 'data': [4.0]})
+        self.assertEqual(self.counters(), {'hits': 0, 'misses': 4})
+
+    def test_other_users_writes_keep_the_entry(self):
+        self.summary()
+        bob = User.objects.create_user(username='bob', email='bob@example.com', password='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            services.add_expense(bob.id, 'Food', {'amount': '1.00', 'expense_date': '2025-01-01'})
+        self.summary()
+        self.assertEqual(self.counters(), {'hits': 1, 'misses': 1})
+
+    def test_lost_version_key_does_not_resurrect_old_entries(self):
+        self.summary()
+        cache.delete(caching.VERSION_KEY.format(user_id=self.user.id))
+        self.summary()
+        self.assertEqual(self.counters(), {'hits': 0, 'misses': 2})
+
+
+class ListQueryCountTests(CoreTestMixin, TestCase):
+    """Every list endpoint runs a fixed number of queries, however many rows it returns."""
+
+    def setUp(self):
+        super().setUp()
+        self.video = Video.objects.create(title='Budgeting 101', url='https://example.com/v', description='basics')
+
+    def assertConstantQueries(self, expected, fetch, grow):
+        """Call grow(n) then fetch() for a small and a larger n; fetch must run `expected` queries both times."""
+        for rows in (1, 30):
+            grow(rows)
+            with self.assertNumQueries(expected):
+                fetch()
+
+    def get(self, path, params=None, client=None):
+        response = (client or self.client).get(path, params or {})
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            return b''.join(response.streaming_content)
+        return response.json()
+
+    def test_expense_list(self):
+        self.assertConstantQueries(2, lambda: self.get(f'/expenses/{self.user.id}/'), self.make_expenses)
+
+    def test_expense_list_filtered_by_category_name(self):
+        categories.registry.all()  # names resolve from the loaded registry, not a query
+        self.assertConstantQueries(2, lambda: self.get(f'/expenses/{self.user.id}/', {'category_name': 'food'}),
+                                   self.make_expenses)
+
+    def test_expense_page(self):
+        self.assertConstantQueries(2, lambda: self.get(f'/expenses/{self.user.id}/', {'page_size': 20}),
+                                   self.make_expenses)
+
+    def test_expense_export(self):
+        self.assertConstantQueries(2, lambda: self.get(f'/expenses/{self.user.id}/export/', {'format': 'csv'}),
+                                   self.make_expenses)
+
+    def test_category_list(self):
+        def grow(rows):
+            for i in range(rows):
+                Category.objects.create(name=f'Category {Category.objects.count()}')
+        self.assertConstantQueries(1, lambda: self.get('/categories/'), grow)
+
+    def test_video_list(self):
+        def grow(rows):
+            Video.objects.bulk_create([Video(title=f'v{i}', url='https://example.com', description='') for i in range(rows)])
+            conditional.bump_video_version()  # bulk_create sends no signals
+        self.assertConstantQueries(2, lambda: self.get('/api/videos/', client=APIClient()), grow)
+
+    def test_video_comments(self):
+        def grow(rows):
+            for i in range(rows):
+                commenter = User.objects.create(username=f'c{uuid.uuid4().hex[:8]}', email=f'{uuid.uuid4().hex}@x.com')
+                VideoComment.objects.create(user=commenter, video=self.video, content=f'comment {i}')
+        self.assertConstantQueries(2, lambda: self.get(f'/api/videos/{self.video.id}/comments/'), grow)
+
+
+class VideoUserStateTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.bob = User.objects.create(username='bob', email='bob@example.com', password='x')
+
+    def add_videos(self, count):
+        """Videos alternately liked and reviewed by the user, plus activity from someone else."""
+        for i in range(count):
+            video = Video.objects.create(title=f'video {Video.objects.count()}', url='https://example.com', description='')
+            VideoLike.objects.create(user=self.bob, video=video)
+            VideoReview.objects.create(user=self.bob, video=video, rating=1, review_text='meh')
+            VideoComment.objects.create(user=self.bob, video=video, content='hi')
+            if i % 2:
+                VideoLike.objects.create(user=self.user, video=video)
+                VideoReview.objects.create(user=self.user, video=video, rating=5, review_text='great')
+
+    def test_list_query_count_is_fixed_per_page(self):
+        # COUNT, the page of videos with their like flag, the user's reviews
+        for count in (1, 12):
+            self.add_videos(count)
+            with self.assertNumQueries(3):
+                self.client.get('/api/videos/')
+        with self.assertNumQueries(3):
+            self.client.get('/api/videos/', {'page': 2})
+
+    def test_list_reports_only_the_users_own_state(self):
+        self.add_videos(4)
+        results = self.client.get('/api/videos/').json()['results']
+        for video in results:
+            mine = VideoLike.objects.filter(user=self.user, video_id=video['id']).exists()
+            self.assertEqual(video['user_has_liked'], mine)
+            if mine:
+                self.assertEqual(video['user_review']['rating'], 5)
+                self.assertEqual(video['user_review']['user_username'], 'alice')
+            else:
+                self.assertIsNone(video['user_review'])
+
+        anonymous = APIClient().get('/api/videos/').json()['results']
+        self.assertFalse(any(video['user_has_liked'] or video['user_review'] for video in anonymous))
+
+    def test_detail_query_count_is_fixed(self):
+        self.add_videos(2)
+        video = Video.objects.filter(likes__user=self.user).first()
+        for i in range(10):
+            VideoComment.objects.create(user=self.bob, video=video, content=f'comment {i}')
+        # The video and the user's review, a page of comments, a page of reviews and their count
+        with self.assertNumQueries(5):
+            data = self.client.get(f'/api/videos/{video.id}/').json()
+        self.assertTrue(data['user_has_liked'])
+        self.assertEqual(data['user_review']['rating'], 5)
+        self.assertEqual(len(data['comments']['results']), 11)
+
+
+class VideoLikeToggleTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = Video.objects.create(title='Budgeting 101', url='https://example.com/v', description='basics')
+
+    def test_toggle_returns_the_new_state(self):
+        url = f'/api/videos/{self.video.id}/like/'
+        self.assertEqual(self.client.post(url).json(), {'liked': True, 'likes_count': 1})
+        self.assertEqual(self.client.post(url).json(), {'liked': False, 'likes_count': 0})
+        self.assertEqual(self.client.post(f'/api/videos/{uuid.uuid4()}/like/').status_code, 404)
+
+    def test_toggle_only_writes_the_counter(self):
+        url = f'/api/videos/{self.video.id}/like/'
+        # Changed after the view could have loaded the row; a full save() would undo it
+        Video.objects.filter(id=self.video.id).update(title='Renamed', view_count=7)
+        self.client.post(url)
+        self.video.refresh_from_db()
+        self.assertEqual((self.video.title, self.video.view_count, self.video.likes_count), ('Renamed', 7, 1))
+
+    def test_counter_never_goes_negative(self):
+        VideoLike.objects.create(user=self.user, video=self.video)  # likes_count still 0
+        self.assertEqual(services.toggle_video_like(self.user, self.video.id), {'liked': False, 'likes_count': 0})
+
+
+@unittest.skipIf(connection.vendor == 'sqlite', 'SQLite serialises writers, there is no race to test')
+class VideoLikeStressTests(TransactionTestCase):
+    THREADS_PER_USER = 2
+    TOGGLES = 15
+
+    def test_concurrent_toggles_keep_counts_exact(self):
+        videos = [Video.objects.create(title=f'v{i}', url='https://example.com', description='') for i in range(2)]
+        users = [User.objects.create(username=f'u{i}', email=f'u{i}@example.com', password='x') for i in range(6)]
+        workers = [(user, n) for user in users for n in range(self.THREADS_PER_USER)]
+        barrier = threading.Barrier(len(workers))
+        done = collections.Counter()
+        lock = threading.Lock()
+        errors = []
+
+        def work(user, seed):
+            try:
+                barrier.wait()
+                for i in range(self.TOGGLES):
+                    video = videos[(seed + i) % len(videos)]
+                    try:
+                        services.toggle_video_like(user, video.id)
+                    except services.ServiceError:
+                        continue
+                    with lock:
+                        done[user.id, video.id] += 1
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work, args=worker) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for video in videos:
+            video.refresh_from_db()
+            self.assertEqual(video.likes_count, VideoLike.objects.filter(video=video).count())
+        # Every successful toggle flipped the state exactly once
+        for (user_id, video_id), toggles in done.items():
+            self.assertEqual(VideoLike.objects.filter(user_id=user_id, video_id=video_id).exists(), toggles % 2 == 1)
+
+
+class VideoViewCountTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        services.video_views.flush()
+        self.videos = [Video.objects.create(title=f'v{i}', url='https://example.com', description='') for i in range(3)]
+
+    def view(self, video, times=1):
+        for _ in range(times):
+            self.assertEqual(self.client.get(f'/api/videos/{video.id}/').status_code, 200)
+
+    def test_get_does_not_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.view(self.videos[0], 3)
+        self.assertFalse([q for q in queries.captured_queries if not q['sql'].lstrip().upper().startswith('SELECT')])
+        self.assertEqual(Video.objects.get(id=self.videos[0].id).view_count, 0)
+        self.assertEqual(services.video_views.pending(), {self.videos[0].id: 3})
+
+    def test_flush_batches_by_delta(self):
+        self.view(self.videos[0], 2)
+        self.view(self.videos[1], 2)
+        self.view(self.videos[2])
+        # One UPDATE for the two videos viewed twice, one for the other
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(services.video_views.flush(), 5)
+        self.assertEqual(len([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]), 2)
+        self.assertEqual([Video.objects.get(id=video.id).view_count for video in self.videos], [2, 2, 1])
+        self.assertEqual(services.video_views.pending(), {})
+        self.assertEqual(services.video_views.flush(), 0)
+
+    def test_counts_are_shared_between_workers(self):
+        self.view(self.videos[0], 2)
+        # What another worker process (or a fresh one after a restart) sees
+        worker = counters.CounterBuffer(Video, 'view_count', 'VIDEO_VIEW_FLUSH_INTERVAL', 'VIDEO_VIEW_FLUSH_MAX_PENDING')
+        self.assertEqual(worker.pending(), {self.videos[0].id: 2})
+        worker.add(self.videos[0].id)
+        self.assertEqual(services.video_views.pending(), {self.videos[0].id: 3})
+
+        # One flush at a time
+        with mock.patch.object(cache, 'add', return_value=False):
+            self.assertEqual(worker.flush(), 0)
+        call_command('flush_video_views', stdout=io.StringIO())
+        self.assertEqual(Video.objects.get(id=self.videos[0].id).view_count, 3)
+        self.assertEqual(worker.pending(), {})
+
+    def test_failed_flush_keeps_the_increments(self):
+        self.view(self.videos[0], 2)
+        with mock.patch.object(Video._default_manager, 'filter', side_effect=DatabaseError('down')):
+            with self.assertLogs('core.counters', 'ERROR'):
+                self.assertEqual(services.video_views.flush(), 0)
+        self.assertEqual(services.video_views.pending(), {self.videos[0].id: 2})
+        services.video_views.flush()
+        self.assertEqual(Video.objects.get(id=self.videos[0].id).view_count, 2)
+
+
+class VideoViewFlushThreadTests(TransactionTestCase):
+    def test_background_thread_flushes_within_the_interval(self):
+        video = Video.objects.create(title='v', url='https://example.com', description='')
+        buffer = counters.CounterBuffer(Video, 'view_count', 'VIDEO_VIEW_FLUSH_INTERVAL', 'VIDEO_VIEW_FLUSH_MAX_PENDING')
+        with override_settings(VIDEO_VIEW_FLUSH_INTERVAL=0.1):
+            for _ in range(4):
+                buffer.add(video.id)
+            deadline = time.monotonic() + 5
+            while Video.objects.get(id=video.id).view_count < 4 and time.monotonic() < deadline:
+                time.sleep(0.05)
+        self.assertEqual(Video.objects.get(id=video.id).view_count, 4)
+
+
+class VideoCommentCounterTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = Video.objects.create(title='Budgeting 101', url='https://example.com/v', description='basics')
+
+    def comments_count(self):
+        return Video.objects.get(id=self.video.id).comments_count
+
+    def test_comment_writes_move_the_counter_without_counting(self):
+        url = f'/api/videos/{self.video.id}/comments/'
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.post(url, {'content': 'first'}, format='json').json()
+            self.client.post(url, {'content': 'second'}, format='json')
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql'].upper()])
+        self.assertEqual(self.comments_count(), 2)
+
+        self.assertEqual(self.client.delete(f'/api/comments/{first["id"]}/').status_code, 204)
+        self.assertEqual(self.comments_count(), 1)
+        self.assertEqual(self.client.delete(f'/api/comments/{first["id"]}/').status_code, 404)
+        self.assertEqual(self.comments_count(), 1)
+
+    def test_reconcile_command_reports_and_fixes_drift(self):
+        videos = [self.video] + [
+            Video.objects.create(title=f'v{i}', url='https://example.com', description='') for i in range(4)
+        ]
+        for video in videos[:3]:
+            VideoComment.objects.create(user=self.user, video=video, content='untracked')
+        VideoLike.objects.create(user=self.user, video=videos[3])
+        Video.objects.filter(id=videos[4].id).update(likes_count=5)
+
+        out = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command('reconcile_video_counters', '--verify', '--chunk-size', '2', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+        self.assertIn(f'{videos[4].id} likes_count: stored=5 actual=0', out.getvalue())
+
+        call_command('reconcile_video_counters', '--chunk-size', '2', stdout=io.StringIO())
+        self.assertEqual(
+            [Video.objects.values_list('likes_count', 'comments_count').get(id=video.id) for video in videos],
+            [(0, 1), (0, 1), (0, 1), (1, 0), (0, 0)],
+        )
+        call_command('reconcile_video_counters', '--verify', stdout=io.StringIO())
+
+
+@override_settings(VIDEO_FEEDBACK_PAGE_SIZE=4)
+class VideoFeedbackPaginationTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.video = Video.objects.create(title='Budgeting 101', url='https://example.com/v', description='basics')
+        for i in range(10):
+            self.client.post(f'/api/videos/{self.video.id}/comments/', {'content': f'comment {i}'}, format='json')
+        # Same timestamp for several rows, so the id has to break the tie
+        VideoComment.objects.filter(content__in=['comment 3', 'comment 4', 'comment 5']).update(
+            created_at=VideoComment.objects.get(content='comment 3').created_at
+        )
+        for i in range(6):
+            reviewer = User.objects.create(username=f'r{i}', email=f'r{i}@example.com', password='x')
+            VideoReview.objects.create(user=reviewer, video=self.video, rating=i % 5 + 1, review_text=f'review {i}')
+
+    def walk(self, path, **params):
+        seen, cursor = [], None
+        while True:
+            page = self.client.get(path, dict(params, **({'cursor': cursor} if cursor else {}))).json()
+            seen.extend(item['id'] for item in page['results'])
+            cursor = page['next_cursor']
+            if not cursor:
+                return page['count'], seen
+
+    def test_comment_pages_cover_every_comment_once_newest_first(self):
+        count, seen = self.walk(f'/api/videos/{self.video.id}/comments/')
+        expected = [str(pk) for pk in VideoComment.objects.order_by('-created_at', '-id').values_list('id', flat=True)]
+        self.assertEqual((count, seen), (10, expected))
+
+        count, seen = self.walk(f'/api/videos/{self.video.id}/comments/', page_size=3)
+        self.assertEqual(seen, expected)
+
+    def test_review_pages(self):
+        count, seen = self.walk(f'/api/videos/{self.video.id}/review/')
+        self.assertEqual((count, len(set(seen))), (6, 6))
+
+    def test_detail_embeds_only_the_first_pages(self):
+        data = self.client.get(f'/api/videos/{self.video.id}/').json()
+        self.assertEqual((data['comments']['count'], len(data['comments']['results'])), (10, 4))
+        self.assertEqual((data['reviews']['count'], len(data['reviews']['results'])), (6, 4))
+        self.assertEqual(data['comments']['results'][0]['user_username'], 'alice')
+
+        rest = self.client.get(f'/api/videos/{self.video.id}/comments/', {'cursor': data['comments']['next_cursor']})
+        self.assertEqual(len(rest.json()['results']), 4)
+
+    def test_detail_serializer_builds_the_pages_without_context(self):
+        data = VideoDetailSerializer(Video.objects.get(id=self.video.id)).data
+        self.assertEqual((data['comments']['count'], len(data['comments']['results'])), (10, 4))
+        self.assertEqual((data['reviews']['count'], len(data['reviews']['results'])), (6, 4))
+
+    def test_bad_cursor(self):
+        response = self.client.get(f'/api/videos/{self.video.id}/comments/', {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class VideoSearchTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.in_title = Video.objects.create(title='Budgeting for students', url='https://example.com/1',
+                                             description='Plan your month')
+        self.in_description = Video.objects.create(title='Money basics', url='https://example.com/2',
+                                                   description='A budget is where saving starts')
+        self.unrelated = Video.objects.create(title='Cooking pasta', url='https://example.com/3',
+                                              description='Boil water')
+
+    def search(self, query):
+        ours = [self.in_title.id, self.in_description.id, self.unrelated.id]
+        return [video.id for video in search_videos(Video.objects.filter(id__in=ours), query)]
+
+    def test_matches_are_stemmed_and_ranked_title_first(self):
+        self.assertEqual(self.search('budgets'), [self.in_title.id, self.in_description.id])
+        self.assertEqual(self.search('saving budget'), [self.in_description.id])
+        self.assertEqual(self.search('"quoted" (punctuation) *'), [])
+        self.assertEqual(len(self.search('  ')), 3)
+
+    def test_index_follows_video_changes(self):
+        Video.objects.filter(id=self.unrelated.id).update(description='Cook on a budget')
+        self.assertIn(self.unrelated.id, self.search('budget'))
+        self.in_title.title = 'Studying tips'
+        self.in_title.save()
+        self.in_description.delete()
+        self.assertEqual(self.search('budgeting'), [self.unrelated.id])
+
+    def test_api_uses_search(self):
+        results = self.client.get('/api/videos/', {'search': 'budget'}).json()['results']
+        self.assertEqual([video['id'] for video in results], [str(self.in_title.id), str(self.in_description.id)])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'GIN index is PostgreSQL only')
+    def test_postgres_uses_the_gin_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_video')
+            cursor.execute('SET enable_seqscan = off')
+        self.addCleanup(lambda: connection.cursor().execute('RESET enable_seqscan'))
+        plan = search_videos(Video.objects.all(), 'budget').explain()
+        self.assertIn('video_search_idx', plan)
+
+
+class ExpenseTextSearchTests(CoreTestMixin, TestCase):
+    LATENCY_BUDGET_MS = 300
+
+    def setUp(self):
+        super().setUp()
+        self.bob = User.objects.create(username='bob', email='bob@example.com', password='x')
+        for description, location in (('Starbucks', 'Hamra'), ('starbucks downtown', ''),
+                                      ('Coffee at the Starbucks reserve', 'Beirut'), ('Groceries', 'Spinneys Achrafieh')):
+            services.add_expense(self.user.id, 'Food', {'amount': '5.00', 'expense_date': '2025-02-01',
+                                                         'description': description, 'location': location})
+        services.add_expense(self.bob.id, 'Food', {'amount': '5.00', 'expense_date': '2025-02-01',
+                                                    'description': 'Starbucks'})
+
+    def descriptions(self, **params):
+        response = self.client.get(f'/expenses/{self.user.id}/', dict(params, all='true'))
+        self.assertEqual(response.status_code, 200)
+        return [expense['description'] for expense in response.json()]
+
+    def test_q_matches_description_or_location_of_the_users_expenses(self):
+        self.assertEqual(sorted(self.descriptions(q='STARBUCKS')),
+                         ['Coffee at the Starbucks reserve', 'Starbucks', 'starbucks downtown'])
+        self.assertEqual(self.descriptions(q='achrafieh'), ['Groceries'])
+        self.assertEqual(self.descriptions(q='hamra', year='2024'), [])
+
+    def test_relevance_puts_closest_matches_first(self):
+        self.assertEqual(self.descriptions(q='starbucks', sort='relevance'),
+                         ['Starbucks', 'starbucks downtown', 'Coffee at the Starbucks reserve'])
+        response = self.client.get(f'/expenses/{self.user.id}/', {'q': 'starbucks', 'sort': 'relevance', 'page_size': 2})
+        self.assertEqual(response.status_code, 400)
+
+    def test_relevance_tolerates_typos_with_pg_trgm(self):
+        if not trigram_available():
+            self.skipTest('needs pg_trgm')
+        self.assertEqual(self.descriptions(q='starbuks', sort='relevance')[0], 'Starbucks')
+
+    def test_search_stays_within_the_latency_budget(self):
+        # 40k expenses each for this user and another, a few hundred of them matching
+        for user in (self.user, self.bob):
+            Expense.objects.bulk_create(
+                (Expense(user=user, category=self.food, amount=Decimal('1.00'),
+                         description=f'merchant {i % 997} order {i}' if i % 150 else f'Starbucks #{i}',
+                         location=f'street {i % 311}', expense_date=datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 700))
+                 for i in range(40_000)),
+                batch_size=5000,
+            )
+        if connection.vendor == 'postgresql':
+            connection.cursor().execute('ANALYZE core_expense')
+
+        def search():
+            return services.page_expenses(self.user.id, {'q': 'starbucks', 'page_size': '50'})
+
+        self.assertEqual(len(search()['results']), 50)
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            search()
+            timings.append((time.perf_counter() - start) * 1000)
+        self.assertLess(sorted(timings)[2], self.LATENCY_BUDGET_MS)
+
+
+class CategoryRegistryTests(CoreTestMixin, TestCase):
+    def test_lookups_are_served_from_memory(self):
+        categories.registry.all()
+        with self.assertNumQueries(0):
+            self.assertEqual(categories.registry.get_by_name('fOOd'), self.food)
+            self.assertEqual(categories.registry.get(str(self.travel.id)), self.travel)
+            self.assertIsNone(categories.registry.get('not-a-uuid'))
+            self.assertEqual(self.client.get('/categories/').status_code, 200)
+
+        # Adding an expense needs no Category query either
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/expenses/add/{self.user.id}/food/',
+                                        {'amount': '3.00', 'expense_date': '2025-01-01'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse([q for q in queries.captured_queries if 'FROM "core_category"' in q['sql']])
+        self.assertEqual(response.json()['category_name'], 'Food')
+
+    def test_changes_reach_every_worker(self):
+        # Two registries stand in for two worker processes sharing the cache
+        other_worker = categories.CategoryRegistry()
+        for registry in (categories.registry, other_worker):
+            self.assertIsNone(registry.get_by_name('Pets'))
+
+        pets = Category.objects.create(name='Pets', color='#000000', icon='fa-paw')
+        for registry in (categories.registry, other_worker):
+            self.assertEqual(registry.get_by_name('pets'), pets)
+
+        pets.name = 'Animals'
+        pets.save()
+        self.assertEqual(other_worker.get(pets.id).name, 'Animals')
+        self.assertIn('Animals', [category['name'] for category in self.client.get('/categories/').json()])
+
+        pets.delete()
+        self.assertIsNone(other_worker.get_by_name('animals'))
+
+    def test_unknown_category_is_rejected(self):
+        response = self.client.post(f'/expenses/add/{self.user.id}/Nope/',
+                                    {'amount': '3.00', 'expense_date': '2025-01-01'}, format='json')
+        self.assertEqual(response.status_code, 404)
+        expense_id = self.client.post(f'/expenses/add/{self.user.id}/Food/',
+                                      {'amount': '3.00', 'expense_date': '2025-01-01'}, format='json').json()['id']
+        response = self.client.put(f'/expenses/update/{expense_id}/', {'category': str(uuid.uuid4())}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_renaming_a_category_refreshes_cached_summaries(self):
+        self.make_expenses(2)
+        self.assertIn('Food', self.client.get(f'/expenses/{self.user.id}/category-summary/').json()['labels'])
+        self.food.name = 'Groceries'
+        self.food.save()
+        self.assertIn('Groceries', self.client.get(f'/expenses/{self.user.id}/category-summary/').json()['labels'])
+
+    def test_expenses_page_reads_categories_from_the_registry(self):
+        categories.registry.all()
+        view = ExpensesPageView()
+        view.request = self.frontend_request()
+        with override_settings(FRONTEND_FANOUT_WORKERS=0), CaptureQueriesContext(connection) as queries:
+            context = view.get_context_data()
+        self.assertFalse([q for q in queries.captured_queries if 'FROM "core_category"' in q['sql']])
+        self.assertEqual(len(context['categories']), Category.objects.count())
+        self.assertEqual(len(context['api_categories']), Category.objects.count())
+
+
+class ConditionalGetTests(CoreTestMixin, TestCase):
+    def revalidate(self, path, response, **params):
+        return self.client.get(path, params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_data_gets_a_304_without_queries(self):
+        self.make_expenses(4)
+        categories.registry.all()
+        paths = {
+            '/categories/': {},
+            f'/expenses/{self.user.id}/monthly-summary/': {'year': 2025},
+            f'/expenses/{self.user.id}/category-summary/': {},
+            '/api/videos/': {},
+        }
+        for path, params in paths.items():
+            first = self.client.get(path, params)
+            self.assertEqual(first.status_code, 200)
+            self.assertIn('private', first['Cache-Control'])
+            with self.assertNumQueries(0):
+                response = self.revalidate(path, first, **params)
+            self.assertEqual(response.status_code, 304, path)
+            self.assertEqual(response['ETag'], first['ETag'])
+            self.assertEqual(response.content, b'')
+
+            # Different parameters are a different representation
+            self.assertEqual(self.revalidate(path, first, page_size=1, year=2024).status_code, 200)
+
+            response = self.client.get(path, params, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+            self.assertEqual(response.status_code, 304, path)
+
+    def test_renaming_a_category_changes_the_monthly_summary_etag(self):
+        self.make_expenses(4)
+        rollups.rebuild()
+        path = f'/expenses/{self.user.id}/monthly-summary/'
+        params = {'year': 2025, 'category_name': 'Food'}
+        first = self.client.get(path, params)
+        self.assertTrue(any(first.json()['data']))
+        self.assertEqual(self.revalidate(path, first, **params).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.name = 'Groceries'
+            self.food.save()
+        response = self.revalidate(path, first, **params)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json(), first.json())
+
+    def test_expense_writes_change_the_summary_etag(self):
+        path = f'/expenses/{self.user.id}/category-summary/'
+        first = self.client.get(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.add_expense(self.user.id, 'Food', {'amount': '1.00', 'expense_date': '2025-01-01'})
+        response = self.revalidate(path, first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'labels': ['Food'], 'data': [1.0]})
+
+    def test_video_activity_changes_the_video_etags(self):
+        video = Video.objects.create(title='cats', url='https://example.com', description='')
+        path = f'/api/videos/{video.id}/'
+        first = self.client.get(path)
+        self.assertEqual(self.revalidate(path, first).status_code, 304)
+        # A revalidated view is still counted
+        self.assertEqual(services.video_views.pending(), {video.id: 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/videos/{video.id}/like/')
+        second = self.revalidate(path, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.json()['user_has_liked'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/videos/{video.id}/comments/', {'content': 'hi'}, format='json')
+        self.assertEqual(self.revalidate(path, second).json()['comments_count'], 1)
+
+    def test_etags_are_per_user(self):
+        first = self.client.get('/api/videos/')
+        bob = User.objects.create(username='bob', email='bob@example.com', password='x')
+        self.client.force_authenticate(bob)
+        self.assertEqual(self.revalidate('/api/videos/', first).status_code, 200)
+
+    def test_errors_are_not_given_validators(self):
+        response = self.client.get(f'/expenses/{self.user.id}/monthly-summary/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(self.client.get(f'/api/videos/{uuid.uuid4()}/').status_code, 404)
+
+
+class BulkExpenseTests(CoreTestMixin, TestCase):
+    def post(self, items):
+        return self.client.post(f'/expenses/{self.user.id}/bulk/', items, format='json')
+
+    def test_creates_all_items_in_one_insert(self):
+        items = [
+            {'amount': '2.50', 'expense_date': '2025-01-0%d' % (i + 1), 'description': f'item {i}',
+             **({'category': str(self.food.id)} if i % 2 else {'category_name': 'travel'})}
+            for i in range(6)
+        ]
+        categories.registry.all()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(items)
+        self.assertEqual(response.status_code, 201)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "core_expense"')]
+        self.assertEqual(len(inserts), 1)
+
+        results = response.json()
+        self.assertEqual([r['description'] for r in results], [f'item {i}' for i in range(6)])
+        self.assertEqual([r['category_name'] for r in results], ['Travel', 'Food'] * 3)
+        self.assertEqual(Expense.objects.filter(user=self.user, description__startswith='item').count(), 6)
+        self.assertFalse(rollups.verify([self.user.id]))
+
+    def test_only_the_users_own_account(self):
+        bob = User.objects.create(username='bob', email='bob@example.com', password='x')
+        item = {'amount': '1.00', 'expense_date': '2025-01-01', 'category_name': 'Food'}
+        response = self.client.post(f'/expenses/{bob.id}/bulk/', [item], format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Expense.objects.filter(user=bob).exists())
+        self.assertEqual(APIClient().post(f'/expenses/{self.user.id}/bulk/', [item], format='json').status_code, 403)
+
+    def test_one_bad_item_rejects_the_batch(self):
+        response = self.post([
+            {'amount': '1.00', 'expense_date': '2025-01-01', 'category_name': 'Food'},
+            {'amount': 'lots', 'expense_date': '2025-01-01', 'category_name': 'Nope'},
+            'not an expense',
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[0], {})
+        self.assertEqual(response.json()[2], {'non_field_errors': ['Expected an object.']})
+
+        response = self.post([
+            {'amount': '1.00', 'expense_date': '2025-01-01', 'category_name': 'Food'},
+            {'amount': 'lots', 'expense_date': '2025-01-01', 'category_name': 'Nope'},
+        ])
+        errors = response.json()
+        self.assertEqual(errors[0], {})
+        self.assertEqual(set(errors[1]), {'amount', 'category_name'})
+        self.assertFalse(Expense.objects.filter(user=self.user).exists())
+
+    @override_settings(EXPENSE_BULK_MAX_ITEMS=2)
+    def test_batch_size_is_capped(self):
+        item = {'amount': '1.00', 'expense_date': '2025-01-01'}
+        self.assertEqual(self.post([item] * 3).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([item] * 2).status_code, 201)
+
+
+class ImportExpensesTests(CoreTestMixin, TestCase):
+    CSV = (
+        'date,amount,description,merchant\n'
+        '2025-02-01,-3.50,Flat white,Cafe Nero\n'
+        '2025-02-01,-3.50,Flat white,Cafe Nero\n'
+        '2025-02-02,2500.00,Salary,ACME\n'
+        '2025-02-03,-42.10,Tickets,Rail Co\n'
+        '2025-02-04,-oops,Broken,Nowhere\n'
+        '2025-03-05,-9.99,Something,Unknown Shop\n'
+    )
+    OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250201120000[0:GMT]<TRNAMT>-3.50<FITID>A1<NAME>Cafe Nero
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250203<TRNAMT>-42.10<FITID>A2<NAME>Rail Co<MEMO>Tickets</MEMO>
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+    def setUp(self):
+        super().setUp()
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.rules = self.write(directory, 'rules.csv', 'cafe|coffee,Food\nrail,Travel\n')
+        self.directory = directory
+
+    def write(self, directory, name, content):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, content, name='statement.csv', **options):
+        path = self.write(self.directory, name, content)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_expenses', self.user.username, path, rules=self.rules, merchant_column='merchant',
+                     batch_size=2, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def imported(self):
+        return list(Expense.objects.filter(user=self.user).order_by('expense_date', 'amount')
+                    .values_list('description', 'amount', 'category__name'))
+
+    def test_csv_import(self):
+        out, err = self.run_import(self.CSV)
+        self.assertIn('Imported 4 expense(s), 0 already there, 2 skipped', out)
+        self.assertIn('rows/s', out)
+        self.assertIn('line 6', err)
+        self.assertEqual(self.imported(), [
+            ('Flat white', Decimal('3.50'), 'Food'),
+            ('Flat white', Decimal('3.50'), 'Food'),
+            ('Tickets', Decimal('42.10'), 'Travel'),
+            ('Something', Decimal('9.99'), None),
+        ])
+        self.assertFalse(rollups.verify([self.user.id]))
+
+    def test_rerunning_is_idempotent_and_resumes(self):
+        lines = self.CSV.splitlines(keepends=True)
+        # An import that stopped after the first coffee
+        self.run_import(''.join(lines[:2]))
+        self.assertEqual(len(self.imported()), 1)
+
+        out, _ = self.run_import(self.CSV)
+        self.assertIn('Imported 3 expense(s), 1 already there', out)
+        out, _ = self.run_import(self.CSV)
+        self.assertIn('Imported 0 expense(s), 4 already there', out)
+        self.assertEqual(len(self.imported()), 4)
+        self.assertFalse(rollups.verify([self.user.id]))
+
+    def test_ofx_import(self):
+        out, _ = self.run_import(self.OFX, name='statement.ofx', default_category='Travel')
+        self.assertIn('Imported 2 expense(s)', out)
+        self.assertEqual(self.imported(), [
+            ('Cafe Nero', Decimal('3.50'), 'Food'),
+            ('Tickets', Decimal('42.10'), 'Travel'),
+        ])
+        out, _ = self.run_import(self.OFX, name='statement.ofx')
+        self.assertIn('Imported 0 expense(s), 2 already there', out)
+
+    def test_amounts_are_rounded_to_the_cent_and_bounded(self):
+        out, err = self.run_import(
+            'date,amount,description,merchant\n'
+            '2025-02-01,-0.005,Fee,Bank\n'
+            '2025-02-01,-0.004,Fee,Bank\n'
+            '2025-02-01,-0.015,Fee,Bank\n'
+            '2025-02-02,-1000000000000,Typo,Bank\n'
+            '2025-02-03,-NaN,Typo,Bank\n'
+        )
+        self.assertIn('Imported 2 expense(s), 0 already there, 3 skipped', out)
+        self.assertIn("line 5: amount '-1000000000000' out of range", err)
+        self.assertIn("line 6: invalid amount '-NaN'", err)
+        self.assertEqual([amount for _, amount, _ in self.imported()], [Decimal('0.01'), Decimal('0.02')])
+        self.assertFalse(rollups.verify([self.user.id]))
+
+    def test_ambiguous_amounts_are_reported_not_guessed(self):
+        statement = (
+            'date,amount,description,merchant\n'
+            '2025-02-01,"-1,234.50",Rent,Landlord\n'
+            '2025-02-02,"-12,50",Lunch,Cafe\n'
+        )
+        out, err = self.run_import(statement)
+        self.assertIn('Imported 1 expense(s), 0 already there, 1 skipped', out)
+        self.assertIn("line 3: ambiguous amount '-12,50'", err)
+        self.assertEqual([amount for _, amount, _ in self.imported()], [Decimal('1234.50')])
+
+        out, err = self.run_import(
+            statement.replace('"-1,234.50"', '"-1.234,50"'), decimal_separator=',', thousands_separator='.',
+        )
+        self.assertIn('Imported 1 expense(s), 1 already there, 0 skipped', out)
+        self.assertEqual([amount for _, amount, _ in self.imported()], [Decimal('1234.50'), Decimal('12.50')])
+
+    def test_ofx_entities_and_decimal_commas(self):
+        statement = self.OFX.replace('<TRNAMT>-42.10', '<TRNAMT>-42,10').replace('Rail Co', 'Rail &amp; Bus Co')
+        out, _ = self.run_import(statement, name='statement.ofx')
+        self.assertIn('Imported 2 expense(s)', out)
+        self.assertEqual(
+            list(Expense.objects.filter(user=self.user, amount=Decimal('42.10')).values_list('location', flat=True)),
+            ['Rail & Bus Co'],
+        )
+
+    def test_bad_input_is_reported(self):
+        with self.assertRaisesMessage(CommandError, 'Missing column(s): amount'):
+            self.run_import('date,description,merchant\n')
+        with self.assertRaisesMessage(CommandError, "Unknown category 'Pets'"):
+            self.run_import(self.CSV, default_category='Pets')
+        with self.assertRaisesMessage(CommandError, "can't decode"):
+            self.run_import(self.CSV.replace('Cafe', 'Café'), encoding='ascii')
+        with self.assertRaisesMessage(CommandError, 'differ from the thousands separator'):
+            self.run_import(self.CSV, decimal_separator=',')
+
+
+class BulkUpdateDeleteExpenseTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.expenses = self.make_expenses(6)
+        self.bob = User.objects.create(username='bob', email='bob@example.com', password='x')
+        self.bobs = self.make_expenses(2, user=self.bob)
+        rollups.rebuild()
+        self.ids = [str(expense.id) for expense in self.expenses]
+
+    def test_update_recategorises_in_one_statement(self):
+        ids = self.ids[:4] + [str(self.bobs[0].id), 'nope']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/expenses/bulk/update/',
+                                        {'ids': ids, 'patch': {'category_name': 'travel', 'amount': '7.00'}},
+                                        format='json')
+        self.assertEqual(response.status_code, 200)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "core_expense"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(response.json()['updated'], 4)
+        self.assertEqual([r['status'] for r in response.json()['results']], ['updated'] * 4 + ['not_found', 'invalid'])
+
+        changed = Expense.objects.filter(id__in=self.ids[:4])
+        self.assertEqual({(e.category_id, e.amount) for e in changed}, {(self.travel.id, Decimal('7.00'))})
+        self.assertNotEqual(Expense.objects.get(id=self.bobs[0].id).amount, Decimal('7.00'))
+        self.assertFalse(rollups.verify([self.user.id]))
+
+    def test_update_rejects_bad_patches(self):
+        for patch in ({'amount': 'lots'}, {'category_name': 'Nope'}, {'user': str(self.bob.id)}, {}):
+            response = self.client.post('/expenses/bulk/update/', {'ids': self.ids, 'patch': patch}, format='json')
+            self.assertEqual(response.status_code, 400, patch)
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 6)
+
+    def test_delete_only_removes_own_expenses(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/expenses/bulk/delete/',
+                                        {'ids': self.ids[:3] + [str(self.bobs[0].id)]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['deleted'], 3)
+        self.assertEqual(response.json()['results'][-1], {'id': str(self.bobs[0].id), 'status': 'not_found'})
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 3)
+        self.assertTrue(Expense.objects.filter(id=self.bobs[0].id).exists())
+        self.assertFalse(rollups.verify())
+
+    @override_settings(EXPENSE_BULK_MAX_ITEMS=2)
+    def test_batch_size_is_capped(self):
+        self.assertEqual(self.client.post('/expenses/bulk/delete/', {'ids': self.ids}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/expenses/bulk/delete/', {'ids': []}, format='json').status_code, 400)
+
+    def test_body_must_be_an_object(self):
+        for path in ('/expenses/bulk/update/', '/expenses/bulk/delete/'):
+            response = self.client.post(path, [1], format='json')
+            self.assertEqual(response.status_code, 400, path)
+            self.assertEqual(response.json(), {'error': 'Expected a JSON object.'})
+
+
+class SignedTokenTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # UserLoginSerializer compares unsalted SHA-256 digests
+        self.user.password = hashlib.sha256(b's3cret-pass').hexdigest()
+        self.user.save()
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post('/users/login/', {'email': 'alice@example.com', 'password': 's3cret-pass'},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_access_token_authenticates_without_queries(self):
+        data = self.login()
+        self.assertEqual(data['access_expires_in'], settings.ACCESS_TOKEN_LIFETIME)
+        categories.registry.all()
+        with self.assertNumQueries(0):
+            response = self.client.get('/categories/', HTTP_AUTHORIZATION=f"Bearer {data['access']}")
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(1):
+            response = self.client.get('/categories/', HTTP_AUTHORIZATION=f"Token {data['token']}")
+        self.assertEqual(response.status_code, 200)
+
+        # Fields outside the claims load on first use
+        response = self.client.get('/users/profile/', HTTP_AUTHORIZATION=f"Bearer {data['access']}")
+        self.assertEqual(response.json()['email'], 'alice@example.com')
+
+    def test_bad_and_expired_access_tokens_are_rejected(self):
+        # 403 rather than 401: SessionAuthentication comes first and sends no WWW-Authenticate
+        access = self.login()['access']
+        for header in (f'Bearer {access}x', 'Bearer', f'Bearer {access[:-1]}'):
+            self.assertEqual(self.client.get('/categories/', HTTP_AUTHORIZATION=header).status_code, 403, header)
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            response = self.client.get('/categories/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['detail'], 'Access token expired.')
+
+    def test_refresh_tokens_are_single_use_and_revocable(self):
+        refresh = self.login()['refresh']
+        response = self.client.post('/users/token/refresh/', {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        pair = response.json()
+        self.assertEqual(self.client.get('/categories/', HTTP_AUTHORIZATION=f"Bearer {pair['access']}").status_code, 200)
+        self.assertEqual(self.client.post('/users/token/refresh/', {'refresh': refresh}, format='json').status_code, 401)
+
+        self.assertEqual(self.client.post('/users/token/revoke/', {'refresh': pair['refresh']}, format='json').status_code, 204)
+        response = self.client.post('/users/token/refresh/', {'refresh': pair['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+        for path in ('/users/token/refresh/', '/users/token/revoke/'):
+            self.assertEqual(self.client.post(path, [pair['refresh']], format='json').status_code, 400, path)
+
+    @override_settings(REFRESH_TOKENS_PER_USER=3)
+    def test_refresh_tokens_are_pruned_and_capped_per_user(self):
+        AuthToken = get_token_model()
+        expired = self.login()['refresh']
+        AuthToken.objects.update(expiry=timezone.now() - datetime.timedelta(seconds=1))
+        refreshes = [self.login()['refresh'] for _ in range(4)]
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 3)
+        for refresh in (expired, refreshes[0]):
+            self.assertEqual(self.client.post('/users/token/refresh/', {'refresh': refresh}, format='json').status_code, 401)
+        response = self.client.post('/users/token/refresh/', {'refresh': refreshes[1]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 3)
+
+        # The template views keep the DRF token in the session and store no refresh token
+        AuthToken.objects.all().delete()
+        response = Client().post('/login/', {'email': 'alice@example.com', 'password': 's3cret-pass'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(AuthToken.objects.exists())
+
+    @override_settings(MEDIA_ROOT=tempfile.gettempdir())
+    def test_stale_claims_are_never_saved_back(self):
+        access = self.login()['access']
+        User.objects.filter(pk=self.user.pk).update(username='renamed', is_staff=False, is_active=False)
+        picture = SimpleUploadedFile('me.gif', b'GIF89a\x01\x00\x01\x00\x00\x00\x00;', content_type='image/gif')
+        response = self.client.put('/users/profile/', {'profile_picture': picture}, format='multipart',
+                                   HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual((user.username, user.is_staff, user.is_active), ('renamed', False, False))
+        self.assertTrue(user.profile_picture.name.startswith('profile_pictures/me'))
+        user.profile_picture.delete(save=False)
+
+        claimed = tokens.user_from_claims(tokens.read_access_token(access))
+        with self.assertRaises(ValueError):
+            claimed.save()
+        with self.assertRaises(ValueError):
+            claimed.save(update_fields=['is_active'])
+
+    def test_claims_round_trip(self):
+        user = tokens.user_from_claims(tokens.read_access_token(tokens.issue_access_token(self.user)))
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.username, 'alice')
+        self.assertTrue(user.is_authenticated)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'alice@example.com')
+
+
+class SessionTrafficTests(CoreTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.password = hashlib.sha256(b's3cret-pass').hexdigest()
+        self.user.save()
+        caches['sessions'].clear()
+
+    def session_queries(self, client, path, data, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(path, data, **kwargs)
+        self.assertLess(response.status_code, 400, response.content)
+        return [q['sql'] for q in queries.captured_queries if 'django_session' in q['sql']]
+
+    def log_in(self, client):
+        return self.session_queries(client, '/login/', {'email': 'alice@example.com', 'password': 's3cret-pass'})
+
+    def add_expense(self, client):
+        data = {'category': str(self.food.id), 'amount': '2.00', 'expense_date': '2025-01-01',
+                'description': 'tea', 'location': 'Beirut'}
+        return self.session_queries(client, '/expenses/add/', data, content_type='application/json')
+
+    def test_cached_db_reads_do_not_touch_the_session_table(self):
+        client = Client()
+        self.assertTrue(self.log_in(client))
+        for _ in range(3):
+            self.assertEqual(self.add_expense(client), [])
+        # Logging in again with the same token changes nothing, so nothing is written
+        self.assertEqual(self.log_in(client), [])
+        self.assertEqual(Expense.objects.filter(user=self.user, amount=Decimal('2.00')).count(), 3)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_never_touch_the_session_table(self):
+        client = Client()
+        self.assertEqual(self.log_in(client), [])
+        self.assertEqual(self.add_expense(client), [])
+        self.assertEqual(Expense.objects.filter(user=self.user, amount=Decimal('2.00')).count(), 1)
+
+
+class CacheTierTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        caches[caching.LOCAL_ALIAS].clear()
+        caching.reset_stats()
+
+    def test_tests_run_on_per_process_caches(self):
+        # The configured shared tier outlives the test database (core.test_runner)
+        for alias in ('default', caching.LOCAL_ALIAS, 'sessions'):
+            self.assertEqual(settings.CACHES[alias]['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+
+    def test_entries_are_kept_in_the_local_tier(self):
+        key = caching.versioned_key('answer', ['answer-version'])
+        self.assertEqual(caching.get_or_compute(key, lambda: 42, name='answer'), 42)
+        cache.delete(key)
+        # Still there for this process, without a shared read
+        self.assertEqual(caching.get_or_compute(key, lambda: 0, name='answer'), 42)
+        self.assertEqual(caching.stats()['answer'], {'hits': 1, 'misses': 1})
+
+        caching.bump_version('answer-version', on_commit=False)
+        key = caching.versioned_key('answer', ['answer-version'])
+        self.assertEqual(caching.get_or_compute(key, lambda: 43), 43)
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'value'
+
+        key = caching.versioned_key('slow', ['slow-version'])
+        results = []
+        first = threading.Thread(target=lambda: results.append(caching.get_or_compute(key, compute)))
+        first.start()
+        started.wait(5)
+        others = [threading.Thread(target=lambda: results.append(caching.get_or_compute(key, compute)))
+                  for _ in range(4)]
+        for thread in others:
+            thread.start()
+        for thread in [first, *others]:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrent_increments_all_count_on_the_file_tier(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        file_tier = {**settings.SHARED_CACHES['file'], 'LOCATION': directory}
+        with override_settings(CACHES={**settings.CACHES, 'default': file_tier}):
+            threads = [threading.Thread(target=lambda: [caching.incr('hits') for _ in range(20)]) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(cache.get('hits'), 100)
+
+
+class ResponseCacheTests(CoreTestMixin, TestCase):
+    def test_video_list_is_served_from_the_cache_until_videos_change(self):
+        video = Video.objects.create(title='cats', url='https://example.com', description='')
+        first = self.client.get('/api/videos/').json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/videos/').json(), first)
+        # Someone else's page is cached apart
+        self.assertNotEqual(APIClient().get('/api/videos/')['ETag'], self.client.get('/api/videos/')['ETag'])
+
+        self.client.post(f'/api/videos/{video.id}/like/')
+        self.assertTrue(self.client.get('/api/videos/').json()['results'][0]['user_has_liked'])
+        Video.objects.create(title='dogs', url='https://example.com', description='')
+        self.assertEqual(self.client.get('/api/videos/').json()['count'], first['count'] + 1)
+
+    def test_categories_load_once_for_every_worker(self):
+        other_worker = categories.CategoryRegistry()
+        Category.objects.create(name='Pets', color='#000000', icon='fa-paw')
+        with self.assertNumQueries(1):
+            categories.registry.all()
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(other_worker.get_by_name('pets'))
+
+
+class RespStandInHandler(socketserver.StreamRequestHandler):
+    """Just enough of the Redis protocol (RESP2) for Django's RedisCache."""
+
+    def handle(self):
+        while line := self.rfile.readline():
+            args = []
+            for _ in range(int(line[1:])):
+                size = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(size + 2)[:-2])
+            self.wfile.write(self.server.execute(args[0].upper(), args[1:]))
+
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespStandInHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, command, args):
+        with self.lock:
+            if command == b'GET':
+                value = self.get(args[0])
+                return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+            if command == b'SET':
+                key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+                if b'NX' in options and self.get(key) is not None:
+                    return b'$-1\r\n'
+                expires = None
+                if b'EX' in options:
+                    expires = time.monotonic() + int(options[options.index(b'EX') + 1])
+                self.data[key] = (value, expires)
+                return b'+OK\r\n'
+            if command in (b'DEL', b'EXISTS'):
+                found = [key for key in args if self.get(key) is not None]
+                if command == b'DEL':
+                    for key in found:
+                        del self.data[key]
+                return b':%d\r\n' % len(found)
+            if command == b'INCRBY':
+                value, expires = self.data.get(args[0], (b'0', None))
+                value = b'%d' % (int(value) + int(args[1]))
+                self.data[args[0]] = (value, expires)
+                return b':%s\r\n' % value
+            if command == b'FLUSHDB':
+                self.data.clear()
+            # CLIENT SETINFO and anything else the client sends on connect
+            return b'+OK\r\n'
+
+
+@unittest.skipUnless(find_spec('redis'), "the redis package is not installed")
+class RedisTierTests(SimpleTestCase):
+    def setUp(self):
+        server = RespStandIn()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.enterContext(override_settings(CACHES={**settings.CACHES, 'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'redis://127.0.0.1:{server.server_address[1]}/0',
+        }}))
+        caches[caching.LOCAL_ALIAS].clear()
+
+    def test_versions_and_entries_round_trip(self):
+        first = caching.version('stand-in-version')
+        key = caching.versioned_key('stand-in', ['stand-in-version'])
+        self.assertEqual(caching.get_or_compute(key, lambda: {'total': 1}), {'total': 1})
+        self.assertEqual(cache.get(key), {'total': 1})
+        self.assertFalse(cache.has_key(f'{key}:lock'))
+
+        caching.bump_version('stand-in-version', on_commit=False)
+        self.assertNotEqual(caching.version('stand-in-version'), first)
+        self.assertIsNotNone(caching.version_modified('stand-in-version'))
+
+    def test_counters_increment_in_place(self):
+        self.assertEqual(caching.incr('stand-in-counter', 2), 2)
+        self.assertEqual(caching.incr('stand-in-counter'), 3)
+        self.assertEqual(caching.incr('stand-in-counter', -3), 0)
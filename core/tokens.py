@@ -0,0 +1,139 @@
+"""
+Signed access tokens and database-backed refresh tokens.
+
+An access token is the user's id and a few claims, signed with an HMAC of
+SECRET_KEY (django.core.signing) and timestamped. SignedTokenAuthentication
+checks the signature and age and builds request.user from the claims, so
+authenticating a request needs no query; fields not in the claims (email,
+profile_picture, ...) are deferred and load on first access, and the
+claimed fields can never be saved back (User.save() refuses). Access tokens
+cannot be revoked, which is why they only live ACCESS_TOKEN_LIFETIME
+seconds: deactivating a user or changing their password takes effect for
+API calls once the tokens they hold expire.
+
+A refresh token is a knox AuthToken (stored as a digest, with an expiry),
+good for REFRESH_TOKEN_LIFETIME. It is exchanged for a new access token
+and a new refresh token, and the old one is deleted, so every refresh
+token works once; revoke() deletes it (logout). A user keeps at most
+REFRESH_TOKENS_PER_USER of them: issuing a new one deletes the user's
+expired tokens and the oldest ones past the limit.
+
+Clients send `Authorization: Bearer <access token>`. The DRF
+`Token <key>` scheme keeps working alongside.
+"""
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import router, transaction
+from django.utils import timezone
+from knox.auth import TokenAuthentication as KnoxTokenAuthentication
+from knox.models import get_token_model
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+KEYWORD = 'Bearer'
+SALT = 'core.tokens.access'
+
+# Claim name -> User field, in the order they are signed
+CLAIMS = {
+    'uid': 'id',
+    'name': 'username',
+    'staff': 'is_staff',
+    'su': 'is_superuser',
+}
+
+
+def issue_access_token(user):
+    claims = {claim: getattr(user, field) for claim, field in CLAIMS.items()}
+    claims['uid'] = str(claims['uid'])
+    return signing.dumps(claims, salt=SALT, compress=False)
+
+
+def read_access_token(token):
+    """The claims of a valid, unexpired access token; raises signing.BadSignature otherwise."""
+    return signing.loads(token, salt=SALT, max_age=settings.ACCESS_TOKEN_LIFETIME)
+
+
+def user_from_claims(claims):
+    """A User instance with the claimed fields set and every other field deferred."""
+    User = get_user_model()
+    values = {field: User._meta.get_field(field).to_python(claims[claim]) for claim, field in CLAIMS.items()}
+    values['is_active'] = True
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in values]
+    user = User.from_db(router.db_for_read(User), fields, [values[name] for name in fields])
+    # The claims (and is_active) may be out of date, so User.save() refuses to write them
+    user.claimed_fields = frozenset(fields)
+    return user
+
+
+def _prune_refresh_tokens(user):
+    """Delete the user's expired refresh tokens and the oldest ones, leaving room for one more."""
+    AuthToken = get_token_model()
+    now = timezone.now()
+    live = 0
+    stale = []
+    for digest, expiry in AuthToken.objects.filter(user=user).order_by('-created').values_list('digest', 'expiry'):
+        if (expiry is not None and expiry < now) or live >= settings.REFRESH_TOKENS_PER_USER - 1:
+            stale.append(digest)
+        else:
+            live += 1
+    if stale:
+        AuthToken.objects.filter(digest__in=stale).delete()
+
+
+def issue_tokens(user):
+    """A new access and refresh token pair for the user."""
+    lifetime = datetime.timedelta(seconds=settings.REFRESH_TOKEN_LIFETIME)
+    _prune_refresh_tokens(user)
+    _, refresh = get_token_model().objects.create(user, expiry=lifetime)
+    return {
+        'access': issue_access_token(user),
+        'access_expires_in': settings.ACCESS_TOKEN_LIFETIME,
+        'refresh': refresh,
+    }
+
+
+def _refresh_token(refresh):
+    if not isinstance(refresh, str) or not refresh:
+        raise exceptions.AuthenticationFailed('Invalid refresh token.')
+    # Looks the token up by prefix, compares digests and drops expired ones
+    return KnoxTokenAuthentication().authenticate_credentials(refresh.encode())
+
+
+def refresh_tokens(refresh):
+    """Exchange a refresh token for a new pair; the old refresh token stops working."""
+    user, token = _refresh_token(refresh)
+    with transaction.atomic():
+        deleted, _ = get_token_model().objects.filter(digest=token.digest).delete()
+        if not deleted:
+            # Used by a concurrent request a moment ago
+            raise exceptions.AuthenticationFailed('Invalid refresh token.')
+        return issue_tokens(user)
+
+
+def revoke(refresh):
+    _, token = _refresh_token(refresh)
+    token.delete()
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticates `Authorization: Bearer <access token>` without touching the database."""
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != KEYWORD.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid bearer header.')
+        try:
+            claims = read_access_token(auth[1].decode())
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed('Access token expired.')
+        except (signing.BadSignature, UnicodeDecodeError):
+            raise exceptions.AuthenticationFailed('Invalid access token.')
+        return user_from_claims(claims), claims
+
+    def authenticate_header(self, request):
+        return KEYWORD
@@ -2,26 +2,26 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from .serializers import UserRegistrationSerializer, UserLoginSerializer, ExpenseSerializer, VideoCommentSerializer, VideoDetailSerializer, VideoLikeSerializer, VideoReviewSerializer, VideoSerializer, CategorySerializer
-from .models import Income, Category, Expense, Video, VideoComment, VideoLike
-from django.db import IntegrityError
-from django.db.models.functions import ExtractMonth
-from django.db.models import Sum, Q
-from .serializers import IncomeSerializer
-from rest_framework.authtoken.models import Token
+from .serializers import VideoCommentSerializer, VideoReviewSerializer, VideoSerializer, CategorySerializer
+from .models import Category, Video, VideoComment
+from django.db import transaction
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render
 from django.views import View
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import Http404, JsonResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.contrib.auth import login as auth_login, logout
-from django.conf import settings
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-import requests
+import json
+from . import categories, conditional, counters, services
+from .concurrency import fan_out
+from .exports import RENDERERS as EXPORT_RENDERERS, CSVRenderer, JSONLinesRenderer, export_rows
+from .frontend_api import FrontendAPIError, get_frontend_api
+from .search import search_videos
 from .forms import RegistrationForm, LoginForm
 import logging
 logger = logging.getLogger(__name__)
@@ -34,44 +34,57 @@ from .forms import ProfilePictureForm  # Import the missing form
 
 User = get_user_model()
 
+
+def set_session_value(session, key, value):
+    # Any assignment marks the session modified, and a modified session is
+    # written back at the end of the request, so skip no-op assignments
+    if session.get(key) != value:
+        session[key] = value
+
+
 class UserRegistrationView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        serializer = UserRegistrationSerializer(data=request.data)
+        try:
+            data = services.register_user(request.data)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_201_CREATED)
 
-        if serializer.is_valid():
-            user = serializer.save()
-            token, created = Token.objects.get_or_create(user=user)
 
-            # Create an Income object with a budget_amount of 0 for the new user
-            Income.objects.create(user=user, budget_amount=0)
+class UserLoginView(APIView):
+    permission_classes = [AllowAny]
+    
+    def post(self, request):
+        try:
+            data = services.login_user(request.data)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_200_OK)
+
 
-            return Response({
-                'user_id': str(user.id),
-                'token': token.key
-            }, status=status.HTTP_201_CREATED)
+class TokenRefreshView(APIView):
+    permission_classes = [AllowAny]
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    def post(self, request):
+        # {"refresh": ...} -> a new access and refresh token; the old one is used up
+        try:
+            data = services.refresh_tokens(request.data)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_200_OK)
 
 
-class UserLoginView(APIView):
+class TokenRevokeView(APIView):
     permission_classes = [AllowAny]
-    
+
     def post(self, request):
-        serializer = UserLoginSerializer(data=request.data)
-        
-        if serializer.is_valid():
-            user = serializer.validated_data['user']
-            token, created = Token.objects.get_or_create(user=user)
-            return Response({
-                'user_id': str(user.id),
-                'token': token.key
-            }, status=status.HTTP_200_OK)
-        
-        return Response({
-            'error': serializer.errors.get('non_field_errors', ['Invalid credentials'])[0]
-        }, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            services.revoke_refresh_token(request.data)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(status=status.HTTP_204_NO_CONTENT)
     
     # NEW Income Views
 class UserIncomeView(APIView):
@@ -80,228 +93,179 @@ class UserIncomeView(APIView):
     def get(self, request):
         # Fetch the income for the authenticated user
         try:
-            income = Income.objects.get(user=request.user)
-            serializer = IncomeSerializer(income)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Income.DoesNotExist:
-            return Response({"error": "Income not found for this user."}, status=status.HTTP_404_NOT_FOUND)
+            return Response(services.get_income(request.user), status=status.HTTP_200_OK)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
 
     def post(self, request):
-        serializer = IncomeSerializer(data=request.data)
-
-        if serializer.is_valid():
-            try:
-                # Pass the authenticated user instance to the save method
-                serializer.save(user=request.user)
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            except IntegrityError as e:
-                return Response(
-                    {"error": "A database integrity error occurred.", "details": str(e)},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Pass the authenticated user instance to the save method
+            data = services.create_income(request.user, request.data)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_201_CREATED)
 
 class IncomeDetailView(APIView):
     permission_classes = [IsAuthenticated]
     
     def put(self, request, user_id):
-        # Get the income object for the authenticated user and the provided user_id
-        income = get_object_or_404(Income, user__id=user_id, user=request.user)
-        
-        # Update the income object with the provided data
-        serializer = IncomeSerializer(income, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # Update the income object of the authenticated user with the provided data
+        try:
+            data = services.update_income(request.user, user_id, request.data)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_200_OK)
     
 class AddExpenseView(APIView):
     parser_classes = (MultiPartParser, FormParser, JSONParser)  # Add all three parsers
     
     def post(self, request, user_id, category_name):
-        user = get_object_or_404(User, id=user_id)
-        category = get_object_or_404(Category, name=category_name)
-
         # Handle both form data and JSON
         data = request.data.dict() if hasattr(request.data, 'dict') else request.data.copy()
-        data['category'] = category.id
-
-        serializer = ExpenseSerializer(data=data, context={
-            'user': user,
-            'request': request
-        })
 
-        if serializer.is_valid():
-            try:
-                serializer.save()
-                return Response(serializer.data, status=status.HTTP_201_CREATED)
-            except IntegrityError as e:
-                return Response(
-                    {"error": "Database error", "details": str(e)},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data = services.add_expense(user_id, category_name, data, request=request)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_201_CREATED)
     
+class BulkAddExpenseView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = (JSONParser,)
+
+    def post(self, request, user_id):
+        # A JSON list of expenses, each with `category` (id) or `category_name`
+        if user_id != request.user.id:
+            return Response(
+                {"detail": "You can only add expenses to your own account."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        try:
+            data = services.add_expenses(user_id, request.data)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+class BulkUpdateExpenseView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # {"ids": [...], "patch": {...}}; only the user's own expenses are touched
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Expected a JSON object.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data = services.bulk_update_expenses(request.user, request.data.get('ids'), request.data.get('patch'))
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_200_OK)
+
+class BulkDeleteExpenseView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # {"ids": [...]}
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Expected a JSON object.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data = services.bulk_delete_expenses(request.user, request.data.get('ids'))
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_200_OK)
+
 class ExpenseListView(APIView):
     def get(self, request, user_id):
-        # Get the user
-        user = get_object_or_404(User, id=user_id)
-
-        # Filter expenses for the specific user
-        queryset = Expense.objects.filter(user=user)
-
-        # Filtering by year
-        year = request.query_params.get('year')
-        if year:
-            queryset = queryset.filter(expense_date__year=year)
-
-        # Filtering by month
-        month = request.query_params.get('month')
-        if month:
-            queryset = queryset.filter(expense_date__month=month)
-
-        # Filtering by category name
-        category_name = request.query_params.get('category_name')
-        if category_name:
-            queryset = queryset.filter(category__name__iexact=category_name)
-
-        # Sorting by amount
-        sort = request.query_params.get('sort')
-        if sort == 'asc':
-            queryset = queryset.order_by('amount')
-        elif sort == 'desc':
-            queryset = queryset.order_by('-amount')
-
-        # Serialize the data
-        serializer = ExpenseSerializer(queryset, many=True)
-        return Response(serializer.data)
+        # Opt-in cursor pagination (?page_size=/?cursor=), ?all=true for the full list
+        try:
+            if services.wants_expense_page(request.query_params):
+                return Response(services.page_expenses(user_id, request.query_params))
+            return Response(services.list_expenses(user_id, request.query_params))
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
     
 
+class ExpenseExportView(APIView):
+    # Only used to negotiate ?format=csv|jsonl; the body is streamed below
+    renderer_classes = [CSVRenderer, JSONLinesRenderer]
+
+    def get(self, request, user_id):
+        # Same filters as ExpenseListView
+        try:
+            queryset = services.expense_queryset(user_id, request.query_params)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+
+        export_format = request.accepted_renderer.format
+        render_rows, content_type = EXPORT_RENDERERS[export_format]
+        response = StreamingHttpResponse(render_rows(export_rows(queryset)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="expenses.{export_format}"'
+        return response
+
+
 class UpdateExpenseView(APIView):
     def put(self, request, expense_id):
-        # Get the expense object
-        expense = get_object_or_404(Expense, id=expense_id)
-
-        # Update the expense with the provided data
-        serializer = ExpenseSerializer(expense, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data = services.update_expense(expense_id, request.data)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response(data, status=status.HTTP_200_OK)
     
 
 class DeleteExpenseView(APIView):
     def delete(self, request, expense_id):
         try:
-            expense = Expense.objects.get(id=expense_id)
-            expense.delete()
-            return Response({'success': True}, status=status.HTTP_204_NO_CONTENT)
-        except Expense.DoesNotExist:
-            return Response({'success': False, 'error': 'Expense not found'}, status=status.HTTP_404_NOT_FOUND)
+            services.delete_expense(expense_id)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+        return Response({'success': True}, status=status.HTTP_204_NO_CONTENT)
         
 
 class MonthlyExpenseSummaryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, user_id):
-        year = request.query_params.get('year')
-        if not year:
-            return Response({'error': 'Year parameter is required'}, status=400)
-        
+        # 304 while the user's expenses (and the categories ?category_name=
+        # matches by name) are unchanged (see core.conditional)
+        return conditional.respond(
+            request, 'monthly-summary', conditional.user_stamps(user_id, categories.VERSION_KEY),
+            lambda: self.summary(request, user_id), policy='expense-summary',
+        )
+
+    def summary(self, request, user_id):
+        # ?year= is required; it and the other filters are checked by the service
         try:
-            year = int(year)
-        except ValueError:
-            return Response({'error': 'Invalid year format'}, status=400)
-        
-        # Get monthly expenses for the user
-        monthly_totals = Expense.objects.filter(
-            user_id=user_id,
-            expense_date__year=year
-        ).annotate(
-            month=ExtractMonth('expense_date')
-        ).values('month').annotate(
-            total=Sum('amount')
-        ).order_by('month')
-        
-        # Create a dictionary with all months initialized to 0
-        monthly_data = {month: 0 for month in range(1, 13)}
-        
-        # Update with actual data
-        for entry in monthly_totals:
-            monthly_data[entry['month']] = float(entry['total'])
-        
-        # Prepare response
-        month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                      'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        
-        return Response({
-            'labels': month_names,
-            'data': [monthly_data[month] for month in range(1, 13)]
-        })
+            return Response(services.monthly_expense_summary(user_id, request.query_params))
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
 
 class CategoryExpenseSummaryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, user_id):
-        # Get expenses grouped by category
-        category_totals = Expense.objects.filter(
-            user_id=user_id
-        ).values(
-            'category__name'
-        ).annotate(
-            total=Sum('amount')
-        ).order_by('-total')
-        
-        # Prepare response
-        labels = []
-        data = []
-        
-        for entry in category_totals:
-            labels.append(entry['category__name'])
-            data.append(float(entry['total']))
-        
-        return Response({
-            'labels': labels,
-            'data': data
-        })           
+        return conditional.respond(
+            request, 'category-summary', conditional.user_stamps(user_id, categories.VERSION_KEY),
+            lambda: self.summary(request, user_id), policy='expense-summary',
+        )
+
+    def summary(self, request, user_id):
+        # Optional filters, e.g. ?date_from=&date_to= (see core.filters)
+        try:
+            return Response(services.category_expense_summary(user_id, request.query_params))
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
 
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
     
     def get(self, request):
-        user = request.user
-        return Response({
-            'id': str(user.id),
-            'username': user.username,
-            'email': user.email,
-            'profile_picture': request.build_absolute_uri(user.profile_picture.url) if user.profile_picture else None
-        })
+        return Response(services.get_profile(request.user, request))
     
     def put(self, request):
-        user = request.user
-        
         if 'profile_picture' in request.FILES:
-            # Delete old profile picture if exists
-            if user.profile_picture:
-                try:
-                    user.profile_picture.delete(save=False)
-                except:
-                    pass  # Handle potential file deletion errors
-            
-            user.profile_picture = request.FILES['profile_picture']
-            user.save()
-            
-            # Return the updated profile with the new picture URL
-            profile_picture_url = request.build_absolute_uri(user.profile_picture.url) if user.profile_picture else None
-            
-            # The frontend should update the session with this new URL
-            return Response({
-                'id': str(user.id),
-                'username': user.username,
-                'email': user.email,
-                'profile_picture': profile_picture_url
-            })
+            # The frontend should update the session with the new picture URL
+            return Response(services.update_profile_picture(
+                request.user, request.FILES['profile_picture'], request
+            ))
         
         return Response({"error": "No profile picture provided"}, status=400)
 
@@ -310,15 +274,18 @@ class VideoListAPIView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
+        return conditional.respond(
+            request, 'video-list', [conditional.VIDEO_VERSION_KEY], lambda: self.video_page(request), policy='videos',
+            cache_response=True,
+        )
+
+    def video_page(self, request):
         query = request.GET.get('search', '')
-        videos_list = Video.objects.all().order_by('-created_at')
+        videos_list = services.video_queryset(request.user).order_by('-created_at')
         
-        # Search functionality
+        # Full-text search, best matches first (see core.search)
         if query:
-            videos_list = videos_list.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query)
-            )
+            videos_list = search_videos(videos_list, query)
             
         # Pagination
         paginator = PageNumberPagination()
@@ -333,14 +300,21 @@ class VideoDetailAPIView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request, video_id):
-        video = get_object_or_404(Video, id=video_id)
+        # A 304 still counts as a view; it can only match an ETag this
+        # endpoint issued for a video that exists
+        return conditional.respond(
+            request, f'video-{video_id}', [conditional.VIDEO_VERSION_KEY],
+            lambda: self.detail(request, video_id), policy='videos',
+            on_not_modified=lambda: services.record_video_view(video_id),
+        )
+
+    def detail(self, request, video_id):
+        video = get_object_or_404(services.video_queryset(request.user), id=video_id)
         
-        # Optionally increment view count
-        video.view_count += 1
-        video.save()
+        # Counted in the shared cache and flushed in batches, see services.video_views
+        services.record_video_view(video.id)
         
-        serializer = VideoDetailSerializer(video, context={'request': request})
-        return Response(serializer.data)
+        return Response(services.video_detail(video, request))
 
 # Video comment API endpoints
 class VideoCommentListCreateAPIView(APIView):
@@ -348,9 +322,11 @@ class VideoCommentListCreateAPIView(APIView):
     
     def get(self, request, video_id):
         video = get_object_or_404(Video, id=video_id)
-        comments = video.comments.all().order_by('-created_at')
-        serializer = VideoCommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        # Newest first, ?page_size= and ?cursor= from next_cursor/prev_cursor
+        try:
+            return Response(services.page_video_comments(video, request.query_params))
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
     
     def post(self, request, video_id):
         video = get_object_or_404(Video, id=video_id)
@@ -361,11 +337,10 @@ class VideoCommentListCreateAPIView(APIView):
         )
         
         if serializer.is_valid():
-            comment = serializer.save()
-            
-            # Update comment count on video
-            video.comments_count = video.comments.count()
-            video.save()
+            # The count moves by the same step in the same transaction
+            with transaction.atomic():
+                serializer.save()
+                counters.add(Video, video.id, 'comments_count', 1)
             
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -410,12 +385,11 @@ class VideoCommentDetailAPIView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        video = comment.video
-        comment.delete()
-        
-        # Update comment count on video
-        video.comments_count = video.comments.count()
-        video.save()
+        with transaction.atomic():
+            # Only the request that actually removed the row decrements
+            deleted, _ = VideoComment.objects.filter(id=comment.id).delete()
+            if deleted:
+                counters.add(Video, comment.video_id, 'comments_count', -deleted)
         
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -424,33 +398,26 @@ class VideoLikeAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, video_id):
-        video = get_object_or_404(Video, id=video_id)
-
-        # Pass the video instance to the serializer data
-        serializer = VideoLikeSerializer(
-            data={'video': video.id}, # Pass video ID for validation
-            context={'request': request}
-        )
+        video = get_object_or_404(Video.objects.only('id'), id=video_id)
 
-        if serializer.is_valid():
-            # The save() method in the serializer handles the creation/deletion and count update
-            serializer.save()
-
-            # Re-fetch the video to get the updated likes_count
-            video.refresh_from_db()
-
-            # Return updated like status
-            return Response({
-                'liked': VideoLike.objects.filter(user=request.user, video=video).exists(),
-                'likes_count': video.likes_count
-            }, status=status.HTTP_200_OK) # Use 200 OK for success
-
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # Toggles the like and returns {'liked': ..., 'likes_count': ...}
+        try:
+            return Response(services.toggle_video_like(request.user, video.id), status=status.HTTP_200_OK)
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
 
 # Video review API endpoints
 class VideoReviewCreateUpdateAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
+    def get(self, request, video_id):
+        video = get_object_or_404(Video, id=video_id)
+        # Paginated like the comments
+        try:
+            return Response(services.page_video_reviews(video, request.query_params))
+        except services.ServiceError as e:
+            return Response(e.errors, status=e.status_code)
+    
     def post(self, request, video_id):
         video = get_object_or_404(Video, id=video_id)
         
@@ -474,12 +441,9 @@ class VideoListView(View):
         query = request.GET.get('search', '')
         videos_list = Video.objects.all().order_by('-created_at')
         
-        # Search functionality
+        # Full-text search, best matches first (see core.search)
         if query:
-            videos_list = videos_list.filter(
-                Q(title__icontains=query) |
-                Q(description__icontains=query)
-            )
+            videos_list = search_videos(videos_list, query)
         
         # Pagination
         paginator = Paginator(videos_list, 6)  # Show 6 videos per page
@@ -501,19 +465,22 @@ class RegistrationView(View):
     def post(self, request):
         form = RegistrationForm(request.POST)
         if form.is_valid():
-            response = requests.post(
-                f'{settings.API_BASE_URL}/users/',
-                json={
+            try:
+                response = get_frontend_api(request).register({
                     'username': form.cleaned_data['username'],
                     'email': form.cleaned_data['email'],
                     'password': form.cleaned_data['password']
-                }
-            )
+                })
+            except FrontendAPIError:
+                form.add_error(None, "Error connecting to the server. Please try again.")
+                return render(request, 'core/register.html', {'form': form})
             if response.status_code == 201:  # User successfully registered
                 return redirect('login')
             elif response.status_code == 400:  # Handle API errors (e.g., user already exists)
-                errors = response.json()
+                errors = response.data or {}
                 for field, error_messages in errors.items():
+                    if field not in form.fields:
+                        field = None
                     for error in error_messages:
                         form.add_error(field, error)
         return render(request, 'core/register.html', {'form': form})
@@ -526,38 +493,36 @@ class LoginView(View):
     def post(self, request):
         form = LoginForm(request.POST)
         if form.is_valid():
-            response = requests.post(
-                f'{settings.API_BASE_URL}/users/login/',
-                json={
+            try:
+                response = get_frontend_api(request).login({
                     'email': form.cleaned_data['email'],
                     'password': form.cleaned_data['password']
-                }
-            )
+                })
+            except FrontendAPIError:
+                form.add_error(None, "Error connecting to the server. Please try again.")
+                return render(request, 'core/login.html', {'form': form})
             if response.status_code == 200:  # Login successful
-                response_data = response.json()
+                response_data = response.data or {}
                 try:
-                    request.session['token'] = response_data['token']
-                    request.session['user_id'] = response_data['user_id']
+                    set_session_value(request.session, 'token', response_data['token'])
+                    set_session_value(request.session, 'user_id', response_data['user_id'])
                     
                     # Fetch user profile to get profile picture URL
-                    profile_response = requests.get(
-                        f"{settings.API_BASE_URL}/users/profile/",
-                        headers={'Authorization': f"Token {response_data['token']}"}
-                    )
+                    try:
+                        profile_response = get_frontend_api(request).get_profile()
+                    except FrontendAPIError:
+                        profile_response = None
                     
-                    if profile_response.status_code == 200:
-                        profile_data = profile_response.json()
+                    if profile_response and profile_response.status_code == 200:
+                        profile_data = profile_response.data
                         if profile_data.get('profile_picture'):
-                            request.session['profile_picture_url'] = profile_data['profile_picture']
+                            set_session_value(request.session, 'profile_picture_url', profile_data['profile_picture'])
                     
                     return redirect('dashboard')
                 except KeyError:
                     form.add_error(None, "Invalid response from the server.")
             elif response.status_code in [400, 401]:  # Invalid credentials or unauthorized
-                try:
-                    error_message = response.json().get('error', "Invalid email or password.")
-                except ValueError:
-                    error_message = "Invalid email or password."
+                error_message = (response.data or {}).get('error', "Invalid email or password.")
                 form.add_error(None, error_message)
             else:  # Handle unexpected errors
                 form.add_error(None, "An unexpected error occurred. Please try again.")
@@ -602,13 +567,12 @@ class DashboardView(View):
     
 def income_list(request):
     token = request.session.get("token")  # Retrieve the token from the session
-    user_id = request.session.get("user_id")  # Retrieve the user_id from the session
 
     if not token:
         messages.error(request, "You are not authenticated. Please log in again.")
         return redirect("login")
 
-    headers = {"Authorization": f"Token {token}"}
+    api = get_frontend_api(request)
 
     if request.method == "POST":
         # Handle income update
@@ -616,18 +580,24 @@ def income_list(request):
         data = {"budget_amount": budget_amount}
 
         # Send the updated income to the API
-        response = requests.put(f"{settings.API_BASE_URL}/incomes/{user_id}/", headers=headers, json=data)
+        try:
+            response = api.update_income(data)
+        except FrontendAPIError:
+            response = None
 
-        if response.status_code == 200:  # Income updated successfully
+        if response and response.status_code == 200:  # Income updated successfully
             messages.success(request, "Income updated successfully!")
         else:  # Handle errors
             messages.error(request, "Failed to update income. Please try again.")
         return redirect("frontend-income-list")
 
     # Handle GET request to fetch the user's current income
-    response = requests.get(f"{settings.API_BASE_URL}/incomes/", headers=headers)
-    if response.status_code == 200:
-        income = response.json()  # Fetch the current income details
+    try:
+        response = api.get_income()
+    except FrontendAPIError:
+        response = None
+    if response and response.status_code == 200:
+        income = response.data  # Fetch the current income details
     else:
         income = None
         messages.error(request, "Failed to fetch income details. Please try again.")
@@ -644,21 +614,15 @@ class ExpensesPageView(View):
         return render(request, self.template_name, context)
 
     def get_context_data(self):
-        # Debug: Print session data
-        print(f"Session data: {dict(self.request.session)}")
-        
         # Get authentication data
         token = self.request.session.get('token')
         user_id = self.request.session.get('user_id')
         
-        print(f"Token: {token}, User ID: {user_id}")  # Debug
-        
         if not token or not user_id:
             messages.error(self.request, "You are not authenticated. Please log in again.")
             return redirect("login")
         
-        # Set headers with authentication token
-        headers = {'Authorization': f'Token {token}'}
+        api = get_frontend_api(self.request)
         
         # Get filter parameters
         year = self.request.GET.get('year')
@@ -666,53 +630,46 @@ class ExpensesPageView(View):
         category_name = self.request.GET.get('category_name')
         sort = self.request.GET.get('sort')  # Get the sort parameter
         
-        # Build API URL (MUST include user_id)
-        api_url = f"{settings.API_BASE_URL}/expenses/{user_id}/"
+        # Build API params (the API resolves the user from user_id)
         params = {}
         if year: params['year'] = year
         if month: params['month'] = month
         if category_name: params['category_name'] = category_name
         if sort: params['sort'] = sort  # Add sort parameter to the API request
         
-        print(f"Making request to: {api_url} with params: {params}")  # Debug
-        
         # Initialize default context values
         expenses = []
-        api_categories = []
         income = 0  # Default income value
         
-        # Fetch expenses from API
-        try:
-            response = requests.get(api_url, params=params, headers=headers)
-            print(f"API response: {response.status_code}")  # Debug
-            
-            if response.status_code == 200:
-                expenses = response.json()
-            else:
-                messages.error(self.request, "Failed to fetch expenses. Please try again.")
-            
-            # Fetch categories from API for dropdown
-            categories_response = requests.get(f"{settings.API_BASE_URL}/categories/")
-            api_categories = categories_response.json() if categories_response.status_code == 200 else []
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}")  # Debug
-            messages.error(self.request, "Error connecting to the server. Please try again.")
+        # The fetches don't depend on each other, so run them concurrently
+        # when they are HTTP calls (in-process they finish before the handoff)
+        results = fan_out({
+            'expenses': lambda: api.list_expenses(params),
+            'income': api.get_income,
+        }, inline=not api.remote)
         
-        # Fetch income for the user
-        try:
-            income_response = requests.get(f"{settings.API_BASE_URL}/incomes/", headers=headers)
-            if income_response.status_code == 200:
-                income_data = income_response.json()
-                income = float(income_data.get('budget_amount', 0))  # Convert to float for comparison
-            else:
-                messages.error(self.request, "Failed to fetch income details.")
-        except requests.exceptions.RequestException as e:
-            print(f"Income request error: {e}")  # Debug
+        response, error = results['expenses']
+        if error is not None:
+            logger.warning("Fetching expenses failed: %s", error)
+            messages.error(self.request, "Error connecting to the server. Please try again.")
+        elif response.status_code == 200:
+            expenses = response.data
+        else:
+            messages.error(self.request, "Failed to fetch expenses. Please try again.")
+        
+        income_response, error = results['income']
+        if error is not None:
+            logger.warning("Fetching income failed: %s", error)
             messages.error(self.request, "Error connecting to the server while fetching income.")
+        elif income_response.status_code == 200:
+            income_data = income_response.data
+            income = float(income_data.get('budget_amount', 0))  # Convert to float for comparison
+        else:
+            messages.error(self.request, "Failed to fetch income details.")
         
-        # Get categories directly from database (original functionality)
-        orm_categories = Category.objects.all()
+        # Both category lists come from the in-process registry, no query or API call
+        orm_categories = categories.registry.all()
+        api_categories = categories.registry.serialized()
         
         # Return context dictionary
         return {
@@ -738,13 +695,14 @@ class AddExpenseViewFront(View):
             return JsonResponse({'success': False, 'errors': 'Authentication required. Please log in again.'}, status=401)
             
         # Parse JSON data from request body
-        import json
         try:
             data = json.loads(request.body)
             category_id = data.get('category')
             
             # Get the category name for the API call
-            category = get_object_or_404(Category, id=category_id)
+            category = categories.registry.get(category_id)
+            if category is None:
+                raise Http404('No Category matches the given query.')
             category_name = category.name
             
             # Prepare data for the API call
@@ -755,18 +713,8 @@ class AddExpenseViewFront(View):
                 'location': data.get('location')
             }
             
-            # Set up headers with authentication token
-            headers = {
-                'Authorization': f'Token {token}',
-                'Content-Type': 'application/json'
-            }
-            
             # Make API request with the user_id from session
-            response = requests.post(
-                f"{settings.API_BASE_URL}/expenses/add/{user_id}/{category_name}/",
-                json=api_data,
-                headers=headers
-            )
+            response = get_frontend_api(request).add_expense(category_name, api_data)
             
             if response.status_code == 201:
                 return JsonResponse({'success': True})
@@ -774,7 +722,7 @@ class AddExpenseViewFront(View):
             # Return detailed error information
             return JsonResponse({
                 'success': False, 
-                'errors': response.json() if response.content else "Error communicating with the API"
+                'errors': response.data if response.data is not None else "Error communicating with the API"
             }, status=response.status_code)
         
         except json.JSONDecodeError:
@@ -791,10 +739,7 @@ class UpdateExpenseViewFront(View):
         if not token or not user_id:  # Check for user_id too
             return JsonResponse({'success': False, 'errors': 'Authentication required. Please log in again.'}, status=401)
             
-        # Rest of your code...
-            
         # Parse JSON data from request body
-        import json
         try:
             data = json.loads(request.body)
             
@@ -807,18 +752,8 @@ class UpdateExpenseViewFront(View):
                 'category': data.get('category')
             }
             
-            # Set up headers with authentication token
-            headers = {
-                'Authorization': f'Token {token}',
-                'Content-Type': 'application/json'
-            }
-            
             # Make API request with authentication
-            response = requests.put(
-                f"{settings.API_BASE_URL}/expenses/update/{expense_id}/",
-                json=api_data,
-                headers=headers
-            )
+            response = get_frontend_api(request).update_expense(expense_id, api_data)
             
             if response.status_code == 200:
                 return JsonResponse({'success': True})
@@ -826,7 +761,7 @@ class UpdateExpenseViewFront(View):
             # Return detailed error information
             return JsonResponse({
                 'success': False, 
-                'errors': response.json() if response.content else "Error communicating with the API"
+                'errors': response.data if response.data is not None else "Error communicating with the API"
             }, status=response.status_code)
         
         except json.JSONDecodeError:
@@ -843,20 +778,18 @@ class ProfileView(View):
         if not token or not user_id:
             messages.error(request, "Authentication required. Please log in again.")
             return redirect('login')
-            
-        headers = {'Authorization': f'Token {token}'}
         
         try:
             # Get user profile data
-            response = requests.get(f"{settings.API_BASE_URL}/users/profile/", headers=headers)
+            response = get_frontend_api(request).get_profile()
             if response.status_code == 200:
-                user_data = response.json()
+                user_data = response.data
                 form = ProfilePictureForm()
                 return render(request, 'core/profile.html', {'user_data': user_data, 'form': form})
             else:
                 messages.error(request, "Failed to fetch user profile.")
                 return redirect('dashboard')
-        except requests.exceptions.RequestException:
+        except FrontendAPIError:
             messages.error(request, "Error connecting to the server.")
             return redirect('dashboard')
     
@@ -870,27 +803,19 @@ class ProfileView(View):
             
         form = ProfilePictureForm(request.POST, request.FILES)
         if form.is_valid():
-            # Create a multipart form data request
-            headers = {'Authorization': f'Token {token}'}
-            files = {'profile_picture': request.FILES['profile_picture']}
-            
             try:
-                response = requests.put(
-                    f"{settings.API_BASE_URL}/users/profile/",
-                    headers=headers,
-                    files=files
-                )
+                response = get_frontend_api(request).update_profile_picture(request.FILES['profile_picture'])
                 
                 if response.status_code == 200:
                     # Update the profile picture URL in the session
-                    response_data = response.json()
+                    response_data = response.data
                     if response_data.get('profile_picture'):
-                        request.session['profile_picture_url'] = response_data['profile_picture']
+                        set_session_value(request.session, 'profile_picture_url', response_data['profile_picture'])
                     
                     messages.success(request, "Profile picture updated successfully!")
                 else:
                     messages.error(request, "Failed to update profile picture.")
-            except requests.exceptions.RequestException:
+            except FrontendAPIError:
                 messages.error(request, "Error connecting to the server.")
                 
         return redirect('profile')
@@ -900,12 +825,9 @@ class VideoListView(View):
         query = request.GET.get('search', '')
         videos_list = Video.objects.all().order_by('-created_at')
         
-        # Search functionality
+        # Full-text search, best matches first (see core.search)
         if query:
-            videos_list = videos_list.filter(
-                Q(title__icontains=query) | 
-                Q(description__icontains=query)
-            )
+            videos_list = search_videos(videos_list, query)
         
         # Pagination
         paginator = Paginator(videos_list, 6)  # Show 6 videos per page
@@ -919,4 +841,10 @@ class VideoListView(View):
     
 class CategoryList(generics.ListAPIView):
     queryset = Category.objects.all()
-    serializer_class = CategorySerializer
\ No newline at end of file
+    serializer_class = CategorySerializer
+
+    # Served from the category registry (core.categories), 304 while it is unchanged
+    def list(self, request, *args, **kwargs):
+        return conditional.respond(
+            request, 'categories', [categories.VERSION_KEY], lambda: Response(services.list_categories()),
+        )
\ No newline at end of file